@@ -139,6 +139,10 @@ SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 # 指定缓存redis的别名
 SESSION_CACHE_ALIAS = "session"
 
+# 云通讯服务器地址，不设置时为app.cloopen.com:8883
+# 本地压测短信发送时使用模拟服务器(python -m utils.yuntongxun.stub_server)：
+# YUNTONGXUN_SERVER = {'ip': '127.0.0.1', 'port': '8883', 'protocol': 'http'}
+
 
 
 # 在setting.py文件中加入如下配置：
@@ -234,6 +238,9 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 预渲染的静态页面(python manage.py prerender_pages生成)，由nginx直接返回
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerender')
+
 # 自定义用户模型
 AUTH_USER_MODEL = 'user.Users'
 
@@ -252,12 +259,19 @@ HAYSTACK_CONNECTIONS = {
         'INDEX_NAME': 'django_pj',  # 指定elasticsearch建立的索引库的名称
     },
 }
+# 没有elasticsearch时(小规模部署、测试)可以使用本地索引，在进程内完成搜索：
+# HAYSTACK_CONNECTIONS = {
+#     'default': {
+#         'ENGINE': 'utils.local_search.backend.LocalSearchEngine',
+#         'PATH': os.path.join(BASE_DIR, 'search_index'),    # 索引文件目录
+#     },
+# }
 
 
 # 搜索页设置每页显示的数据量
 HAYSTACK_SEARCH_RESULTS_PER_PAGE = 5
-# 当数据库改变时，会自动更新索引
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+# 当数据库改变时，只记录需要更新的文章id，由python manage.py update_search_index批量更新索引
+HAYSTACK_SIGNAL_PROCESSOR = 'news.search_signals.QueuedSignalProcessor'
 
 # 站点域名和端口配置
 SITE_DOMAIN_PORT = "http://192.168.42.131:8000/"
@@ -9,10 +9,12 @@ from django.contrib.auth.models import Group,Permission
 from django.core.paginator import Paginator, EmptyPage
 from django.db.models import Count
 from django.shortcuts import render
+from django.urls import reverse
 from django.views import View
 from D_project import settings
 
 from news import models
+from news.ranking import get_hot_news_ids
 from doc.models import Doc
 from user.models import Users
 from course.models import Course,CourseCategory,Teacher
@@ -23,6 +25,8 @@ from utils.json_fun import to_json_data
 from utils.user_reg_code import Code, error_map
 from utils import paginator_script
 from utils.fastdfs.fdfs import FDFS_Client
+from utils.page_cache import purge_pages
+from utils.prerender import publish_pages
 from . import forms
 from . import constants
 
@@ -30,6 +34,24 @@ from . import constants
 logger = logging.getLogger('django')
 
 
+# 前台页面更新：修改数据后只清掉展示这些数据的页面缓存，预渲染的静态页面重新生成
+def publish_news_pages(*news_ids):
+    """首页(标签导航、热门新闻)和文章详情页"""
+    publish_pages(reverse('news:index'), *[reverse('news:news_detail', args=[i]) for i in news_ids])
+
+
+def publish_tag_pages(tag_id):
+    """标签名显示在首页和标签下所有文章的详情页中，文章较多，静态页面由prerender_pages命令生成"""
+    publish_pages(reverse('news:index'))
+    purge_pages(*[reverse('news:news_detail', args=[i])
+                  for i in models.News.objects.filter(tag_id=tag_id).values_list('id', flat=True)])
+
+
+def publish_course_pages(*course_ids):
+    """课程列表页没有预渲染，只清缓存"""
+    purge_pages(reverse('course:index'))
+    publish_pages(*[reverse('course:course_detail', args=[i]) for i in course_ids])
+
 
 # 后台管理首页
 class IndexView(LoginRequiredMixin,View):
@@ -83,6 +105,7 @@ class TagManageView(PermissionRequiredMixin,View):
             tag_instance, tag_boolean = tag_tuple
             #  判断是创建还是已经存在的
             if tag_boolean == True:
+                publish_news_pages()
                 news_tag ={
                     'id': tag_instance.id,
                     'name': tag_instance.name
@@ -110,7 +133,8 @@ class TagEditView(PermissionRequiredMixin,View):
         tag = models.Tag.objects.only('id').filter(id=tag_id).first()
         if tag:
             tag.is_delete = True
-            tag.save(update_fields=['is_delete'])     # 优化保存(只更新发生变化的)
+            tag.save(update_fields=['is_delete', 'update_time'])     # 优化保存(只更新发生变化的)
+            publish_tag_pages(tag.id)
             return to_json_data(errmsg="标签删除成功！")
         else:
             return to_json_data(errno=Code.PARAMERR, errmsg="标签不存在！")
@@ -139,7 +163,8 @@ class TagEditView(PermissionRequiredMixin,View):
                     return to_json_data(errno=Code.PARAMERR, errmsg="标签名未变化！")
                 else:
                     tag.name = tag_name
-                    tag.save(update_fields=['name'])        # 优化保存
+                    tag.save(update_fields=['name', 'update_time'])        # 优化保存(静态页面按update_time判断是否重新生成)
+                    publish_tag_pages(tag.id)
                     return to_json_data(errmsg="标签更新成功！")
             else:
                 return to_json_data(errno=Code.PARAMERR, errmsg="标签名已存在！")
@@ -161,9 +186,12 @@ class HotNewsManage(PermissionRequiredMixin,View):
     # 页面渲染
     def get(self,request):
         # 参数：news_title,news_id,tag_name,优先级
-        hot_news = models.HotNews.objects.select_related('news__tag').\
-            only('news__title','news__tag__name','priority','news_id').filter(is_delete=False).\
-            order_by('priority','-news__clicks')[:constants.SHOW_HOTNEWS_COUNT]
+        # 排行和首页一样从redis中取，再按顺序查询展示数据
+        hot_news_ids = get_hot_news_ids(constants.SHOW_HOTNEWS_COUNT)
+        hot_news_map = {hotnews.news_id: hotnews for hotnews in models.HotNews.objects.select_related('news__tag').
+                        only('news__title','news__tag__name','priority','news_id').
+                        filter(is_delete=False, news_id__in=hot_news_ids)}
+        hot_news = [hot_news_map[news_id] for news_id in hot_news_ids if news_id in hot_news_map]
         return render(request,'admin/news/news_hot.html',locals())
 
 # 对热门文章的标签操作
@@ -184,6 +212,7 @@ class HotNewsEdit(PermissionRequiredMixin,View):
         if hotnews:
             hotnews.is_delete = True
             hotnews.save(update_fields=['is_delete'])  # 优化保存(只更新发生变化的)
+            publish_news_pages()
             return to_json_data(errmsg="热门新闻删除成功！")
         else:
             return to_json_data(errno=Code.PARAMERR, errmsg="该新闻不存在！")
@@ -217,6 +246,7 @@ class HotNewsEdit(PermissionRequiredMixin,View):
             else:
                 hotnews.priority = priority
                 hotnews.save(update_fields=['priority'])
+                publish_news_pages()
                 return to_json_data(errmsg='优先级!')
 
 # 添加文章页
@@ -274,6 +304,7 @@ class HotNewsAdd(PermissionRequiredMixin,View):
         hotnews, is_created = hotnews_tuple
         hotnews.priority = priority  # 修改优先级
         hotnews.save(update_fields=['priority'])
+        publish_news_pages()
         return to_json_data(errmsg="热门文章创建成功")
 
 # 添加文章之文章分类
@@ -366,23 +397,35 @@ class NewsManage(PermissionRequiredMixin,View):
         # news = news.filter(is_delete=False, tag_id=tag_id) or \
         #          news.filter(is_delete=False)
 
-        # 获取第几页内容
-        try:
-            # 获取前端的页码,默认是第一页
-            page = int(request.GET.get('page', 1))
-        except Exception as e:
-            logger.info("当前页数错误：\n{}".format(e))
-            page = 1
-        paginator = Paginator(newses, constants.PER_PAGE_NEWS_COUNT)
-        try:
-            news_info = paginator.page(page)
-        except EmptyPage:
-            # 若用户访问的页数大于实际页数，则返回最后一页数据
-            logging.info("用户访问的页数大于总页数。")
-            news_info = paginator.page(paginator.num_pages)
+        # 传了cursor参数就用游标分页(不统计总数，深翻页也不会变慢)
+        cursor = request.GET.get('cursor')
+        if cursor is not None:
+            try:
+                news_info, next_cursor = paginator_script.get_keyset_page(newses, cursor,
+                                                                          constants.PER_PAGE_NEWS_COUNT)
+            except ValueError as e:
+                logger.info("游标错误：\n{}".format(e))
+                news_info, next_cursor = paginator_script.get_keyset_page(newses, '',
+                                                                          constants.PER_PAGE_NEWS_COUNT)
+            paginator_data = {'cursor_mode': True, 'next_cursor': next_cursor}
+        else:
+            # 获取第几页内容
+            try:
+                # 获取前端的页码,默认是第一页
+                page = int(request.GET.get('page', 1))
+            except Exception as e:
+                logger.info("当前页数错误：\n{}".format(e))
+                page = 1
+            paginator = Paginator(newses, constants.PER_PAGE_NEWS_COUNT)
+            try:
+                news_info = paginator.page(page)
+            except EmptyPage:
+                # 若用户访问的页数大于实际页数，则返回最后一页数据
+                logging.info("用户访问的页数大于总页数。")
+                news_info = paginator.page(paginator.num_pages)
 
-        # 分页功能
-        paginator_data = paginator_script.get_paginator_data(paginator, news_info)
+            # 分页功能
+            paginator_data = paginator_script.get_paginator_data(paginator, news_info)
 
         # 时间格式再转成字符串格式
         start_time = start_time.strftime('%Y/%m/%d') if start_time else ''
@@ -425,10 +468,12 @@ class NewsEditView(PermissionRequiredMixin,View):
     # 删除
     def delete(self,request,news_id):
         # 从前端直接获取news_id和数据库查到的id做校验
-        news = models.News.objects.only('id').filter(id=news_id).first()
+        # 搜索提示中要删掉标题，标题和是否已删除一起查出来
+        news = models.News.objects.only('id', 'title', 'is_delete').filter(id=news_id).first()
         if news:
             news.is_delete = True
-            news.save(update_fields=['is_delete'])
+            news.save(update_fields=['is_delete', 'update_time'])     # 增量重建搜索索引按update_time找到删除的文章
+            publish_news_pages(news.id)
             return to_json_data(errmsg='文章删除成功!')
         else:
             return to_json_data(errno=Code.PARAMERR, errmsg="该文章不存在！")
@@ -463,6 +508,7 @@ class NewsEditView(PermissionRequiredMixin,View):
                 news.image_url = form.cleaned_data.get('image_url')
                 news.tag = form.cleaned_data.get('tag')
                 news.save()
+                publish_news_pages(news.id)
                 return to_json_data(errmsg="文章更新成功！")
             else:
                 # 定义一个错误信息列表
@@ -507,6 +553,7 @@ class NewsPubView(PermissionRequiredMixin,View):
             news_instance = form.save(commit=False)      # 先缓存(因为form表单只有五个参数)
             news_instance.author = request.user          # 给文章添加作者信息
             news_instance.save()
+            publish_pages(reverse('news:news_detail', args=[news_instance.id]))
             return to_json_data(errmsg="文章发布成功！")
         else:
             # 定义一个错误信息列表
@@ -643,6 +690,7 @@ class DocEditView(PermissionRequiredMixin,View):
         if doc:
             doc.is_delete = True
             doc.save(update_fields=['is_delete', 'update_time'])
+            publish_pages(reverse('doc:index'))
             return to_json_data(errmsg="文档删除成功")
         else:
             return to_json_data(errno=Code.NODATA, errmsg='需要删除的文档不存在')
@@ -671,6 +719,7 @@ class DocEditView(PermissionRequiredMixin,View):
                 for key,value in form.cleaned_data.items():
                     setattr(doc,key,value)
                 doc.save()
+                publish_pages(reverse('doc:index'))
                 return to_json_data(errmsg="文档更新成功！")
             else:
                 # 定义一个错误信息列表
@@ -760,6 +809,7 @@ class DocsPubView(PermissionRequiredMixin,View):
             doc_instance = form.save(commit=False)  # 先缓存(因为form表单只有五个参数)
             doc_instance.author = request.user      # 给文档添加作者信息
             doc_instance.save()
+            publish_pages(reverse('doc:index'))
             return to_json_data(errmsg="文章发布成功！")
         else:
             # 定义一个错误信息列表
@@ -806,6 +856,7 @@ class CourseEditView(PermissionRequiredMixin,View):
         if course:
             course.is_delete = True
             course.save(update_fields=['is_delete', 'update_time'])
+            publish_course_pages(course.id)
             return to_json_data(errmsg="课程删除成功")
         else:
             return to_json_data(errno=Code.PARAMERR, errmsg="需要删除的课程不存在")
@@ -834,6 +885,7 @@ class CourseEditView(PermissionRequiredMixin,View):
                 for key, value in form.cleaned_data.items():
                     setattr(course, key, value)
                 course.save()
+                publish_course_pages(course.id)
                 return to_json_data(errmsg="课程更新成功！")
             else:
                 # 定义一个错误信息列表
@@ -877,6 +929,7 @@ class CoursePubView(PermissionRequiredMixin,View):
         if form.is_valid():
             # 3.保存到数据库
             courses_instance = form.save()
+            publish_course_pages()
             return to_json_data(errmsg='课程发布成功')
         else:
             # 定义一个错误信息列表
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CourseConfig(AppConfig):
     name = 'course'
+
+    def ready(self):
+        # 注册信号处理函数(课程、讲师变化时更新页面版本号)
+        from course import signals  # noqa
@@ -0,0 +1,5 @@
+# -*- coding:utf-8 -*-
+# 页面版本号的名称(ETag用，见utils/etags.py)：课程列表页，课程详情页，所有讲师(课程详情页显示讲师信息)
+COURSE_LIST_PAGE = 'course_list'
+COURSE_DETAIL_PAGE = 'course_detail_{}'
+TEACHERS_PAGE = 'teachers'
@@ -0,0 +1,24 @@
+# -*- coding:utf-8 -*-
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from course import constants
+from course.models import Course, Teacher
+from utils.etags import bump_page_versions
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    """课程发布、修改、删除后课程列表页和详情页的ETag变化"""
+    pages = (constants.COURSE_LIST_PAGE, constants.COURSE_DETAIL_PAGE.format(instance.id))
+    # 事务提交后再加1，提交前读到旧数据的请求不会用新版本号缓存
+    transaction.on_commit(lambda: bump_page_versions(*pages))
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def teacher_changed(sender, instance, **kwargs):
+    """讲师信息显示在课程列表页和详情页中"""
+    transaction.on_commit(lambda: bump_page_versions(constants.COURSE_LIST_PAGE, constants.TEACHERS_PAGE))
@@ -1,13 +1,31 @@
 import logging
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition
 from django.http import Http404
+from utils.etags import make_page_etag, get_page_versions
+from utils.page_cache import cache_anonymous_page
 from . import models
+from . import constants
 
 logger = logging.getLogger('django')
 
 
-# 在线课堂页面
+def course_list_etag(request):
+    """课程列表：课程、讲师变化时信号会更新版本号(见signals)，不查询数据库"""
+    versions = get_page_versions(constants.COURSE_LIST_PAGE)
+    return make_page_etag(request, *versions) if versions else None
+
+
+def course_detail_etag(request, course_id):
+    versions = get_page_versions(constants.COURSE_DETAIL_PAGE.format(course_id), constants.TEACHERS_PAGE)
+    return make_page_etag(request, *versions) if versions else None
+
+
+# 在线课堂页面(内容没变时返回304，未登录用户整页缓存)
+@condition(etag_func=course_list_etag)
+@cache_anonymous_page()
 def course_list(request):
     # 缩略图 视频标题 讲师 职称
     courses = models.Course.objects.select_related('teacher').\
@@ -22,12 +40,17 @@ class CourseDetailView(View):
     参数：title,cover_url,video_url,duration,profile,outline,还有teacher相关字段
     URL:/course/<int:course_id>/
     """
+    # 内容没变时返回304，未登录用户整页缓存
+    @method_decorator(condition(etag_func=course_detail_etag))
+    @method_decorator(cache_anonymous_page())
     def get(self,request,course_id):
         try:
             course = models.Course.objects.select_related('teacher').\
                 only('title','cover_url','video_url','duration','profile','outline',
                      'teacher__name','teacher__avatar_url','teacher__positional_title').\
                 filter(is_delete=False,id=course_id).first()
+            if not course:      # first()查不到返回None，不会抛异常
+                raise models.Course.DoesNotExist('课程{}不存在'.format(course_id))
             return render(request,'course/course_detail.html',locals())
         except models.Course.DoesNotExist as e:
                     logger.info("当前课程出现如下异常：\n{}".format(e))
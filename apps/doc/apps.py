@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class DocConfig(AppConfig):
     name = 'doc'
+
+    def ready(self):
+        # 注册信号处理函数(文档变化时更新页面版本号)
+        from doc import signals  # noqa
@@ -0,0 +1,3 @@
+# -*- coding:utf-8 -*-
+# 页面版本号的名称(ETag用，见utils/etags.py)：文档下载页
+DOC_INDEX_PAGE = 'doc_index'
@@ -0,0 +1,16 @@
+# -*- coding:utf-8 -*-
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from doc import constants
+from doc.models import Doc
+from utils.etags import bump_page_versions
+
+
+@receiver(post_save, sender=Doc)
+@receiver(post_delete, sender=Doc)
+def doc_changed(sender, instance, **kwargs):
+    """文档上传、修改、删除后文档下载页的ETag变化"""
+    # 事务提交后再加1，提交前读到旧数据的请求不会用新版本号缓存
+    transaction.on_commit(lambda: bump_page_versions(constants.DOC_INDEX_PAGE))
@@ -5,13 +5,26 @@ from django.utils.encoding import escape_uri_path
 from django.views import View
 from django.conf import settings
 from .models import Doc
+from . import constants
 from django.http import FileResponse,Http404
+from django.views.decorators.http import condition
+from utils.etags import make_page_etag, get_page_versions
+from utils.page_cache import cache_anonymous_page
 
 # 日志器
 logger = logging.getLogger('django')
 
 
 
+def doc_index_etag(request):
+    """文档列表：文档变化时信号会更新版本号(见signals)，不查询数据库"""
+    versions = get_page_versions(constants.DOC_INDEX_PAGE)
+    return make_page_etag(request, *versions) if versions else None
+
+
+# 内容没变时返回304，未登录用户整页缓存
+@condition(etag_func=doc_index_etag)
+@cache_anonymous_page()
 def doc_index(request):
     """渲染文档下载页面"""
     docs = Doc.objects.defer('author','create_time', 'update_time','is_delete').filter(is_delete=False)
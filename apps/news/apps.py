@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class NewsConfig(AppConfig):
     name = 'news'
+
+    def ready(self):
+        # 注册信号处理函数(文章、标签变化时让缓存失效)
+        from news import signals  # noqa
@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+"""
+首页初始数据：标签、轮播图、热门新闻、第一页新闻合成一份json保存在redis中
+文章、标签、热门新闻、轮播图变化后重新生成(写穿)，首页打开时不用查询数据库
+"""
+import json
+import logging
+from django.core.paginator import Paginator
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from news import models
+from news import constants
+from news.ranking import get_hot_news
+from utils import paginator_script
+from utils.json_fun import json_dumps
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 序列化好的data部分
+NEWS_BOOTSTRAP_KEY = 'news_bootstrap_data'
+
+
+def build_bootstrap():
+    """从数据库查询首页数据"""
+    tags = models.Tag.objects.only('id', 'name').filter(is_delete=False)
+    banners = models.Banner.objects.select_related('news').only('image_url', 'news_id', 'news__title').\
+        filter(is_delete=False).order_by('priority')[0:constants.SHOW_BANNER_COUNT]
+    news = models.News.objects.select_related('tag', 'author').only('title', 'image_url', 'digest', 'update_time',
+                                                                    'tag__name', 'author__username').\
+        filter(is_delete=False)
+    # 第一页新闻，游标和页码两种翻页方式都可以接着加载
+    news_info, next_cursor = paginator_script.get_keyset_page(news, '', constants.PER_PAGE_NEWS_COUNT)
+    return {
+        'tags': [{'id': tag.id, 'name': tag.name} for tag in tags],
+        'banners': [b.to_dict_data() for b in banners],
+        'hot_news': get_hot_news(constants.SHOW_HOTNEWS_COUNT),
+        'news': [n.to_dict_data() for n in news_info],
+        'next_cursor': next_cursor,
+        'total_pages': Paginator(news, constants.PER_PAGE_NEWS_COUNT).num_pages,
+    }
+
+
+def rebuild_bootstrap():
+    """重新生成并写入redis，返回序列化好的json(bytes)"""
+    content = json_dumps(build_bootstrap())
+    try:
+        con_redis = get_redis_connection(alias='default')
+        con_redis.setex(NEWS_BOOTSTRAP_KEY, constants.NEWS_BOOTSTRAP_CACHE_EXPIRES, content)
+    except Exception as e:
+        logger.error('写入首页数据缓存异常:\n{}'.format(e))
+    return content
+
+
+def get_bootstrap():
+    """
+    :return: 序列化好的json(bytes)，用to_json_data(data=...)返回
+    """
+    try:
+        con_redis = get_redis_connection(alias='default')
+        content = con_redis.get(NEWS_BOOTSTRAP_KEY)
+    except Exception as e:
+        logger.error('读取首页数据缓存异常:\n{}'.format(e))
+        content = None
+    return content or rebuild_bootstrap()
+
+
+def get_bootstrap_data():
+    """首页渲染用，返回字典"""
+    return json.loads(get_bootstrap())
+
+
+def _rebuild_after_commit():
+    try:
+        rebuild_bootstrap()
+    except Exception as e:
+        logger.error('首页数据重新生成异常:\n{}'.format(e))
+        # 删掉旧数据，下次读取时再生成
+        try:
+            get_redis_connection(alias='default').delete(NEWS_BOOTSTRAP_KEY)
+        except Exception as e:
+            logger.error('首页数据删除异常:\n{}'.format(e))
+
+
+def schedule_rebuild():
+    """事务提交后再重新生成，不会读到未提交的数据"""
+    transaction.on_commit(_rebuild_after_commit)
@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+import logging
+from django_redis import get_redis_connection
+
+from news import constants
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 每个标签一个版本号，tag_id为0代表"最新资讯"(全部文章)
+NEWS_LIST_GEN_KEY = 'news_list_gen_{}'
+# 新闻列表缓存键：标签id，页码，版本号(缓存的是序列化好的data部分)
+NEWS_LIST_KEY = 'news_list_data_{}_{}_{}'
+# 标签下没有文章时，前端看到的是全部文章，这个标签的缓存只记一个标记
+NEWS_LIST_FALLBACK = b'-'
+
+
+def bump_news_list_gen(*tag_ids):
+    """
+    标签版本号加1，带旧版本号的缓存键不会再被读到，等过期自动删除
+    """
+    tag_ids = set(i for i in tag_ids if i is not None)
+    if not tag_ids:
+        return
+    try:
+        con_redis = get_redis_connection(alias='default')
+        pl = con_redis.pipeline()
+        for tag_id in tag_ids:
+            pl.incr(NEWS_LIST_GEN_KEY.format(tag_id))
+        pl.execute()
+    except Exception as e:
+        logger.error('新闻列表缓存版本号更新异常:\n{}'.format(e))
+
+
+def get_news_list_etag(tag_id):
+    """
+    新闻列表的ETag：标签和"最新资讯"的缓存版本号(标签下没有文章时返回的是全部文章)
+    redis异常时返回None，不做条件请求
+    """
+    try:
+        con_redis = get_redis_connection(alias='default')
+        gen, all_gen = con_redis.mget(NEWS_LIST_GEN_KEY.format(tag_id), NEWS_LIST_GEN_KEY.format(0))
+    except Exception as e:
+        logger.error('读取新闻列表缓存版本号异常:\n{}'.format(e))
+        return None
+    return '{}-{}-{}'.format(tag_id, int(gen or 0), int(all_gen or 0))
+
+
+class NewsListCache(object):
+    """
+    新闻列表接口缓存，按(tag_id, page)保存序列化好的data(json bytes)，用to_json_data(data=...)直接返回
+    """
+    def __init__(self, tag_id, page):
+        self.tag_id = tag_id
+        self.page = page
+        self.key = None
+        self.all_key = None
+
+    def get(self):
+        """返回缓存的data(json bytes)，没有缓存返回None"""
+        try:
+            con_redis = get_redis_connection(alias='default')
+            gen, all_gen = con_redis.mget(NEWS_LIST_GEN_KEY.format(self.tag_id), NEWS_LIST_GEN_KEY.format(0))
+            self.key = NEWS_LIST_KEY.format(self.tag_id, self.page, int(gen or 0))
+            self.all_key = NEWS_LIST_KEY.format(0, self.page, int(all_gen or 0))
+            content, all_content = con_redis.mget(self.key, self.all_key)
+        except Exception as e:
+            logger.error('读取新闻列表缓存异常:\n{}'.format(e))
+            return None
+        if content == NEWS_LIST_FALLBACK:
+            return all_content
+        return content
+
+    def set(self, content, fallback=False):
+        """
+        :param content: 序列化好的data(json bytes)
+        :param fallback: 标签下没有文章，content是全部文章的数据
+        """
+        if self.key is None:        # 读缓存时redis异常，不再写入
+            return
+        try:
+            con_redis = get_redis_connection(alias='default')
+            pl = con_redis.pipeline()
+            if fallback:
+                pl.setex(self.key, constants.NEWS_LIST_CACHE_EXPIRES, NEWS_LIST_FALLBACK)
+                pl.setex(self.all_key, constants.NEWS_LIST_CACHE_EXPIRES, content)
+            else:
+                pl.setex(self.key, constants.NEWS_LIST_CACHE_EXPIRES, content)
+            pl.execute()
+        except Exception as e:
+            logger.error('写入新闻列表缓存异常:\n{}'.format(e))
@@ -0,0 +1,169 @@
+# -*- coding:utf-8 -*-
+"""
+文章点击量：请求中只在redis里累加，由flush_news_clicks命令定时批量写入数据库
+只记录未删除的文章：redis中保存未删除的文章id集合(信号在文章修改后更新)，不存在的id不会写入点击量hash
+"""
+import logging
+import time
+import uuid
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django_redis import get_redis_connection
+
+from news import models
+from news import constants
+from news import ranking
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 累计的点击量 {news_id: 增量}
+NEWS_CLICKS_KEY = 'news_clicks'
+# 正在写入数据库的点击量，写入期间新的点击累计到NEWS_CLICKS_KEY
+NEWS_CLICKS_FLUSHING_KEY = 'news_clicks_flushing'
+# 写入数据库的锁，值为持有者的随机token
+NEWS_CLICKS_FLUSH_LOCK_KEY = 'news_clicks_flush_lock'
+# 未删除的文章id集合
+NEWS_IDS_KEY = 'clicks_news_ids'
+# 文章id集合已经从数据库初始化过的标记，过期后重建
+NEWS_IDS_READY_KEY = 'clicks_news_ids_ready'
+
+# 没有正在写入的点击量时，把累计的点击量改名
+# KEYS: 累计的点击量，正在写入的点击量
+# 返回1表示有要写入的点击量
+RENAME_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 1
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+return 1
+"""
+
+# 只释放自己持有的锁(锁过期后可能已经被其他进程拿到)
+# KEYS: 锁  ARGV: token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 文章存在时点击量加1，热门新闻同时累加点击热度(见ranking)，一次往返完成
+# KEYS: 文章id集合初始化标记，文章id集合，点击量hash，热门新闻优先级hash，热度起始时间，各优先级的有序集合
+# ARGV: news_id，当前时间，半衰期
+# 返回-1表示文章id集合还没有初始化，0表示文章不存在，1表示已记录
+CLICK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[3], ARGV[1], 1)
+local priority = redis.call('HGET', KEYS[4], ARGV[1])
+if not priority then
+    return 1
+end
+local epoch = redis.call('GET', KEYS[5])
+if not epoch then
+    epoch = ARGV[2]
+    redis.call('SET', KEYS[5], epoch)
+end
+local weight = 2 ^ ((tonumber(ARGV[2]) - tonumber(epoch)) / tonumber(ARGV[3]))
+redis.call('ZINCRBY', KEYS[5 + tonumber(priority)], weight, ARGV[1])
+return 1
+"""
+
+
+def rebuild_news_ids():
+    """从数据库重建未删除的文章id集合"""
+    con_redis = get_redis_connection(alias='default')
+    news_ids = list(models.News.objects.filter(is_delete=False).values_list('id', flat=True))
+    pl = con_redis.pipeline()
+    pl.delete(NEWS_IDS_KEY)
+    for i in range(0, len(news_ids), constants.CLICKS_FLUSH_BATCH_SIZE):
+        pl.sadd(NEWS_IDS_KEY, *news_ids[i:i + constants.CLICKS_FLUSH_BATCH_SIZE])
+    pl.set(NEWS_IDS_READY_KEY, 1, ex=constants.CLICKS_NEWS_IDS_EXPIRES)
+    pl.execute()
+
+
+def set_news_exists(news_id, exists):
+    """文章发布、逻辑删除、恢复后更新文章id集合"""
+    try:
+        con_redis = get_redis_connection(alias='default')
+        if exists:
+            con_redis.sadd(NEWS_IDS_KEY, news_id)
+        else:
+            con_redis.srem(NEWS_IDS_KEY, news_id)
+    except Exception as e:
+        logger.error('更新文章id集合异常:\n{}'.format(e))
+
+
+def record_click(news_id):
+    """
+    文章点击量加1，只写redis
+    :return: 文章不存在时返回False；redis异常时只记录日志，返回True
+    """
+    try:
+        con_redis = get_redis_connection(alias='default')
+        click_script = con_redis.register_script(CLICK_SCRIPT)
+        for _ in range(2):
+            result = click_script(keys=[NEWS_IDS_READY_KEY, NEWS_IDS_KEY, NEWS_CLICKS_KEY,
+                                        ranking.HOT_NEWS_PRIORITY_KEY, ranking.HOT_NEWS_EPOCH_KEY] +
+                                  ranking.HOT_NEWS_RANK_KEYS,
+                                  args=[news_id, time.time(), constants.HOT_NEWS_HALF_LIFE])
+            if result != -1:
+                return result == 1
+            rebuild_news_ids()
+    except Exception as e:
+        logger.error('记录点击量异常:\n{}'.format(e))
+    return True
+
+
+def _release_lock(con_redis, token):
+    release_script = con_redis.register_script(RELEASE_LOCK_SCRIPT)
+    release_script(keys=[NEWS_CLICKS_FLUSH_LOCK_KEY], args=[token])
+
+
+def flush_clicks(batch_size=constants.CLICKS_FLUSH_BATCH_SIZE):
+    """
+    把redis中累计的点击量写入数据库
+    1.拿到写入锁才执行，同时只有一个进程在写(crontab和常驻命令同时运行也不会重复累加)
+    2.把累计的hash改名(原子操作)，之后的点击累计到新的hash中
+    3.按id排序分批执行 UPDATE tb_news SET clicks = clicks + CASE id WHEN .. THEN .. END WHERE id IN (..)，
+      一篇文章一次只更新一行，不管点击多少次；按id顺序加锁，不会和其他更新死锁；已经不存在的文章不会更新
+    4.每批在事务提交后才从hash中删除，提交前进程退出或事务失败时，这批点击留在hash中下次接着写，不会丢失；
+      只有提交后、删除前进程退出时这一批会被重复累加一次
+    :return: 本次写入的文章数，其他进程正在写入时返回0
+    """
+    con_redis = get_redis_connection(alias='default')
+    token = uuid.uuid4().hex
+    if not con_redis.set(NEWS_CLICKS_FLUSH_LOCK_KEY, token, nx=True, ex=constants.CLICKS_FLUSH_LOCK_EXPIRES):
+        return 0
+    try:
+        # 上一次没写完的先写完，否则把新的点击改名
+        rename_script = con_redis.register_script(RENAME_SCRIPT)
+        if not rename_script(keys=[NEWS_CLICKS_KEY, NEWS_CLICKS_FLUSHING_KEY]):
+            return 0        # 没有新的点击
+        deltas = sorted((int(k), int(v)) for k, v in con_redis.hgetall(NEWS_CLICKS_FLUSHING_KEY).items())
+
+        flushed = 0
+        for i in range(0, len(deltas), batch_size):
+            batch = deltas[i:i + batch_size]
+            ids = [news_id for news_id, _ in batch]
+            clicks_case = Case(*[When(id=news_id, then=Value(delta)) for news_id, delta in batch],
+                               default=Value(0), output_field=IntegerField())
+            # 写入时间较长时延长锁的有效期
+            con_redis.expire(NEWS_CLICKS_FLUSH_LOCK_KEY, constants.CLICKS_FLUSH_LOCK_EXPIRES)
+            with transaction.atomic():
+                # update()不会修改update_time，也不会触发信号
+                models.News.objects.filter(id__in=ids).update(clicks=F('clicks') + clicks_case)
+            con_redis.hdel(NEWS_CLICKS_FLUSHING_KEY, *ids)
+            flushed += len(batch)
+        con_redis.delete(NEWS_CLICKS_FLUSHING_KEY)
+        return flushed
+    finally:
+        _release_lock(con_redis, token)
@@ -0,0 +1,111 @@
+# -*- coding:utf-8 -*-
+"""
+评论批量加载：评论和评论人一起查出来，父子评论在内存中组装，
+查询次数和评论数量、回复层数无关；评论分页和评论总数也在这里
+"""
+import logging
+from django_redis import get_redis_connection
+
+from news import models
+from news import constants
+from utils import paginator_script
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 文章评论总数的键名
+COMMENTS_COUNT_KEY = 'news_comments_count_{}'
+# 键存在时才加减，避免给没统计过的文章写入错误的总数
+INCR_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+def _comment_queryset():
+    """评论序列化需要的字段，作者一起查出来"""
+    return models.Comments.objects.select_related('author').\
+        only('content', 'update_time', 'news_id', 'parent_id', 'is_delete', 'author__username')
+
+
+def _build_dict_list(comments, comments_map):
+    """
+    :param comments: 需要输出的评论列表
+    :param comments_map: {comment_id: 评论}，包含所有需要用到的父评论
+    :return: 评论字典列表，每个评论的父评论只生成一次
+    """
+    dict_cache = {}
+    comments_list = []
+    for comment in comments:
+        # 从当前评论往上找到还没有生成字典的祖先，再从上往下生成(不用递归，回复层数再多也不会超出递归深度)
+        chain = []
+        c = comment
+        while c is not None and c.id not in dict_cache:
+            chain.append(c)
+            c = comments_map.get(c.parent_id)
+        for c in reversed(chain):
+            dict_cache[c.id] = c.to_dict_data(parent=dict_cache.get(c.parent_id))
+        comments_list.append(dict_cache[comment.id])
+    return comments_list
+
+
+def comments_to_dict_list(comments):
+    """
+    把任意一组评论(例如一页评论、刚发表的回复)序列化，父评论批量加载：
+    1次查出文章评论的id和parent_id，算出需要的祖先，再1次查出祖先评论
+    """
+    comments = list(comments)
+    comments_map = {c.id: c for c in comments}
+    missing = set(c.parent_id for c in comments if c.parent_id and c.parent_id not in comments_map)
+    if missing:
+        news_ids = set(c.news_id for c in comments)
+        parents_map = dict(models.Comments.objects.filter(news_id__in=news_ids).values_list('id', 'parent_id'))
+        ancestor_ids = set()
+        for parent_id in missing:
+            while parent_id and parent_id not in ancestor_ids and parent_id not in comments_map:
+                ancestor_ids.add(parent_id)
+                parent_id = parents_map.get(parent_id)
+        for c in _comment_queryset().filter(id__in=ancestor_ids):
+            comments_map[c.id] = c
+    return _build_dict_list(comments, comments_map)
+
+
+def load_comment_page(news_id, cursor):
+    """
+    按(-update_time, -id)游标分页取一页评论
+    :return: 评论字典列表、下一页游标(没有下一页时为None)，游标格式不对时抛出ValueError
+    """
+    comments = _comment_queryset().filter(is_delete=False, news_id=news_id)
+    page, next_cursor = paginator_script.get_keyset_page(comments, cursor, constants.PER_PAGE_COMMENTS_COUNT)
+    return comments_to_dict_list(page), next_cursor
+
+
+def get_comments_count(news_id):
+    """文章评论总数，存在redis中，第一次访问时从数据库统计"""
+    key = COMMENTS_COUNT_KEY.format(news_id)
+    try:
+        con_redis = get_redis_connection(alias='default')
+        count = con_redis.get(key)
+        if count is not None:
+            return int(count)
+    except Exception as e:
+        logger.error('读取评论数异常:\n{}'.format(e))
+        con_redis = None
+    count = models.Comments.objects.filter(is_delete=False, news_id=news_id).count()
+    if con_redis is not None:
+        try:
+            con_redis.set(key, count, nx=True)     # 别的请求已经写入就不覆盖
+        except Exception as e:
+            logger.error('写入评论数异常:\n{}'.format(e))
+    return count
+
+
+def incr_comments_count(news_id, amount=1):
+    """评论数加减，只有已经统计过的文章才更新(没统计过的下次访问时会从数据库统计)"""
+    try:
+        con_redis = get_redis_connection(alias='default')
+        con_redis.eval(INCR_IF_EXISTS_SCRIPT, 1, COMMENTS_COUNT_KEY.format(news_id), amount)
+    except Exception as e:
+        logger.error('更新评论数异常:\n{}'.format(e))
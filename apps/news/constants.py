@@ -6,3 +6,77 @@ SHOW_HOTNEWS_COUNT = 3
 
 # 轮播图新闻数
 SHOW_BANNER_COUNT = 6
+
+
+# 新闻列表接口缓存有效期，单位秒
+NEWS_LIST_CACHE_EXPIRES = 10 * 60
+
+# 首页初始数据缓存有效期，单位秒(热门新闻的点击排行在这段时间内不变)
+NEWS_BOOTSTRAP_CACHE_EXPIRES = 60
+
+# 文章详情页，每页评论数
+PER_PAGE_COMMENTS_COUNT = 10
+
+# 点击量每批写入数据库的文章数
+CLICKS_FLUSH_BATCH_SIZE = 200
+
+# 点击量写入数据库的间隔，单位秒
+CLICKS_FLUSH_INTERVAL = 10
+
+# 点击量写入数据库的锁的有效期，每写一批延长一次，单位秒
+CLICKS_FLUSH_LOCK_EXPIRES = 60
+
+# 记录点击量用的文章id集合的有效期，过期后下一次点击从数据库重建，单位秒
+CLICKS_NEWS_IDS_EXPIRES = 24 * 60 * 60
+
+# 热门新闻点击热度的半衰期，单位秒(一天前的点击只算半次)
+HOT_NEWS_HALF_LIFE = 24 * 60 * 60
+
+# 热度分数放大到这个时间(秒)后整体缩小一次，避免浮点数溢出
+HOT_NEWS_REBASE_AFTER = 30 * HOT_NEWS_HALF_LIFE
+
+# 搜索索引每批更新的文章数
+SEARCH_INDEX_BATCH_SIZE = 100
+
+# 搜索索引更新的间隔，单位秒
+SEARCH_INDEX_INTERVAL = 5
+
+# 搜索结果(文章id列表)缓存有效期，单位秒
+SEARCH_RESULT_CACHE_EXPIRES = 10 * 60
+
+# 每个搜索词缓存的结果数(前20页)，之后的页翻到时再查询
+SEARCH_RESULT_CACHE_COUNT = 100
+
+# 搜索提示返回的词数
+SEARCH_SUGGEST_COUNT = 8
+
+# 搜索提示每次最多检查的词数(前缀很短时匹配的词很多)
+SEARCH_SUGGEST_SCAN_COUNT = 500
+
+# 参与搜索提示的搜索词数(按搜索次数)
+SEARCH_SUGGEST_QUERY_COUNT = 2000
+
+# 记录的搜索词最大长度
+SEARCH_SUGGEST_MAX_LENGTH = 30
+
+# 搜索提示变化日志保留的条数
+SEARCH_SUGGEST_LOG_SIZE = 1000
+
+# 各进程读取搜索提示变化的间隔，单位秒
+SEARCH_SUGGEST_REFRESH_INTERVAL = 5
+
+# 各进程整个重新加载搜索提示数据的间隔，单位秒
+SEARCH_SUGGEST_REBUILD_INTERVAL = 60 * 60
+
+# 重建搜索索引时每次从数据库读取的行数
+SEARCH_REINDEX_CHUNK_SIZE = 500
+
+# 全量重建搜索索引的进程数
+SEARCH_REINDEX_WORKERS = 4
+
+# 增量重建时多处理的时间，单位秒(执行期间修改、稍后才提交的文章)
+SEARCH_REINDEX_OVERLAP = 60
+
+# 页面版本号的名称(ETag用，见utils/etags.py)：文章详情页，所有标签(文章详情页显示标签名)
+NEWS_DETAIL_PAGE = 'news_detail_{}'
+TAGS_PAGE = 'tags'
@@ -0,0 +1,42 @@
+# -*- coding:utf-8 -*-
+import logging
+import time
+from django.core.management.base import BaseCommand
+
+from news import constants
+from news.clicks import flush_clicks
+from news.ranking import rebase
+
+# 日志器
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    把redis中累计的文章点击量批量写入数据库
+    python manage.py flush_news_clicks               每隔CLICKS_FLUSH_INTERVAL秒写一次，一直运行
+    python manage.py flush_news_clicks --once        只写一次(可以放到crontab中)
+    """
+    help = '把redis中累计的文章点击量批量写入数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只写入一次')
+        parser.add_argument('--interval', type=int, default=constants.CLICKS_FLUSH_INTERVAL,
+                            help='写入间隔，单位秒')
+        parser.add_argument('--batch-size', type=int, default=constants.CLICKS_FLUSH_BATCH_SIZE,
+                            help='每条UPDATE语句更新的文章数')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                flushed = flush_clicks(batch_size=options['batch_size'])
+                if flushed:
+                    logger.info('写入{}篇文章的点击量'.format(flushed))
+                # 热门新闻的热度分数定期按比例缩小，避免无限增长
+                if rebase():
+                    logger.info('热门新闻热度分数已缩小')
+            except Exception as e:
+                logger.error('点击量写入数据库异常:\n{}'.format(e))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
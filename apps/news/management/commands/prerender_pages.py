@@ -0,0 +1,45 @@
+# -*- coding:utf-8 -*-
+import logging
+from django.core.management.base import BaseCommand
+
+from utils import prerender
+
+# 日志器
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    把首页、文章详情页、课程详情页、文档页生成静态html，由nginx直接返回
+    python manage.py prerender_pages           只重新生成数据有变化的页面(可以放到crontab中)
+    python manage.py prerender_pages --all     全部重新生成(模板修改后)
+    """
+    help = '生成静态页面，只重新生成数据有变化的页面'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='全部重新生成')
+
+    def handle(self, *args, **options):
+        manifest = prerender.load_manifest()
+        pages = prerender.collect_pages()
+        rendered = removed = 0
+
+        # 已经删除的文章、课程，删除静态文件
+        for path in set(manifest) - set(pages):
+            prerender.remove_page(path)
+            del manifest[path]
+            removed += 1
+
+        for path, version in pages.items():
+            if manifest.get(path) == version and not options['all']:
+                continue
+            # 生成失败的页面不记录版本，下次再生成
+            manifest.pop(path, None)
+            try:
+                if prerender.render_page(path):
+                    manifest[path] = version
+                    rendered += 1
+            except Exception as e:
+                logger.error('静态页面{}生成异常:\n{}'.format(path, e))
+        prerender.save_manifest(manifest)
+        self.stdout.write('生成{}个页面，删除{}个页面'.format(rendered, removed))
@@ -0,0 +1,33 @@
+# -*- coding:utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from news import constants
+from news.search_reindex import reindex
+
+
+class Command(BaseCommand):
+    """
+    重建文章的搜索索引，代替haystack的rebuild_index(单进程一次加载所有文章)
+    python manage.py reindex_news                    只索引上次执行之后修改过的文章(第一次执行时全量)
+    python manage.py reindex_news --full --workers 8 全量重建，8个进程同时执行
+    python manage.py reindex_news --full --clear     先清空索引再全量重建
+    """
+    help = '按update_time增量(或多进程全量)重建文章的搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='全量重建')
+        parser.add_argument('--clear', action='store_true', help='全量重建前先清空索引')
+        parser.add_argument('--workers', type=int, default=constants.SEARCH_REINDEX_WORKERS,
+                            help='全量重建的进程数')
+        parser.add_argument('--batch-size', type=int, default=constants.SEARCH_INDEX_BATCH_SIZE,
+                            help='每次批量写入索引的文章数')
+        parser.add_argument('--chunk-size', type=int, default=constants.SEARCH_REINDEX_CHUNK_SIZE,
+                            help='每次从数据库读取的行数')
+
+    def handle(self, *args, **options):
+        if options['clear'] and not options['full']:
+            # 增量更新时清空索引会丢掉没有修改过的文章
+            raise CommandError('--clear只能和--full一起使用')
+        updated, removed = reindex(full=options['full'], clear=options['clear'], workers=options['workers'],
+                                   batch_size=options['batch_size'], chunk_size=options['chunk_size'])
+        self.stdout.write('更新{}篇，删除{}篇'.format(updated, removed))
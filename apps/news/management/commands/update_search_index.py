@@ -0,0 +1,41 @@
+# -*- coding:utf-8 -*-
+import logging
+import time
+from django.core.management.base import BaseCommand
+
+from news import constants
+from news.search_signals import update_dirty_news
+
+# 日志器
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    把保存、删除过的文章批量更新到搜索索引中(同一篇文章多次修改只更新一次)
+    python manage.py update_search_index             每隔SEARCH_INDEX_INTERVAL秒更新一次，一直运行
+    python manage.py update_search_index --once      只更新一次(可以放到crontab中)
+    """
+    help = '把保存、删除过的文章批量更新到搜索索引中'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只更新一次')
+        parser.add_argument('--interval', type=int, default=constants.SEARCH_INDEX_INTERVAL,
+                            help='更新间隔，单位秒')
+        parser.add_argument('--batch-size', type=int, default=constants.SEARCH_INDEX_BATCH_SIZE,
+                            help='每批更新的文章数')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                # 一直取到没有需要更新的文章
+                while True:
+                    updated = update_dirty_news(batch_size=options['batch_size'])
+                    if not updated:
+                        break
+                    logger.info('更新{}篇文章的搜索索引'.format(updated))
+            except Exception as e:
+                logger.error('搜索索引更新异常:\n{}'.format(e))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -41,12 +41,29 @@ class News(ModelBase):
     class Meta:
         ordering = ['-update_time', '-id']      # 排序
         db_table = "tb_news"                    # 指明数据库表名
+        # 游标分页按(update_time, id)定位，加联合索引
+        indexes = [
+            models.Index(fields=['update_time', 'id']),
+            models.Index(fields=['tag', 'update_time', 'id']),
+        ]
         verbose_name = "新闻"                   # 在admin站点中显示的名称
         verbose_name_plural = verbose_name      # 显示的复数名称
 
     def __str__(self):
         return self.title          # 访问News实例，返回新闻标题称给我们
 
+    # 生成新闻列表序列化输出的字典
+    def to_dict_data(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'digest': self.digest,
+            'image_url': self.image_url,
+            'update_time': self.update_time.strftime('%Y年%m月%d日 %H:%M'),    # 格式化时间
+            'tag_name': self.tag.name,
+            'author': self.author.username,
+        }
+
 
 # 评论表
 class Comments(ModelBase):
@@ -62,14 +79,19 @@ class Comments(ModelBase):
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
 
     # 生成序列化输出的字典
-    def to_dict_data(self):
+    def to_dict_data(self, parent=None):
+        """
+        :param parent: 父评论已经生成好的字典(批量加载时传入)，不传就通过self.parent逐级查询
+        """
+        if parent is None and self.parent_id:
+            parent = self.parent.to_dict_data()
         comment_dict = {
             'news_id': self.news_id,
             'comment_id': self.id,
             'content': self.content,
             'author': self.author.username,
             'update_time': self.update_time.strftime('%Y年%m月%d日 %H:%M'),
-            'parent': self.parent.to_dict_data() if self.parent else None
+            'parent': parent
         }
         return comment_dict
 
@@ -138,3 +160,11 @@ class Banner(ModelBase):
     def __str__(self):
         return '<轮播图{}>'.format(self.id)
 
+    # 生成序列化输出的字典
+    def to_dict_data(self):
+        return {
+            'image_url': self.image_url,
+            'news_id': self.news_id,
+            'news_title': self.news.title,
+        }
+
@@ -0,0 +1,236 @@
+# -*- coding:utf-8 -*-
+"""
+热门新闻排行：redis有序集合维护，读取时不用查询数据库
+
+排序规则和原来的order_by('priority', '-news__clicks')一致：先按编辑设置的优先级，
+同一优先级内按点击热度。每个优先级一个有序集合，分数是随时间衰减的点击量：
+一次点击的分数是 2 ** ((now - epoch) / 半衰期)，越新的点击分数越大(前向衰减)，
+这样已有的分数不用随时间修改，分数之比就等于按半衰期衰减后的热度之比
+"""
+import json
+import logging
+import time
+from django.template.loader import render_to_string
+from django_redis import get_redis_connection
+
+from news import models
+from news import constants
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 优先级 -> 有序集合 {news_id: 热度}
+HOT_NEWS_RANK_KEY = 'hot_news_rank_{}'
+HOT_NEWS_RANK_KEYS = [HOT_NEWS_RANK_KEY.format(p) for p, _ in models.HotNews.PTL_CHOICES]
+# 热门新闻的优先级 {news_id: priority}
+HOT_NEWS_PRIORITY_KEY = 'hot_news_priority'
+# 热门新闻展示数据 {news_id: json}
+HOT_NEWS_INFO_KEY = 'hot_news_info'
+# 搜索页热门推荐渲染好的html {news_id: html}
+HOT_NEWS_ROW_KEY = 'hot_news_row'
+# 热度计算的起始时间
+HOT_NEWS_EPOCH_KEY = 'hot_news_epoch'
+# 已经从数据库初始化过的标记
+HOT_NEWS_READY_KEY = 'hot_news_ready'
+
+def _info_json(news_id, title, image_url):
+    return json.dumps({'news_id': news_id, 'title': title, 'image_url': image_url})
+
+
+def _click_weight(con_redis, now):
+    """当前时间一次点击的分数"""
+    epoch = con_redis.get(HOT_NEWS_EPOCH_KEY)
+    epoch = float(epoch) if epoch else now
+    return 2 ** ((now - epoch) / constants.HOT_NEWS_HALF_LIFE)
+
+
+def rebuild():
+    """从数据库重建排行，已有的点击量当作现在的点击"""
+    hot_news = models.HotNews.objects.filter(is_delete=False).\
+        values_list('news_id', 'priority', 'news__clicks', 'news__title', 'news__image_url')
+    con_redis = get_redis_connection(alias='default')
+    now = time.time()
+    weight = _click_weight(con_redis, now)
+    pl = con_redis.pipeline()
+    pl.delete(HOT_NEWS_PRIORITY_KEY, HOT_NEWS_INFO_KEY, HOT_NEWS_ROW_KEY, *HOT_NEWS_RANK_KEYS)
+    pl.setnx(HOT_NEWS_EPOCH_KEY, now)
+    for news_id, priority, clicks, title, image_url in hot_news:
+        pl.hset(HOT_NEWS_PRIORITY_KEY, news_id, priority)
+        pl.hset(HOT_NEWS_INFO_KEY, news_id, _info_json(news_id, title, image_url))
+        pl.zadd(HOT_NEWS_RANK_KEY.format(priority), {news_id: clicks * weight})
+    pl.set(HOT_NEWS_READY_KEY, 1)
+    pl.execute()
+
+
+def _db_hot_news_ids(count=None):
+    """redis异常时按原来的方式查询数据库排序"""
+    news_ids = models.HotNews.objects.filter(is_delete=False).\
+        order_by('priority', '-news__clicks').values_list('news_id', flat=True)
+    return list(news_ids[:count] if count else news_ids)
+
+
+def get_hot_news_ids(count=None):
+    """
+    :param count: 取前多少条，None表示全部
+    :return: 按排行排好序的news_id列表
+    """
+    end = count - 1 if count else -1
+    try:
+        con_redis = get_redis_connection(alias='default')
+        for _ in range(2):
+            pl = con_redis.pipeline(transaction=False)
+            pl.exists(HOT_NEWS_READY_KEY)
+            for key in HOT_NEWS_RANK_KEYS:
+                pl.zrevrange(key, 0, end)
+            ready, *ranks = pl.execute()
+            if ready:
+                break
+            rebuild()
+    except Exception as e:
+        logger.error('读取热门新闻排行异常:\n{}'.format(e))
+        return _db_hot_news_ids(count)
+    news_ids = [int(news_id) for rank in ranks for news_id in rank]
+    return news_ids[:count] if count else news_ids
+
+
+def get_hot_news(count):
+    """
+    首页热门新闻，展示数据也保存在redis中
+    :return: [{'news_id':, 'title':, 'image_url':}]
+    """
+    news_ids = get_hot_news_ids(count)
+    if not news_ids:
+        return []
+    try:
+        con_redis = get_redis_connection(alias='default')
+        infos = con_redis.hmget(HOT_NEWS_INFO_KEY, news_ids)
+    except Exception as e:
+        logger.error('读取热门新闻展示数据异常:\n{}'.format(e))
+        con_redis, infos = None, [None] * len(news_ids)
+    missing = [news_id for news_id, info in zip(news_ids, infos) if info is None]
+    if missing:
+        # 展示数据被清掉了(文章被编辑)，补查一次再写回redis
+        news = models.News.objects.only('title', 'image_url').filter(id__in=missing)
+        missing_infos = {n.id: _info_json(n.id, n.title, n.image_url) for n in news}
+        if con_redis is not None and missing_infos:
+            try:
+                con_redis.hset(HOT_NEWS_INFO_KEY, mapping=missing_infos)
+            except Exception as e:
+                logger.error('保存热门新闻展示数据异常:\n{}'.format(e))
+        infos = [info or missing_infos.get(news_id) for news_id, info in zip(news_ids, infos)]
+    return [json.loads(info) for info in infos if info]
+
+
+def get_hot_news_rows(news_ids):
+    """
+    搜索页热门推荐的一页，每条是渲染好的html，没有缓存的查询数据库渲染后写回redis
+    :return: 和news_ids顺序一致的html列表
+    """
+    if not news_ids:
+        return []
+    try:
+        con_redis = get_redis_connection(alias='default')
+        rows = [row.decode('utf8') if row else None for row in con_redis.hmget(HOT_NEWS_ROW_KEY, news_ids)]
+    except Exception as e:
+        logger.error('读取热门推荐缓存异常:\n{}'.format(e))
+        con_redis, rows = None, [None] * len(news_ids)
+    missing = [news_id for news_id, row in zip(news_ids, rows) if row is None]
+    if missing:
+        hot_news = models.HotNews.objects.select_related('news__tag', 'news__author'). \
+            only('update_time', 'news__title', 'news__digest', 'news__image_url',
+                 'news__tag__name', 'news__author__username'). \
+            filter(is_delete=False, news_id__in=missing)
+        missing_rows = {hotnews.news_id: render_to_string('news/hot_news_row.html', {'one_hotnews': hotnews})
+                        for hotnews in hot_news}
+        if con_redis is not None and missing_rows:
+            try:
+                con_redis.hset(HOT_NEWS_ROW_KEY, mapping=missing_rows)
+            except Exception as e:
+                logger.error('保存热门推荐缓存异常:\n{}'.format(e))
+        rows = [row or missing_rows.get(news_id) for news_id, row in zip(news_ids, rows)]
+    return [row for row in rows if row]
+
+
+def set_hot_news(hotnews):
+    """热门新闻添加或修改优先级，热度保留，移到新优先级的有序集合中"""
+    try:
+        _set_hot_news(hotnews)
+    except Exception as e:
+        logger.error('更新热门新闻排行异常:\n{}'.format(e))
+
+
+def _set_hot_news(hotnews):
+    con_redis = get_redis_connection(alias='default')
+    if not con_redis.exists(HOT_NEWS_READY_KEY):
+        return      # 还没初始化，读取时会从数据库重建
+    news_id = hotnews.news_id
+    pl = con_redis.pipeline(transaction=False)
+    for key in HOT_NEWS_RANK_KEYS:
+        pl.zscore(key, news_id)
+    scores = [score for score in pl.execute() if score is not None]
+    if scores:
+        score = scores[0]
+    else:
+        # 新的热门新闻，已有的点击量当作现在的点击
+        clicks = models.News.objects.filter(id=news_id).values_list('clicks', flat=True).first() or 0
+        score = clicks * _click_weight(con_redis, time.time())
+    pl = con_redis.pipeline()
+    for key in HOT_NEWS_RANK_KEYS:
+        pl.zrem(key, news_id)
+    pl.zadd(HOT_NEWS_RANK_KEY.format(hotnews.priority), {news_id: score})
+    pl.hset(HOT_NEWS_PRIORITY_KEY, news_id, hotnews.priority)
+    pl.hdel(HOT_NEWS_INFO_KEY, news_id)
+    pl.hdel(HOT_NEWS_ROW_KEY, news_id)
+    pl.execute()
+
+
+def remove_hot_news(news_id):
+    """热门新闻删除"""
+    try:
+        con_redis = get_redis_connection(alias='default')
+        pl = con_redis.pipeline()
+        for key in HOT_NEWS_RANK_KEYS:
+            pl.zrem(key, news_id)
+        pl.hdel(HOT_NEWS_PRIORITY_KEY, news_id)
+        pl.hdel(HOT_NEWS_INFO_KEY, news_id)
+        pl.hdel(HOT_NEWS_ROW_KEY, news_id)
+        pl.execute()
+    except Exception as e:
+        logger.error('删除热门新闻排行异常:\n{}'.format(e))
+
+
+def clear_hot_news_info(news_id=None):
+    """
+    文章修改后，清掉热门新闻的展示数据，下次读取时重新查询
+    :param news_id: None表示全部(标签改名等)
+    """
+    try:
+        con_redis = get_redis_connection(alias='default')
+        if news_id is None:
+            con_redis.delete(HOT_NEWS_INFO_KEY, HOT_NEWS_ROW_KEY)
+            return
+        pl = con_redis.pipeline()
+        pl.hdel(HOT_NEWS_INFO_KEY, news_id)
+        pl.hdel(HOT_NEWS_ROW_KEY, news_id)
+        pl.execute()
+    except Exception as e:
+        logger.error('清除热门新闻展示数据异常:\n{}'.format(e))
+
+
+def rebase():
+    """
+    分数随时间指数增长，起始时间太久时把所有分数按比例缩小，起始时间改为现在
+    :return: 是否缩小了分数
+    """
+    con_redis = get_redis_connection(alias='default')
+    epoch = con_redis.get(HOT_NEWS_EPOCH_KEY)
+    now = time.time()
+    if not epoch or now - float(epoch) < constants.HOT_NEWS_REBASE_AFTER:
+        return False
+    factor = 2 ** ((float(epoch) - now) / constants.HOT_NEWS_HALF_LIFE)
+    pl = con_redis.pipeline()       # 事务中执行，点击累加不会插在中间
+    for key in HOT_NEWS_RANK_KEYS:
+        pl.zunionstore(key, {key: factor})
+    pl.set(HOT_NEWS_EPOCH_KEY, now)
+    pl.execute()
+    return True
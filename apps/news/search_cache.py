@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+"""
+搜索结果缓存：按规范化后的搜索词缓存前几页排好序的文章id和结果总数，翻页时只查询当前页的文章
+后面的页不缓存，翻到时只向elasticsearch查询这一页的id
+搜索索引每次更新时版本号加1，带旧版本号的缓存不会再被读到，等过期自动删除
+"""
+import hashlib
+import json
+import logging
+from django_redis import get_redis_connection
+
+from news import constants
+from utils.json_fun import json_dumps
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 搜索索引版本号
+SEARCH_GEN_KEY = 'search_gen'
+# 搜索结果缓存键：版本号，搜索词的md5
+SEARCH_RESULT_KEY = 'search_result_{}_{}'
+
+
+def normalize_query(query):
+    """去掉首尾和重复的空白，转成小写(elasticsearch分词时也会转成小写)"""
+    return ' '.join(query.split()).lower()
+
+
+def bump_search_gen():
+    """搜索索引内容变化后调用"""
+    try:
+        con_redis = get_redis_connection(alias='default')
+        con_redis.incr(SEARCH_GEN_KEY)
+    except Exception as e:
+        logger.error('搜索索引版本号更新异常:\n{}'.format(e))
+
+
+class SearchNewsIds:
+    """
+    给Paginator用的搜索结果id序列：长度为结果总数，
+    缓存范围内的页直接从缓存的id中切片，之后的页执行搜索取出这一页的id
+    """
+
+    def __init__(self, sqs, news_ids, count):
+        self.sqs = sqs
+        self.news_ids = news_ids
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, min(item.stop, self.count) if item.stop is not None else self.count
+        if stop <= len(self.news_ids):
+            return self.news_ids[start:stop]
+        return [int(pk) for pk in self.sqs.values_list('pk', flat=True)[start:stop]]
+
+
+def get_search_news_ids(query, sqs):
+    """
+    :param query: 搜索词
+    :param sqs: 搜索用的SearchQuerySet，缓存中没有或翻到缓存范围之后的页时才执行
+    :return: SearchNewsIds，缓存前SEARCH_RESULT_CACHE_COUNT条排好序的文章id
+    """
+    key = None
+    try:
+        con_redis = get_redis_connection(alias='default')
+        gen = int(con_redis.get(SEARCH_GEN_KEY) or 0)
+        key = SEARCH_RESULT_KEY.format(gen, hashlib.md5(normalize_query(query).encode('utf8')).hexdigest())
+        content = con_redis.get(key)
+        if content is not None:
+            result = json.loads(content.decode('utf8'))
+            return SearchNewsIds(sqs, result['ids'], result['count'])
+    except Exception as e:
+        logger.error('读取搜索结果缓存异常:\n{}'.format(e))
+
+    # 只取id，不返回文章内容，也不查询数据库；总数在这次搜索中一起返回
+    results = sqs.values_list('pk', flat=True)
+    news_ids = [int(pk) for pk in results[:constants.SEARCH_RESULT_CACHE_COUNT]]
+    count = results.count()
+    if key is not None:
+        try:
+            con_redis.setex(key, constants.SEARCH_RESULT_CACHE_EXPIRES, json_dumps({'ids': news_ids, 'count': count}))
+        except Exception as e:
+            logger.error('写入搜索结果缓存异常:\n{}'.format(e))
+    return SearchNewsIds(sqs, news_ids, count)
@@ -30,5 +30,10 @@ class NewsIndex(indexes.SearchIndex, indexes.Indexable):
         """返
         回要建立索引的数据查询集
         """
-        # return self.get_model().objects.filter(is_delete=False, tag_id=1)
-        return self.get_model().objects.filter(is_delete=False, tag_id__in=[1, 2, 3, 4, 5, 6])
\ No newline at end of file
+        # 只查询建立索引用到的字段
+        return self.get_model().objects.only('id', 'title', 'digest', 'content', 'image_url', 'update_time').\
+            filter(is_delete=False)
+
+    def get_updated_field(self):
+        """增量更新索引时按这个字段找出修改过的文章(update_index --age和reindex_news命令)"""
+        return 'update_time'
@@ -0,0 +1,143 @@
+# -*- coding:utf-8 -*-
+"""
+按update_time增量重建搜索索引：记住上次建索引的时间，只处理之后修改过的文章
+全量重建时按id分段，多个进程同时查询数据库、批量写入elasticsearch
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from django import db
+from django.db.models import Max, Min
+from django.utils import timezone
+from django_redis import get_redis_connection
+from haystack import connections
+
+from news import constants
+from news.search_cache import bump_search_gen
+from news.search_signals import bulk_remove
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 上次建索引的时间(时间戳)
+SEARCH_INDEX_WATERMARK_KEY = 'search_index_watermark'
+
+
+def _get_index():
+    from news.models import News
+    index = connections['default'].get_unified_index().get_index(News)
+    return index, index.get_backend()
+
+
+def _index_queryset(queryset, batch_size, chunk_size):
+    """流式读取(不一次加载所有行)，每batch_size篇一次批量写入，返回写入的文章数"""
+    index, backend = _get_index()
+    count = 0
+    batch = []
+    for news in queryset.iterator(chunk_size=chunk_size):
+        batch.append(news)
+        if len(batch) >= batch_size:
+            backend.update(index, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        backend.update(index, batch)
+        count += len(batch)
+    return count
+
+
+def _index_id_range(start_id, end_id, batch_size, chunk_size):
+    """子进程中执行：索引id在[start_id, end_id)之间的文章"""
+    index, _ = _get_index()
+    queryset = index.index_queryset().filter(id__gte=start_id, id__lt=end_id).order_by('id')
+    return _index_queryset(queryset, batch_size, chunk_size)
+
+
+def _init_worker():
+    # fork出来的子进程不能和父进程共用数据库、elasticsearch的连接
+    connections.reload('default')
+
+
+def get_watermark():
+    con_redis = get_redis_connection(alias='default')
+    watermark = con_redis.get(SEARCH_INDEX_WATERMARK_KEY)
+    if watermark is None:
+        return None
+    return datetime.fromtimestamp(float(watermark), tz=timezone.utc)
+
+
+def set_watermark(value):
+    con_redis = get_redis_connection(alias='default')
+    con_redis.set(SEARCH_INDEX_WATERMARK_KEY, value.timestamp())
+
+
+def reindex_changed(since, batch_size, chunk_size):
+    """
+    索引since之后修改过的文章，逻辑删除的从索引中删除
+    :return: (更新的文章数, 删除的文章数)
+    """
+    from news.models import News
+    index, backend = _get_index()
+    queryset = index.index_queryset().filter(update_time__gte=since).order_by('id')
+    updated = _index_queryset(queryset, batch_size, chunk_size)
+    removed = 0
+    deleted_ids = News.objects.filter(update_time__gte=since, is_delete=True).values_list('id', flat=True)
+    batch = []
+    for news_id in deleted_ids.iterator(chunk_size=chunk_size):
+        batch.append('{}.{}'.format(News._meta.label_lower, news_id))
+        if len(batch) >= batch_size:
+            bulk_remove(backend, batch)
+            removed += len(batch)
+            batch = []
+    if batch:
+        bulk_remove(backend, batch)
+        removed += len(batch)
+    return updated, removed
+
+
+def reindex_all(workers, batch_size, chunk_size, clear=False):
+    """
+    全量重建：id范围分成workers * 4段，分给多个进程
+    :param clear: 先清空索引(删除已不存在的文章)，重建期间搜索不到结果
+    :return: 索引的文章数
+    """
+    from news.models import News
+    index, backend = _get_index()
+    if clear:
+        backend.clear(models=[News])
+    id_range = index.index_queryset().aggregate(min_id=Min('id'), max_id=Max('id'))
+    if id_range['min_id'] is None:
+        return 0
+    start_id, end_id = id_range['min_id'], id_range['max_id'] + 1
+    if workers <= 1:
+        return _index_id_range(start_id, end_id, batch_size, chunk_size)
+
+    step = max((end_id - start_id) // (workers * 4) + 1, batch_size)
+    ranges = [(i, min(i + step, end_id)) for i in range(start_id, end_id, step)]
+    # 子进程会重新连接数据库
+    db.connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(_index_id_range, s, e, batch_size, chunk_size) for s, e in ranges]
+        return sum(future.result() for future in futures)
+
+
+def reindex(full=False, clear=False, workers=constants.SEARCH_REINDEX_WORKERS,
+            batch_size=constants.SEARCH_INDEX_BATCH_SIZE, chunk_size=constants.SEARCH_REINDEX_CHUNK_SIZE):
+    """
+    没有记录过建索引的时间或full=True时全量重建，否则增量
+    :return: (更新的文章数, 删除的文章数)
+    """
+    # 执行期间修改、但比查询晚提交的文章，下次再处理一遍
+    started = timezone.now() - timedelta(seconds=constants.SEARCH_REINDEX_OVERLAP)
+    since = None if full else get_watermark()
+    begin = time.time()
+    if since is None:
+        result = reindex_all(workers, batch_size, chunk_size, clear=clear), 0
+    else:
+        result = reindex_changed(since, batch_size, chunk_size)
+    set_watermark(started)
+    bump_search_gen()
+    logger.info('搜索索引{}重建完成：更新{}篇，删除{}篇，耗时{:.1f}秒'.format(
+        '增量' if since else '全量', result[0], result[1], time.time() - begin))
+    return result
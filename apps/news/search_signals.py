@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+"""
+搜索索引异步更新：文章保存、删除时只把id记到redis集合中(自动去重)，
+由update_search_index命令批量更新elasticsearch，后台请求不用等待elasticsearch
+settings中设置 HAYSTACK_SIGNAL_PROCESSOR = 'news.search_signals.QueuedSignalProcessor'
+"""
+import logging
+from django.db import transaction
+from django.db.models import signals
+from django_redis import get_redis_connection
+from haystack import connections
+from haystack.signals import BaseSignalProcessor
+
+from news.search_cache import bump_search_gen
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 需要更新索引的文章id集合
+SEARCH_DIRTY_NEWS_KEY = 'search_dirty_news'
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """只监听News的保存和删除"""
+    def setup(self):
+        from news.models import News
+        signals.post_save.connect(self.handle_save, sender=News)
+        signals.post_delete.connect(self.handle_delete, sender=News)
+
+    def teardown(self):
+        from news.models import News
+        signals.post_save.disconnect(self.handle_save, sender=News)
+        signals.post_delete.disconnect(self.handle_delete, sender=News)
+
+    def handle_save(self, sender, instance, **kwargs):
+        mark_news_dirty(instance.id)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        mark_news_dirty(instance.id)
+
+
+def mark_news_dirty(news_id):
+    """事务提交后再记录，更新索引时读到的是提交后的数据"""
+    def add():
+        try:
+            con_redis = get_redis_connection(alias='default')
+            con_redis.sadd(SEARCH_DIRTY_NEWS_KEY, news_id)
+        except Exception as e:
+            logger.error('记录需要更新索引的文章异常:\n{}'.format(e))
+    transaction.on_commit(add)
+
+
+def bulk_remove(backend, identifiers):
+    """elasticsearch一次请求批量删除，其他搜索后端逐条删除"""
+    if hasattr(backend, 'conn') and hasattr(backend, 'index_name'):
+        from elasticsearch.helpers import bulk
+        actions = [{'_op_type': 'delete', '_id': identifier} for identifier in identifiers]
+        # 索引中本来就没有的文档会返回404，忽略
+        bulk(backend.conn, actions, index=backend.index_name, doc_type='modelresult', raise_on_error=False)
+    else:
+        for identifier in identifiers:
+            backend.remove(identifier, commit=False)
+
+
+def update_dirty_news(batch_size):
+    """
+    取出一批文章id，还在索引范围内的批量更新，已删除(或不在索引范围内)的批量删除
+    :return: 处理的文章数
+    """
+    from news.models import News
+
+    con_redis = get_redis_connection(alias='default')
+    news_ids = [int(news_id) for news_id in con_redis.spop(SEARCH_DIRTY_NEWS_KEY, batch_size)]
+    if not news_ids:
+        return 0
+    try:
+        index = connections['default'].get_unified_index().get_index(News)
+        backend = index.get_backend()
+        news = list(index.index_queryset().filter(id__in=news_ids))
+        removed_ids = set(news_ids) - set(n.id for n in news)
+        if removed_ids:
+            bulk_remove(backend, ['{}.{}'.format(News._meta.label_lower, news_id) for news_id in removed_ids])
+        if news:
+            backend.update(index, news)
+    except Exception:
+        # 放回集合，下次重试
+        con_redis.sadd(SEARCH_DIRTY_NEWS_KEY, *news_ids)
+        raise
+    # 搜索结果缓存失效
+    bump_search_gen()
+    return len(news_ids)
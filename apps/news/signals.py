@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+"""
+数据变化后让缓存失效：版本号加1、删除缓存都在事务提交后执行，
+否则提交前其他请求读到旧数据，又用新版本号缓存起来，旧数据会一直留在缓存中
+"""
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from news import models
+from news import constants
+from news.caches import bump_news_list_gen
+from news.comments import incr_comments_count
+from news import ranking
+from news import clicks
+from news.bootstrap import schedule_rebuild
+from news import suggest
+from utils.etags import bump_page_versions
+
+
+@receiver(post_init, sender=models.News)
+def remember_news_tag(sender, instance, **kwargs):
+    """记住文章加载时的标签，编辑文章换了标签时旧标签的缓存也要失效"""
+    # 用__dict__取值，tag_id被延迟加载时不会触发查询
+    instance._loaded_tag_id = instance.__dict__.get('tag_id')
+    # 标题改了或逻辑删除时，搜索提示中删掉旧标题
+    instance._loaded_title = instance.__dict__.get('title')
+    instance._loaded_is_delete = instance.__dict__.get('is_delete')
+
+
+@receiver(post_save, sender=models.News)
+@receiver(post_delete, sender=models.News)
+def news_changed(sender, instance, **kwargs):
+    """文章发布、编辑、删除后，文章所在标签和"最新资讯"的列表缓存失效"""
+    news_id, tag_ids = instance.id, (instance.tag_id, instance._loaded_tag_id, 0)
+    instance._loaded_tag_id = instance.__dict__.get('tag_id')
+
+    def invalidate():
+        bump_news_list_gen(*tag_ids)
+        # 标题、图片可能改了，热门新闻的展示数据重新查询
+        ranking.clear_hot_news_info(news_id)
+        # 文章详情页的ETag变化
+        bump_page_versions(constants.NEWS_DETAIL_PAGE.format(news_id))
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=models.News)
+@receiver(post_delete, sender=models.News)
+def news_ids_changed(sender, instance, signal, **kwargs):
+    """点击量只记录未删除的文章(见clicks)"""
+    is_delete = instance.__dict__.get('is_delete')
+    if signal is post_save and is_delete is None:
+        return      # is_delete被延迟加载，没有修改
+    news_id, exists = instance.id, signal is post_save and not is_delete
+    transaction.on_commit(lambda: clicks.set_news_exists(news_id, exists))
+
+
+@receiver(post_save, sender=models.News)
+def news_saved_suggest(sender, instance, created, **kwargs):
+    """发布、编辑、逻辑删除文章后更新搜索提示中的标题，搜索提示按引用计数，标题没有变化时不记录"""
+    title = instance.__dict__.get('title')
+    if title is None and instance._loaded_is_delete is False and instance.is_delete:
+        # 逻辑删除时没有加载标题，标题没有修改，从数据库取
+        title = instance._loaded_title = models.News.objects.filter(id=instance.id).\
+            values_list('title', flat=True).first()
+    # 只更新了其他字段(标题被延迟加载)时不处理
+    old_title = None if created or instance._loaded_is_delete else instance._loaded_title
+    new_title = None if instance.is_delete else title
+    if title is not None and old_title != new_title:
+        suggest.log_changes(('del', old_title), ('add', new_title))
+    instance._loaded_title = title
+    instance._loaded_is_delete = instance.is_delete
+
+
+@receiver(post_delete, sender=models.News)
+def news_deleted_suggest(sender, instance, **kwargs):
+    if not instance._loaded_is_delete:
+        suggest.log_changes(('del', instance._loaded_title))
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(post_delete, sender=models.Tag)
+def tag_changed(sender, instance, **kwargs):
+    """标签改名、删除后，列表中的标签名需要更新"""
+    tag_id = instance.id
+
+    def invalidate():
+        bump_news_list_gen(tag_id, 0)
+        # 搜索页热门推荐中也显示标签名
+        ranking.clear_hot_news_info()
+        # 文章详情页显示标签名
+        bump_page_versions(constants.TAGS_PAGE)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=models.Comments)
+@receiver(post_delete, sender=models.Comments)
+def comment_changed(sender, instance, **kwargs):
+    """文章详情页显示第一页评论和评论数"""
+    page = constants.NEWS_DETAIL_PAGE.format(instance.news_id)
+    transaction.on_commit(lambda: bump_page_versions(page))
+
+
+@receiver(post_init, sender=models.Comments)
+def remember_comment_is_delete(sender, instance, **kwargs):
+    """记住评论加载时是否已逻辑删除，保存时据此加减评论总数"""
+    instance._loaded_is_delete = instance.__dict__.get('is_delete')
+
+
+@receiver(post_save, sender=models.Comments)
+def comment_saved(sender, instance, created, **kwargs):
+    """发表评论后评论总数加1，逻辑删除减1，恢复加1"""
+    # is_delete被延迟加载时不处理
+    is_delete = instance.__dict__.get('is_delete')
+    if created:
+        if not is_delete:
+            incr_comments_count(instance.news_id)
+    elif is_delete is not None and instance._loaded_is_delete is not None and is_delete != instance._loaded_is_delete:
+        incr_comments_count(instance.news_id, -1 if is_delete else 1)
+    instance._loaded_is_delete = is_delete
+
+
+@receiver(post_delete, sender=models.Comments)
+def comment_deleted(sender, instance, **kwargs):
+    if not instance.is_delete:
+        incr_comments_count(instance.news_id, -1)
+
+
+@receiver(post_save, sender=models.HotNews)
+def hot_news_saved(sender, instance, **kwargs):
+    """热门新闻添加、修改优先级、逻辑删除后同步redis中的排行"""
+    if instance.is_delete:
+        ranking.remove_hot_news(instance.news_id)
+    else:
+        ranking.set_hot_news(instance)
+
+
+@receiver(post_delete, sender=models.HotNews)
+def hot_news_deleted(sender, instance, **kwargs):
+    ranking.remove_hot_news(instance.news_id)
+
+
+@receiver(post_save, sender=models.News)
+@receiver(post_delete, sender=models.News)
+@receiver(post_save, sender=models.Tag)
+@receiver(post_delete, sender=models.Tag)
+@receiver(post_save, sender=models.HotNews)
+@receiver(post_delete, sender=models.HotNews)
+@receiver(post_save, sender=models.Banner)
+@receiver(post_delete, sender=models.Banner)
+def home_page_changed(sender, **kwargs):
+    """首页展示的数据变化后，重新生成首页初始数据"""
+    schedule_rebuild()
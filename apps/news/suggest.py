@@ -0,0 +1,232 @@
+# -*- coding:utf-8 -*-
+"""
+搜索框输入提示：文章标题、标签名、搜索次数最多的搜索词按小写排序放在进程内存中，用二分查找找前缀
+发布、编辑、删除文章时把变化记到redis的日志中，各进程每隔SEARCH_SUGGEST_REFRESH_INTERVAL秒读取一次增量，
+日志被截断(进程太久没读)时整个重新加载；另外每隔SEARCH_SUGGEST_REBUILD_INTERVAL秒整个重新加载一次，更新搜索词
+整个重新加载要查询所有文章标题，在后台线程中执行，请求不等待，继续使用旧数据
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from django import db
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from news import models
+from news import constants
+from news.search_cache import normalize_query
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 搜索词的搜索次数(有序集合)
+SEARCH_QUERY_RANK_KEY = 'search_query_rank'
+# 变化日志的序号
+SEARCH_SUGGEST_SEQ_KEY = 'search_suggest_seq'
+# 变化日志，每条是"序号:操作:词"，操作为add或del
+SEARCH_SUGGEST_LOG_KEY = 'search_suggest_log'
+
+# 文章标题、标签名的权重，搜索词的权重是搜索次数
+TITLE_WEIGHT = 1
+TAG_WEIGHT = 2
+
+# 取序号和写日志在一个脚本中完成，日志的顺序和序号一致
+# KEYS: 序号，日志  ARGV: 保留的日志条数，"操作:词"...
+LOG_SCRIPT = """
+for i = 2, #ARGV do
+    local seq = redis.call('INCR', KEYS[1])
+    redis.call('RPUSH', KEYS[2], seq .. ':' .. ARGV[i])
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[1]), -1)
+return 1
+"""
+
+
+def record_query(query):
+    """搜索次数加1，搜索词太多时只保留次数多的"""
+    query = normalize_query(query)
+    if not query or len(query) > constants.SEARCH_SUGGEST_MAX_LENGTH:
+        return
+    try:
+        con_redis = get_redis_connection(alias='default')
+        con_redis.zincrby(SEARCH_QUERY_RANK_KEY, 1, query)
+    except Exception as e:
+        logger.error('记录搜索词异常:\n{}'.format(e))
+
+
+def trim_queries():
+    """只保留搜索次数最多的SEARCH_SUGGEST_QUERY_COUNT个搜索词(重新加载时调用)"""
+    con_redis = get_redis_connection(alias='default')
+    con_redis.zremrangebyrank(SEARCH_QUERY_RANK_KEY, 0, -constants.SEARCH_SUGGEST_QUERY_COUNT - 1)
+
+
+def log_changes(*changes):
+    """
+    事务提交后写入变化日志
+    :param changes: (操作, 词)，操作为'add'或'del'
+    """
+    args = ['{}:{}'.format(op, word) for op, word in changes if word]
+    if not args:
+        return
+
+    def write():
+        try:
+            con_redis = get_redis_connection(alias='default')
+            log_script = con_redis.register_script(LOG_SCRIPT)
+            log_script(keys=[SEARCH_SUGGEST_SEQ_KEY, SEARCH_SUGGEST_LOG_KEY],
+                       args=[constants.SEARCH_SUGGEST_LOG_SIZE] + args)
+        except Exception as e:
+            logger.error('记录搜索提示变化异常:\n{}'.format(e))
+    transaction.on_commit(write)
+
+
+class SuggestIndex(object):
+    """
+    四个列表按下标对应：小写的词(排好序)，原来的词，权重，引用计数
+    引用计数是产生这个词的文章标题、标签名、搜索词的个数，减到0时才删除
+    修改时生成新的列表再整体替换，查询不用加锁
+    """
+    def __init__(self):
+        self._data = ([], [], [], [])
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._checked_at = 0
+        self._built_at = 0
+        self._rebuild_thread = None
+
+    def _rebuild(self, con_redis):
+        seq = int(con_redis.get(SEARCH_SUGGEST_SEQ_KEY) or 0)
+        words = {}
+        counts = Counter()
+        for title in models.News.objects.filter(is_delete=False).values_list('title', flat=True):
+            words[title.lower()] = (title, TITLE_WEIGHT)
+            counts[title.lower()] += 1
+        for name in models.Tag.objects.filter(is_delete=False).values_list('name', flat=True):
+            words[name.lower()] = (name, TAG_WEIGHT)
+            counts[name.lower()] += 1
+        trim_queries()
+        for query, score in con_redis.zrevrange(SEARCH_QUERY_RANK_KEY, 0, -1, withscores=True):
+            query = query.decode('utf8')
+            word, weight = words.get(query, (query, 0))
+            words[query] = (word, weight + int(score))
+            counts[query] += 1
+        keys = sorted(words)
+        self._data = (keys, [words[key][0] for key in keys], [words[key][1] for key in keys],
+                      [counts[key] for key in keys])
+        self._seq = seq
+        self._built_at = time.time()
+
+    def _apply(self, changes):
+        keys, words, weights, counts = (list(items) for items in self._data)
+        for op, word in changes:
+            key = word.lower()
+            i = bisect_left(keys, key)
+            found = i < len(keys) and keys[i] == key
+            if op == 'add' and found:
+                counts[i] += 1
+            elif op == 'add':
+                keys.insert(i, key)
+                words.insert(i, word)
+                weights.insert(i, TITLE_WEIGHT)
+                counts.insert(i, 1)
+            elif op == 'del' and found:
+                counts[i] -= 1
+                if not counts[i]:
+                    del keys[i], words[i], weights[i], counts[i]
+        self._data = (keys, words, weights, counts)
+
+    def _refresh(self):
+        """
+        读取增量；需要整个重新加载时在后台线程中执行，锁交给后台线程释放
+        :return: 是否启动了后台线程
+        """
+        if time.time() - self._built_at > constants.SEARCH_SUGGEST_REBUILD_INTERVAL:
+            return self._start_rebuild()
+        con_redis = get_redis_connection(alias='default')
+        seq = int(con_redis.get(SEARCH_SUGGEST_SEQ_KEY) or 0)
+        if seq == self._seq:
+            return False
+        changes = []
+        for line in con_redis.lrange(SEARCH_SUGGEST_LOG_KEY, 0, -1):
+            line_seq, op, word = line.decode('utf8').split(':', 2)
+            if int(line_seq) > self._seq:
+                changes.append((int(line_seq), op, word))
+        if seq - self._seq > len(changes):
+            # 需要的日志已经被截断
+            return self._start_rebuild()
+        self._apply((op, word) for line_seq, op, word in changes)
+        self._seq = changes[-1][0] if changes else seq
+        return False
+
+    def _start_rebuild(self):
+        self._rebuild_thread = threading.Thread(target=self._rebuild_in_background, daemon=True)
+        self._rebuild_thread.start()
+        return True
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error('搜索提示数据重新加载异常:\n{}'.format(e))
+        finally:
+            # 线程中打开的数据库连接不会被请求结束时的信号关闭
+            db.connection.close()
+            self._lock.release()
+
+    def rebuild(self):
+        """整个重新加载(要查询所有文章标题)，在后台线程中执行，不占用请求的时间"""
+        self._rebuild(get_redis_connection(alias='default'))
+
+    def refresh(self):
+        """
+        最多每SEARCH_SUGGEST_REFRESH_INTERVAL秒检查一次，其他请求不访问redis
+        进程启动后第一次加载完成之前没有搜索提示
+        """
+        now = time.time()
+        if now - self._checked_at < constants.SEARCH_SUGGEST_REFRESH_INTERVAL:
+            return
+        # 一个线程刷新(重新加载时由后台线程持有锁)，其他线程继续用旧数据
+        if not self._lock.acquire(blocking=False):
+            return
+        in_background = False
+        try:
+            if now - self._checked_at >= constants.SEARCH_SUGGEST_REFRESH_INTERVAL:
+                # 先记下检查时间，redis出错时也要等下一个间隔再试，不会每个请求都去访问
+                self._checked_at = now
+                in_background = self._refresh()
+        except Exception as e:
+            logger.error('搜索提示数据更新异常:\n{}'.format(e))
+        finally:
+            if not in_background:
+                self._lock.release()
+
+    def suggest(self, prefix, count):
+        """
+        :return: 以prefix开头(不分大小写)、权重最高的count个词
+        """
+        prefix = prefix.lower()
+        keys, words, weights = self._data[:3]
+        start = bisect_left(keys, prefix)
+        # 前缀很短时匹配的词很多，只看前SEARCH_SUGGEST_SCAN_COUNT个
+        end = min(len(keys), start + constants.SEARCH_SUGGEST_SCAN_COUNT)
+        matches = []
+        for i in range(start, end):
+            if not keys[i].startswith(prefix):
+                break
+            matches.append(i)
+        best = heapq.nsmallest(count, matches, key=lambda i: (-weights[i], len(keys[i]), keys[i]))
+        return [words[i] for i in best]
+
+
+suggest_index = SuggestIndex()
+
+
+def get_suggestions(prefix, count=constants.SEARCH_SUGGEST_COUNT):
+    prefix = normalize_query(prefix)
+    if not prefix:
+        return []
+    suggest_index.refresh()
+    return suggest_index.suggest(prefix, count)
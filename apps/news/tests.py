@@ -1,3 +1,730 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from django.core.management import call_command, CommandError
+from django.db import connection, connections
+from unittest import mock
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django_redis import get_redis_connection
+from haystack import connections as haystack_connections
+from haystack.exceptions import SearchBackendError
+from haystack.query import SearchQuerySet
 
-# Create your tests here.
+from news import models
+from news import constants
+from news.comments import load_comment_page, comments_to_dict_list
+from news import suggest
+from news import clicks
+from news import ranking
+from news.caches import NEWS_LIST_GEN_KEY
+from news.search_reindex import reindex
+from news.search_signals import SEARCH_DIRTY_NEWS_KEY, update_dirty_news
+from user.models import Users
+from utils import json_fun
+from utils.json_fun import to_json_data
+from utils.local_search.backend import LocalSearchBackend
+from utils.local_search.index import IndexWriter, get_reader
+from utils.testing import FakeRedisMixin, LocalSearchMixin
+
+
+class CommentThreadTest(FakeRedisMixin, TestCase):
+    """评论批量加载：查询次数不随评论数量和回复层数增加"""
+
+    def setUp(self):
+        self.tag = models.Tag.objects.create(name='Python基础')
+        self.user = Users.objects.create_user(username='comment_user', password='123456', mobile='13800000001')
+        self.news = models.News.objects.create(title='标题', digest='摘要', content='内容',
+                                               tag=self.tag, author=self.user)
+
+    def add_comments(self, count):
+        """添加count条评论，每条都回复上一条，形成一条长长的回复链"""
+        parent = None
+        for i in range(count):
+            author = Users.objects.create_user(username='user_{}_{}'.format(count, i), password='123456',
+                                               mobile='139{:08d}'.format(count * 100 + i))
+            parent = models.Comments.objects.create(content='评论{}'.format(i), news=self.news,
+                                                    author=author, parent=parent)
+        return parent
+
+    def count_queries(self, func, *args):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args)
+        return len(ctx.captured_queries), result
+
+    def test_page_query_count_is_constant(self):
+        self.add_comments(12)
+        few_queries, (few, _) = self.count_queries(load_comment_page, self.news.id, None)
+        self.add_comments(30)
+        many_queries, (many, next_cursor) = self.count_queries(load_comment_page, self.news.id, None)
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(len(many), constants.PER_PAGE_COMMENTS_COUNT)
+        # 父评论在内存中组装，格式和to_dict_data一致
+        newest = many[0]
+        self.assertEqual(newest['content'], '评论29')
+        self.assertEqual(newest['parent']['content'], '评论28')
+        self.assertEqual(newest['parent']['author'], 'user_30_28')
+        # 按游标翻完所有页
+        total = len(many)
+        while next_cursor:
+            page, next_cursor = load_comment_page(self.news.id, next_cursor)
+            total += len(page)
+        self.assertEqual(total, 42)
+
+    def test_reply_query_count_is_constant(self):
+        short_reply = self.add_comments(2)
+        short_queries, _ = self.count_queries(comments_to_dict_list, [short_reply])
+        long_reply = self.add_comments(30)
+        long_queries, result = self.count_queries(comments_to_dict_list, [long_reply])
+
+        self.assertEqual(short_queries, long_queries)
+        # 回复链一直到第一条评论
+        depth, parent = 0, result[0]['parent']
+        while parent:
+            depth, parent = depth + 1, parent['parent']
+        self.assertEqual(depth, 29)
+
+
+class ReindexTest(FakeRedisMixin, LocalSearchMixin, TestCase):
+    """增量重建搜索索引：修改过的文章更新，后台逻辑删除的文章从索引中删除"""
+
+    def setUp(self):
+        super(ReindexTest, self).setUp()
+        self.user = Users.objects.create_user(username='admin_user', password='123456', mobile='13800000002',
+                                              is_staff=True, is_superuser=True)
+        self.news = [models.News.objects.create(title='学习{}'.format(i), digest='摘要', content='学习内容',
+                                                author=self.user) for i in range(5)]
+        # 文章是之前发布的，不在增量重建的时间范围内
+        models.News.objects.update(update_time=timezone.now() - timedelta(days=1))
+
+    def test_incremental_reindex(self):
+        self.assertEqual(reindex(workers=1, batch_size=2, chunk_size=2), (5, 0))
+        self.assertEqual(SearchQuerySet().auto_query('学习').count(), 5)
+
+        # 后台删除文章
+        self.client.login(username='admin_user', password='123456')
+        response = self.client.delete('/admin/news/{}/'.format(self.news[0].id))
+        self.assertEqual(response.json()['errno'], '0')
+        news = self.news[1]
+        news.title = '机器'
+        news.save()
+
+        self.assertEqual(reindex(batch_size=2, chunk_size=2), (1, 1))
+        self.assertEqual(SearchQuerySet().auto_query('学习').count(), 4)
+        self.assertEqual(SearchQuerySet().auto_query('机器').count(), 1)
+
+    def test_clear_requires_full(self):
+        with self.assertRaises(CommandError):
+            call_command('reindex_news', clear=True)
+
+
+class SuggestTest(FakeRedisMixin, TransactionTestCase):
+    """搜索提示：同一个词有多个来源时按引用计数，后台逻辑删除文章后标题从提示中删除"""
+
+    def setUp(self):
+        super(SuggestTest, self).setUp()
+        self.index = suggest.SuggestIndex()
+        patcher = mock.patch.object(suggest, 'suggest_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = Users.objects.create_user(username='admin_user', password='123456', mobile='13800000003',
+                                              is_staff=True, is_superuser=True)
+        self.client.login(username='admin_user', password='123456')
+
+    def suggest(self, prefix):
+        """跳过检查间隔，读取增量后返回提示"""
+        self.index._checked_at = 0
+        return self.client.get('/search/suggest/', {'q': prefix}).json()['data']['words']
+
+    def test_soft_delete_keeps_shared_title(self):
+        first = models.News.objects.create(title='Rust入门', digest='摘要', content='内容', author=self.user)
+        second = models.News.objects.create(title='Rust入门', digest='摘要', content='内容', author=self.user)
+        self.index.rebuild()
+        self.assertEqual(self.suggest('rust'), ['Rust入门'])
+
+        # 只修改其他字段不记录变化
+        second.digest = '新摘要'
+        second.save()
+        self.client.delete('/admin/news/{}/'.format(first.id))
+        self.assertEqual(self.suggest('rust'), ['Rust入门'])
+        self.client.delete('/admin/news/{}/'.format(second.id))
+        self.assertEqual(self.suggest('rust'), [])
+
+        log = get_redis_connection(alias='default').lrange(suggest.SEARCH_SUGGEST_LOG_KEY, 0, -1)
+        self.assertEqual([line.decode('utf8').split(':', 1)[1] for line in log],
+                         ['add:Rust入门', 'add:Rust入门', 'del:Rust入门', 'del:Rust入门'])
+
+    def test_rebuild_in_background(self):
+        models.News.objects.create(title='Django教程', digest='摘要', content='内容', author=self.user)
+        # 第一次加载在后台线程中执行，请求不等待
+        self.assertEqual(self.suggest('dj'), [])
+        self.index._rebuild_thread.join()
+        self.assertEqual(self.suggest('dj'), ['Django教程'])
+
+    def test_paginated_search_not_recorded(self):
+        con_redis = get_redis_connection(alias='default')
+        self.client.get('/search/', {'q': 'golang', 'page': 2})
+        self.assertIsNone(con_redis.zscore(suggest.SEARCH_QUERY_RANK_KEY, 'golang'))
+        self.client.get('/search/', {'q': 'golang'})
+        self.assertEqual(con_redis.zscore(suggest.SEARCH_QUERY_RANK_KEY, 'golang'), 1)
+
+
+class NewsListCacheTest(FakeRedisMixin, TransactionTestCase):
+    """新闻列表按标签和页码缓存，文章修改提交后缓存失效"""
+
+    def setUp(self):
+        super(NewsListCacheTest, self).setUp()
+        self.user = Users.objects.create_user(username='list_user', password='123456', mobile='13800000004')
+        self.tag = models.Tag.objects.create(name='Python基础')
+        self.news = [models.News.objects.create(title='标题{}'.format(i), digest='摘要', content='内容',
+                                                tag=self.tag, author=self.user) for i in range(7)]
+
+    def get_titles(self, **params):
+        data = self.client.get('/news/', params).json()['data']
+        return [news['title'] for news in data['news']]
+
+    def test_cached_until_news_changed(self):
+        titles = self.get_titles(tag_id=self.tag.id, page=1)
+        self.assertEqual(len(titles), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_titles(tag_id=self.tag.id, page=1), titles)
+
+        news = self.news[-1]
+        news.title = '新标题'
+        news.save()
+        self.assertIn('新标题', self.get_titles(tag_id=self.tag.id, page=1))
+
+    def test_invalidate_after_commit(self):
+        con_redis = get_redis_connection(alias='default')
+        key = NEWS_LIST_GEN_KEY.format(self.tag.id)
+        gen = con_redis.get(key)
+        with transaction.atomic():
+            news = self.news[-1]
+            news.title = '新标题'
+            news.save()
+            # 提交前其他请求读到的是旧数据，版本号不能先变
+            self.assertEqual(con_redis.get(key), gen)
+        self.assertNotEqual(con_redis.get(key), gen)
+        self.assertIn('新标题', self.get_titles(tag_id=self.tag.id, page=1))
+
+
+class NewsClickTest(FakeRedisMixin, TransactionTestCase):
+    """点击量只记录存在的文章，写入数据库提交后才从redis中删除"""
+
+    def setUp(self):
+        super(NewsClickTest, self).setUp()
+        user = Users.objects.create_user(username='click_user', password='123456', mobile='13800000005')
+        tag = models.Tag.objects.create(name='Python基础')
+        self.news = models.News.objects.create(title='标题', digest='摘要', content='内容', tag=tag, author=user)
+
+    def click(self, news_id):
+        return self.client.post('/news/{}/click/'.format(news_id)).status_code
+
+    def test_reject_unknown_news(self):
+        con_redis = get_redis_connection(alias='default')
+        self.assertEqual(self.click(self.news.id), 204)
+        self.assertEqual(self.click(self.news.id + 100), 404)
+        self.assertEqual(con_redis.hgetall(clicks.NEWS_CLICKS_KEY), {str(self.news.id).encode(): b'1'})
+
+        self.news.is_delete = True
+        self.news.save()
+        self.assertEqual(self.click(self.news.id), 404)
+        self.news.is_delete = False
+        self.news.save()
+        self.assertEqual(self.click(self.news.id), 204)
+
+    def test_delete_batch_after_commit(self):
+        con_redis = get_redis_connection(alias='default')
+        self.click(self.news.id)
+        self.click(self.news.id)
+        real_commit, flushing = connections['default'].commit, []
+
+        def commit():
+            # 提交前进程退出时这批点击还在redis中
+            flushing.append(con_redis.hget(clicks.NEWS_CLICKS_FLUSHING_KEY, self.news.id))
+            real_commit()
+        with mock.patch.object(connections['default'], 'commit', side_effect=commit):
+            self.assertEqual(clicks.flush_clicks(), 1)
+        self.assertEqual(flushing, [b'2'])
+        self.assertFalse(con_redis.exists(clicks.NEWS_CLICKS_FLUSHING_KEY))
+        self.assertEqual(models.News.objects.get(id=self.news.id).clicks, 2)
+
+
+class LocalSearchIndexTest(SimpleTestCase):
+    """本地搜索索引：修改只写新分段，同一数量级的分段凑满后合并"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    def write(self, *docs):
+        with IndexWriter(self.path) as writer:
+            for doc_id, text in docs:
+                writer.update(doc_id, {'title': text}, text)
+
+    def search(self, query, exclude=()):
+        return [doc_id for doc_id, _, _ in get_reader(self.path).search(query, exclude)]
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.path) if name.startswith('seg_'))
+
+    def test_update_writes_new_segment_only(self):
+        self.write(('news.news.1', '机器学习入门'), ('news.news.2', '深度学习'), ('news.news.3', 'Python基础'))
+        postings = os.path.join(self.path, 'seg_1', 'postings.bin')
+        mtime = os.stat(postings).st_mtime_ns
+        self.write(('news.news.2', 'Django教程'))
+
+        self.assertEqual(self.segments(), ['seg_1', 'seg_2'])
+        self.assertEqual(os.stat(postings).st_mtime_ns, mtime)
+        self.assertEqual(self.search('学习'), ['news.news.1'])
+        self.assertEqual(self.search('django'), ['news.news.2'])
+        with IndexWriter(self.path) as writer:
+            writer.remove('news.news.3')
+        self.assertEqual(self.search('python'), [])
+
+    def test_merge_segments(self):
+        with mock.patch('utils.local_search.index.MERGE_FACTOR', 3):
+            for i in range(1, 4):
+                self.write(('news.news.{}'.format(i), '文章{}'.format(i)))
+            # 3个只有1篇文章的分段合并成1个
+            self.assertEqual(self.segments(), ['seg_4'])
+            self.write(('news.news.1', '修改'))
+        self.assertEqual(sorted(self.search('文章')), ['news.news.2', 'news.news.3'])
+        self.assertEqual(self.search('修改'), ['news.news.1'])
+
+    def test_reader_reloads_rebuilt_index(self):
+        self.write(('news.news.1', '机器学习'))
+        self.assertEqual(self.search('机器'), ['news.news.1'])
+        # 删除索引目录后重建，版本号和分段名都和原来一样
+        shutil.rmtree(self.path)
+        self.write(('news.news.2', '机器人'))
+        self.assertEqual(self.search('机器'), ['news.news.2'])
+
+
+class LocalSearchBackendTest(LocalSearchMixin, SimpleTestCase):
+    """本地搜索后端：排除条件生效，不支持的查询报错而不是被忽略"""
+
+    def setUp(self):
+        super(LocalSearchBackendTest, self).setUp()
+        with IndexWriter(self.search_path) as writer:
+            for pk, text in ((1, '机器学习入门'), (2, '深度学习'), (3, 'Python学习笔记')):
+                writer.update('news.news.{}'.format(pk), {'django_ct': 'news.news', 'django_id': str(pk)}, text)
+
+    def pks(self, sqs):
+        return sorted(int(result.pk) for result in sqs)
+
+    def test_exclude(self):
+        self.assertEqual(self.pks(SearchQuerySet().auto_query('学习 -深度')), [1, 3])
+        self.assertEqual(self.pks(SearchQuerySet().auto_query('学习 -机器 -python')), [2])
+        self.assertEqual(self.pks(SearchQuerySet().filter(content='学习').exclude(content='机器')), [2, 3])
+        # 用户输入的NOT和括号不是查询语法
+        self.assertEqual(self.pks(SearchQuerySet().auto_query('NOT (深度)')), [])
+
+    def test_unsupported_query(self):
+        for sqs in (SearchQuerySet().auto_query('学习').narrow('django_ct:news.news'),
+                    SearchQuerySet().auto_query('学习').order_by('-id'),
+                    SearchQuerySet().filter(title='学习'),
+                    SearchQuerySet().filter(content='机器').filter_or(content='深度')):
+            with self.assertRaises(SearchBackendError):
+                len(sqs)
+
+
+class NewsCursorTest(FakeRedisMixin, TestCase):
+    """新闻列表游标分页：按游标翻完所有文章，不重复不遗漏"""
+
+    def setUp(self):
+        super(NewsCursorTest, self).setUp()
+        self.user = Users.objects.create_user(username='cursor_user', password='123456', mobile='13800000006')
+        self.tag = models.Tag.objects.create(name='Python基础')
+        for i in range(12):
+            models.News.objects.create(title='标题{}'.format(i), digest='摘要', content='内容',
+                                       tag=self.tag, author=self.user)
+
+    def test_cursor_pages(self):
+        titles, cursor = [], ''
+        while True:
+            data = self.client.get('/news/', {'tag_id': self.tag.id, 'cursor': cursor}).json()['data']
+            self.assertNotIn('total_pages', data)
+            titles.extend(news['title'] for news in data['news'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(titles, ['标题{}'.format(i) for i in range(11, -1, -1)])
+
+    def test_invalid_cursor_returns_first_page(self):
+        data = self.client.get('/news/', {'tag_id': self.tag.id, 'cursor': 'garbage!!'}).json()['data']
+        self.assertEqual([news['title'] for news in data['news']], ['标题{}'.format(i) for i in range(11, 6, -1)])
+
+    def test_admin_cursor(self):
+        Users.objects.create_superuser(username='cursor_admin', password='123456', mobile='13900000006')
+        self.client.login(username='cursor_admin', password='123456')
+        response = self.client.get('/admin/news/', {'cursor': ''})
+        self.assertContains(response, '下一页')
+        self.assertEqual(self.client.get('/admin/news/', {'page': '2'}).status_code, 200)
+
+
+class HotNewsRankingTest(FakeRedisMixin, TransactionTestCase):
+    """热门新闻排行：先按优先级，同一优先级按衰减后的点击热度"""
+
+    def setUp(self):
+        super(HotNewsRankingTest, self).setUp()
+        user = Users.objects.create_user(username='hot_user', password='123456', mobile='13800000007')
+        tag = models.Tag.objects.create(name='Python基础')
+        self.news = [models.News.objects.create(title='标题{}'.format(i), digest='摘要', content='内容',
+                                                tag=tag, author=user, clicks=i) for i in range(4)]
+        for i, news in enumerate(self.news):
+            models.HotNews.objects.create(news=news, priority=1 if i < 3 else 2)
+
+    def ids(self, *indexes):
+        return [self.news[i].id for i in indexes]
+
+    def test_rank_by_priority_and_clicks(self):
+        self.assertEqual(ranking.get_hot_news_ids(), self.ids(2, 1, 0, 3))
+        for _ in range(5):
+            self.client.post('/news/{}/click/'.format(self.news[0].id))
+        self.assertEqual(ranking.get_hot_news_ids(2), self.ids(0, 2))
+
+        hotnews = models.HotNews.objects.get(news=self.news[3])
+        hotnews.priority = 1
+        hotnews.save()
+        self.assertEqual(ranking.get_hot_news_ids(), self.ids(0, 3, 2, 1))
+        hotnews.is_delete = True
+        hotnews.save()
+        self.assertEqual(ranking.get_hot_news_ids(), self.ids(0, 2, 1))
+
+    def test_recent_clicks_weigh_more(self):
+        with mock.patch('time.time', return_value=time.time() + 3 * constants.HOT_NEWS_HALF_LIFE):
+            self.client.post('/news/{}/click/'.format(self.news[1].id))
+        # 3个半衰期之后的一次点击相当于现在的8次
+        self.assertEqual(ranking.get_hot_news_ids(1), self.ids(1))
+        before = ranking.get_hot_news_ids()
+        get_redis_connection(alias='default').set(ranking.HOT_NEWS_EPOCH_KEY,
+                                                  time.time() - constants.HOT_NEWS_REBASE_AFTER - 10)
+        self.assertTrue(ranking.rebase())
+        self.assertEqual(ranking.get_hot_news_ids(), before)
+
+    def test_title_change_and_redis_down(self):
+        news = self.news[2]
+        news.title = '新标题'
+        news.save()
+        self.assertEqual(ranking.get_hot_news(1)[0]['title'], '新标题')
+        # redis不可用时按原来的方式查询数据库
+        with mock.patch('news.ranking.get_redis_connection', side_effect=ConnectionError):
+            self.assertEqual(ranking.get_hot_news_ids(), self.ids(2, 1, 0, 3))
+            self.assertEqual([info['title'] for info in ranking.get_hot_news(2)], ['新标题', '标题1'])
+
+
+class BootstrapTest(FakeRedisMixin, TransactionTestCase):
+    """首页初始数据：标签、第一页文章、轮播图、热门新闻一次返回，缓存命中时不查询数据库"""
+
+    def setUp(self):
+        super(BootstrapTest, self).setUp()
+        user = Users.objects.create_user(username='boot_user', password='123456', mobile='13800000008')
+        self.tag = models.Tag.objects.create(name='Python基础')
+        self.news = [models.News.objects.create(title='标题{}'.format(i), digest='摘要', content='内容',
+                                                tag=self.tag, author=user) for i in range(7)]
+        models.Banner.objects.create(news=self.news[0], image_url='http://example.com/banner.png')
+        models.HotNews.objects.create(news=self.news[1])
+
+    def test_bootstrap(self):
+        data = self.client.get('/news/bootstrap/').json()['data']
+        self.assertEqual(len(data['news']), 5)
+        self.assertEqual(data['total_pages'], 2)
+        self.assertEqual(data['banners'][0]['news_title'], '标题0')
+        self.assertEqual(data['hot_news'][0]['title'], '标题1')
+        with self.assertNumQueries(0):
+            self.client.get('/news/bootstrap/')
+            self.assertContains(self.client.get('/'), 'Python基础')
+        # 游标和新闻列表通用
+        page = self.client.get('/news/', {'cursor': data['next_cursor']}).json()['data']
+        self.assertEqual(len(page['news']), 2)
+
+    def test_rebuild_after_tag_renamed(self):
+        self.client.get('/news/bootstrap/')
+        self.tag.name = 'Django'
+        self.tag.save()
+        self.assertContains(self.client.get('/news/bootstrap/'), 'Django')
+
+
+class AnonymousPageCacheTest(FakeRedisMixin, TestCase):
+    """未登录用户整页缓存，带session cookie的请求不走缓存，后台修改后清除"""
+
+    def setUp(self):
+        super(AnonymousPageCacheTest, self).setUp()
+        prerender_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, prerender_root, ignore_errors=True)
+        prerender_override = override_settings(PRERENDER_ROOT=prerender_root)
+        prerender_override.enable()
+        self.addCleanup(prerender_override.disable)
+        Users.objects.create_superuser(username='page_admin', password='123456', mobile='13900000008')
+        self.tag = models.Tag.objects.create(name='Python基础')
+        self.news = models.News.objects.create(title='旧标题', digest='摘要', content='内容', tag=self.tag,
+                                               author=Users.objects.get(username='page_admin'))
+        self.url = '/news/{}/'.format(self.news.id)
+
+    def test_cache_and_purge(self):
+        self.assertContains(self.client.get(self.url), '旧标题')
+        models.News.objects.filter(id=self.news.id).update(title='新标题')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.url), '旧标题')
+
+        self.client.login(username='page_admin', password='123456')
+        self.assertContains(self.client.get(self.url), '新标题')
+        response = self.client.put('/admin/news/{}/'.format(self.news.id), json.dumps({
+            'title': '后台修改', 'digest': '摘要', 'content': '内容',
+            'image_url': 'http://example.com/news.png', 'tag': self.tag.id,
+        }), content_type='application/json')
+        self.assertEqual(response.json()['errno'], '0')
+
+        self.client.logout()
+        self.client.cookies.clear()
+        self.assertContains(self.client.get(self.url), '后台修改')
+
+
+class PrerenderTest(FakeRedisMixin, TransactionTestCase):
+    """预渲染静态页面：只重新生成数据变化了的页面，文章删除后删除静态文件，评论后过期"""
+
+    def setUp(self):
+        super(PrerenderTest, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        prerender_override = override_settings(PRERENDER_ROOT=self.root)
+        prerender_override.enable()
+        self.addCleanup(prerender_override.disable)
+        self.user = Users.objects.create_user(username='pre_user', password='123456', mobile='13800000009')
+        tag = models.Tag.objects.create(name='Python基础')
+        self.news = models.News.objects.create(title='旧标题', digest='摘要', content='内容', tag=tag, author=self.user)
+        self.other = models.News.objects.create(title='另一篇', digest='摘要', content='内容', tag=tag, author=self.user)
+        self.page = os.path.join(self.root, 'news', str(self.news.id), 'index.html')
+
+    def prerender(self):
+        call_command('prerender_pages', stdout=io.StringIO())
+
+    def read_page(self):
+        with open(self.page, encoding='utf8') as f:
+            return f.read()
+
+    def test_prerender_changed_pages(self):
+        self.prerender()
+        self.assertIn('旧标题', self.read_page())
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'index.html')))
+        self.assertEqual(os.stat(self.page).st_mode & 0o777, 0o644)
+        # 预渲染不算点击，点击量由页面中的js记录
+        self.assertIn('sendBeacon', self.read_page())
+        self.assertIsNone(get_redis_connection(alias='default').hget(clicks.NEWS_CLICKS_KEY, self.news.id))
+
+        # 数据没变的页面不重新生成
+        os.utime(self.page, (0, 0))
+        self.prerender()
+        self.assertEqual(os.path.getmtime(self.page), 0)
+
+        self.news.title = '新标题'
+        self.news.save()
+        self.other.is_delete = True
+        self.other.save()
+        self.prerender()
+        self.assertIn('新标题', self.read_page())
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'news', str(self.other.id), 'index.html')))
+
+    def test_comment_expires_page(self):
+        self.prerender()
+        self.client.force_login(self.user)
+        response = self.client.post('/news/{}/comments/'.format(self.news.id), json.dumps({'content': '评论'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['errno'], '0')
+        # 请求中只删除静态文件，不渲染
+        self.assertFalse(os.path.exists(self.page))
+        self.prerender()
+        self.assertIn('评论', self.read_page())
+
+
+class ETagTest(FakeRedisMixin, TransactionTestCase):
+    """内容没变时返回304，文章、标签、评论、轮播图变化后ETag变化"""
+
+    def setUp(self):
+        super(ETagTest, self).setUp()
+        self.user = Users.objects.create_user(username='etag_user', password='123456', mobile='13800000010')
+        self.tag = models.Tag.objects.create(name='Python基础')
+        self.news = models.News.objects.create(title='标题', digest='摘要', content='内容', tag=self.tag, author=self.user)
+
+    def assert_etag_changes(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def rename_news(self):
+        self.news.title = '新标题'
+        self.news.save()
+
+    def rename_tag(self):
+        self.tag.name = 'Django'
+        self.tag.save()
+
+    def test_news_pages(self):
+        self.assert_etag_changes('/news/?tag_id={}'.format(self.tag.id), self.rename_news)
+        models.Banner.objects.create(news=self.news, image_url='http://example.com/banner.png')
+        self.assert_etag_changes('/news/banners/', self.rename_news)
+        detail_url = '/news/{}/'.format(self.news.id)
+        self.assert_etag_changes(detail_url, self.rename_tag)
+        self.assert_etag_changes(detail_url, lambda: models.Comments.objects.create(news=self.news, author=self.user,
+                                                                                    content='评论'))
+        # 304时点击量照样记录
+        self.assertEqual(get_redis_connection(alias='default').hget(clicks.NEWS_CLICKS_KEY, self.news.id), b'6')
+
+    def test_not_modified_without_queries(self):
+        etag = self.client.get('/news/{}/'.format(self.news.id))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/news/{}/'.format(self.news.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        response = self.client.get('/news/{}/'.format(self.news.id))
+        self.assertIn('Cookie', response['Vary'])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/news/{}/'.format(self.news.id),
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class ToJsonDataTest(SimpleTestCase):
+    """to_json_data：orjson和标准库输出相同，缓存中的bytes直接拼接，结果和传入字典一致"""
+
+    data = {'news': [{'title': '标题', 'update_time': datetime(2019, 10, 18, 10, 10, 10)}], 'total_pages': 2}
+
+    def assert_same_as_json_response(self):
+        expected = json.loads(JsonResponse({'errno': '0', 'errmsg': '', 'data': self.data},
+                                           json_dumps_params={'ensure_ascii': False}).content)
+        self.assertEqual(json.loads(to_json_data(data=self.data).content), expected)
+        self.assertEqual(json.loads(to_json_data(data=json_fun.json_dumps(self.data)).content), expected)
+        self.assertIn('标题'.encode('utf8'), to_json_data(data=self.data).content)
+
+    def test_orjson(self):
+        if json_fun.orjson is None:
+            self.skipTest('没有安装orjson')
+        self.assert_same_as_json_response()
+
+    def test_stdlib_json(self):
+        with mock.patch('utils.json_fun.orjson', None):
+            self.assert_same_as_json_response()
+
+    def test_extra_fields(self):
+        content = json.loads(to_json_data(errno='4103', errmsg='参数错误', next_cursor='abc').content)
+        self.assertEqual(content, {'errno': '4103', 'errmsg': '参数错误', 'next_cursor': 'abc', 'data': None})
+
+
+class QueuedIndexUpdateTest(FakeRedisMixin, LocalSearchMixin, TransactionTestCase):
+    """文章保存、删除后只记下id，update_search_index命令批量更新索引"""
+
+    def setUp(self):
+        super(QueuedIndexUpdateTest, self).setUp()
+        user = Users.objects.create_user(username='queue_user', password='123456', mobile='13800000011')
+        tag = models.Tag.objects.create(name='Python基础')
+        self.news = models.News.objects.create(title='机器学习', digest='摘要', content='内容', tag=tag, author=user)
+        self.other = models.News.objects.create(title='深度学习', digest='摘要', content='内容', tag=tag, author=user)
+
+    def search(self, query):
+        return sorted(int(result.pk) for result in SearchQuerySet().auto_query(query))
+
+    def test_update_dirty_news(self):
+        con_redis = get_redis_connection(alias='default')
+        self.assertEqual(con_redis.scard(SEARCH_DIRTY_NEWS_KEY), 2)
+        # 保存时不更新索引
+        self.assertEqual(self.search('学习'), [])
+        self.assertEqual(update_dirty_news(10), 2)
+        self.assertEqual(self.search('学习'), [self.news.id, self.other.id])
+
+        self.news.title = '机器人'
+        self.news.save()
+        self.other.is_delete = True
+        self.other.save()
+        self.assertEqual(con_redis.scard(SEARCH_DIRTY_NEWS_KEY), 2)
+        self.assertEqual(update_dirty_news(10), 2)
+        self.assertEqual(self.search('学习'), [])
+        self.assertEqual(self.search('机器'), [self.news.id])
+        self.assertEqual(update_dirty_news(10), 0)
+
+    def test_not_marked_before_commit(self):
+        get_redis_connection(alias='default').delete(SEARCH_DIRTY_NEWS_KEY)
+        with transaction.atomic():
+            self.news.title = '机器人'
+            self.news.save()
+            self.assertEqual(get_redis_connection(alias='default').scard(SEARCH_DIRTY_NEWS_KEY), 0)
+        self.assertEqual(get_redis_connection(alias='default').scard(SEARCH_DIRTY_NEWS_KEY), 1)
+
+
+class SearchResultCacheTest(FakeRedisMixin, LocalSearchMixin, TestCase):
+    """搜索结果缓存前几页的id，缓存范围内翻页不再搜索，索引更新后缓存失效"""
+
+    def setUp(self):
+        super(SearchResultCacheTest, self).setUp()
+        user = Users.objects.create_user(username='search_user', password='123456', mobile='13800000012')
+        tag = models.Tag.objects.create(name='Python基础')
+        self.news = [models.News.objects.create(title='学习{}'.format(i), digest='摘要', content='学习内容',
+                                                tag=tag, author=user) for i in range(12)]
+        index = haystack_connections['default'].get_unified_index().get_index(models.News)
+        haystack_connections['default'].get_backend().update(index, models.News.objects.all())
+
+    def search(self, **params):
+        return self.client.get('/search/', params)
+
+    def test_pages_within_cache(self):
+        with mock.patch.object(LocalSearchBackend, 'search', autospec=True,
+                               side_effect=LocalSearchBackend.search) as backend_search:
+            self.assertContains(self.search(q='学习'), '12条')
+            searches = backend_search.call_count
+            # 搜索词规范化后命中同一个缓存
+            self.assertContains(self.search(q=' 学习 ', page=2), 'news-item clearfix', count=5)
+            self.assertEqual(backend_search.call_count, searches)
+        self.assertEqual(self.search(q='学习', page=9).status_code, 404)
+
+    def test_pages_after_cache_window(self):
+        with mock.patch.object(constants, 'SEARCH_RESULT_CACHE_COUNT', 5):
+            self.assertContains(self.search(q='学习'), '12条')
+            self.assertContains(self.search(q='学习', page=3), 'news-item clearfix', count=2)
+            self.assertContains(self.search(q='学习', page=2), 'news-item clearfix', count=5)
+
+    def test_invalidate_after_index_update(self):
+        self.assertContains(self.search(q='学习'), '12条')
+        models.News.objects.filter(id=self.news[0].id).update(is_delete=True)
+        get_redis_connection(alias='default').sadd(SEARCH_DIRTY_NEWS_KEY, self.news[0].id)
+        update_dirty_news(10)
+        self.assertContains(self.search(q='学习'), '11条')
+
+
+class SearchHotNewsTest(FakeRedisMixin, TransactionTestCase):
+    """没有搜索词时的热门推荐：每条渲染好的html缓存在redis中，翻页不查询数据库"""
+
+    def setUp(self):
+        super(SearchHotNewsTest, self).setUp()
+        user = Users.objects.create_user(username='hot_row_user', password='123456', mobile='13800000013')
+        self.tag = models.Tag.objects.create(name='Python基础')
+        self.news = [models.News.objects.create(title='新闻{}'.format(i), digest='摘要', content='内容',
+                                                tag=self.tag, author=user, clicks=i) for i in range(7)]
+        for news in self.news:
+            models.HotNews.objects.create(news=news, priority=1)
+
+    def test_cached_rows(self):
+        response = self.client.get('/search/')
+        self.assertContains(response, 'news-item clearfix', count=5)
+        self.assertContains(response, '新闻6')
+        self.client.get('/search/', {'page': 2})
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get('/search/', {'page': 2}), 'news-item clearfix', count=2)
+
+    def test_rows_updated(self):
+        self.client.get('/search/')
+        news = self.news[6]
+        news.title = '改过的标题'
+        news.save()
+        self.assertContains(self.client.get('/search/'), '改过的标题')
+        self.tag.name = 'Django'
+        self.tag.save()
+        self.assertContains(self.client.get('/search/'), 'Django')
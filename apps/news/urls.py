@@ -9,9 +9,12 @@ urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('news/', views.NewsListView.as_view(), name='news_list'),
     path('news/banners/', views.NewsBannerView.as_view(), name='news_banner'),
+    path('news/bootstrap/', views.NewsBootstrapView.as_view(), name='news_bootstrap'),
     path('news/<int:news_id>/', views.NewDetailView.as_view(), name='news_detail'),
+    path('news/<int:news_id>/click/', views.NewsClickView.as_view(), name='news_click'),
     path('news/<int:news_id>/comments/', views.NewsCommentView.as_view(), name='news_comment'),
     path('search/', views.SearchView(), name='search'),
+    path('search/suggest/', views.SearchSuggestView.as_view(), name='search_suggest'),
 
 ]
 
@@ -1,32 +1,72 @@
 import json
 import logging
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views import View
-from django.http import Http404
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger  # django中的分页方法
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger, InvalidPage  # django中的分页方法
 from haystack.views import SearchView as _SearchView        # 搜索页
 
 from D_project import settings
 from news import models
 from news import  constants
-from utils.json_fun import to_json_data
+from news.caches import NewsListCache, get_news_list_etag
+from news.clicks import record_click
+from news.comments import load_comment_page, comments_to_dict_list, get_comments_count
+from news.ranking import get_hot_news_ids, get_hot_news_rows
+from news.search_cache import get_search_news_ids
+from news.suggest import get_suggestions, record_query
+from news.bootstrap import get_bootstrap, get_bootstrap_data
+from utils.json_fun import to_json_data, json_dumps
+from utils import paginator_script
+from utils.page_cache import cache_anonymous_page
+from utils.etags import make_etag, make_page_etag, get_page_versions
+from utils.prerender import expire_pages
 from utils.user_reg_code import Code,error_map
 
 # 日志器
 logger = logging.getLogger('django')
 
 
+def news_list_etag(request):
+    """新闻列表：缓存版本号，文章或标签变化时版本号会变"""
+    try:
+        tag_id = int(request.GET.get('tag_id', 0))
+    except Exception:
+        tag_id = 0      # 和NewsListView一致，参数错误时按0处理
+    return get_news_list_etag(tag_id)
+
+
+def banners_etag(request):
+    """轮播图：逻辑删除不更新update_time，加上数量；轮播图中显示文章标题，加上文章的update_time"""
+    banners = models.Banner.objects.filter(is_delete=False).\
+        aggregate(last_update=Max('update_time'), news_update=Max('news__update_time'), count=Count('id'))
+    return make_etag(banners['last_update'], banners['news_update'], banners['count'])
+
+
+def news_detail_etag(request, news_id):
+    """文章详情：文章、标签、评论变化时信号会更新版本号(见signals)，不查询数据库"""
+    versions = get_page_versions(constants.NEWS_DETAIL_PAGE.format(news_id), constants.TAGS_PAGE)
+    return make_page_etag(request, *versions) if versions else None
+
+
 # 首页
 class IndexView(View):
     """使用context渲染"""
+    # 未登录用户整页缓存，热门新闻排行随点击变化，有效期和首页初始数据一致
+    @method_decorator(cache_anonymous_page(timeout=constants.NEWS_BOOTSTRAP_CACHE_EXPIRES))
     def get(self, request):
+        # 标签导航和热门新闻从首页初始数据中取，缓存命中时不用查询数据库
+        bootstrap = get_bootstrap_data()
         # 文章标签导航实现
-        tags = models.Tag.objects.only('id', 'name').filter(is_delete=False)
-        # 热门新闻功能实现
-        hot_news = models.HotNews.objects.select_related('news').\
-            only('news__title','news__image_url','news_id').filter(is_delete=False).\
-            order_by('priority','-news__clicks')[0:constants.SHOW_HOTNEWS_COUNT]
-            # order_by:从优先级或者点击量(从大到小)进行排序,[]:切片方法显示1-3条
+        tags = bootstrap['tags']
+        # 热门新闻功能实现(先按优先级，再按随时间衰减的点击热度排序)
+        hot_news = bootstrap['hot_news']
         # context = {
         #     'tags': tags
         # }
@@ -38,11 +78,13 @@ class IndexView(View):
 class NewsListView(View):
     """
      前端发送：ajax请求
-     传参：tag_id(标签分类id)   page(标签下对应文章页数)
+     传参：tag_id(标签分类id)   page(标签下对应文章页数)  或者  cursor(游标，上一页返回的next_cursor)
      后台返回：7个字段
      请求方式：GET（只是查询，不涉及其他）
-     url定义：/news/?tag_id=1&page=2
+     url定义：/news/?tag_id=1&page=2   游标模式：/news/?tag_id=1&cursor=
     """
+    # 缓存版本号没变时返回304，不用读缓存
+    @method_decorator(condition(etag_func=news_list_etag))
     def get(self, request):
         # 1.获取前端参数
         # 2.校验参数:正常传参(传数字)，异常传参(爬虫程序传来字母)
@@ -51,45 +93,66 @@ class NewsListView(View):
         except Exception as e:
             logger.error("传入标签错误:\n{}".format(e))   # 写入日志器
             tag_id = 0
-        try:
-            page = int(request.GET.get('page', 1))
-        except Exception as e:
-            logger.error("页码错误:\n{}".format(e))
-            page = 1
+        # 传了cursor参数(可以为空)就用游标分页，不再返回总页数
+        cursor = request.GET.get('cursor')
+        if cursor is not None:
+            try:
+                cursor = paginator_script.encode_cursor(*paginator_script.decode_cursor(cursor)) if cursor else ''   # 统一游标格式，缓存键不会重复
+            except ValueError as e:
+                logger.error("游标错误:\n{}".format(e))
+                cursor = ''
+            page = 'c' + cursor
+        else:
+            try:
+                page = int(request.GET.get('page', 1))
+            except Exception as e:
+                logger.error("页码错误:\n{}".format(e))
+                page = 1
+
+        # 3.先从缓存拿，文章或标签变化时缓存版本号会变，不会拿到旧数据
+        news_cache = NewsListCache(tag_id, page)
+        content = news_cache.get()
+        if content:
+            return to_json_data(data=content)       # 缓存的是序列化好的data，直接拼接
 
-        # 3.从数据库拿数据
+        # 4.从数据库拿数据
         # select_related:优化查询,当执行它的查询时它沿着外键关系查询关联的对象数据
         news_queryset = models.News.objects.select_related('tag','author').only('title','image_url'
-                        ,'digest','update_time','tag__name','author__username').filter()
-        # 传了tag_id按标签查，没传就查询数据库所有的
-        news= news_queryset.filter(is_delete=False, tag_id=tag_id) or news_queryset.filter(is_delete=False)
+                        ,'digest','update_time','tag__name','author__username').filter(is_delete=False)
+        # 传了tag_id按标签查，没传或者标签下没有文章就查询数据库所有的
+        news = news_queryset.filter(tag_id=tag_id)
+        fallback = not news.exists()
+        if fallback:
+            news = news_queryset
 
-        # 4.分页
-        paginator = Paginator(news, constants.PER_PAGE_NEWS_COUNT)   # 对news进行分页，每页xx条
-        try:
-            news_info = paginator.page(page)     # 拿到具体某一页的信息,是quertset类型
-        except EmptyPage:                        # 例如：最多5页，传的page>5
-            logger.error("访问页数不存在！")
-            news_info = paginator.page(paginator.num_pages)     # 返回最后一页(num_pages代表总页数)
-
-        # 5.序列化输出
-        news_info_list = []
-        for n in news_info:
-            news_info_list.append({
-                'id': n.id,
-                'title': n.title,
-                'digest': n.digest,
-                'image_url': n.image_url,
-                'update_time': n.update_time.strftime('%Y年%m月%d日 %H:%M'),    # 格式化时间
-                'tag_name': n.tag.name,
-                'author': n.author.username,
-            })
-        data = {
-            'news': news_info_list,
-            'total_pages': paginator.num_pages
-        }
-        # 6.返回数据给前端
-        return to_json_data(data=data)
+        # 5.分页
+        if cursor is not None:
+            news_info, next_cursor = paginator_script.get_keyset_page(news, cursor, constants.PER_PAGE_NEWS_COUNT)
+            data = {
+                'news': self.to_dict_list(news_info),
+                'next_cursor': next_cursor
+            }
+        else:
+            paginator = Paginator(news, constants.PER_PAGE_NEWS_COUNT)   # 对news进行分页，每页xx条
+            try:
+                news_info = paginator.page(page)     # 拿到具体某一页的信息,是quertset类型
+            except EmptyPage:                        # 例如：最多5页，传的page>5
+                logger.error("访问页数不存在！")
+                news_info = paginator.page(paginator.num_pages)     # 返回最后一页(num_pages代表总页数)
+            data = {
+                'news': self.to_dict_list(news_info),
+                'total_pages': paginator.num_pages
+            }
+
+        # 6.存入缓存，返回数据给前端
+        content = json_dumps(data)
+        news_cache.set(content, fallback=fallback)
+        return to_json_data(data=content)
+
+    @staticmethod
+    def to_dict_list(news_info):
+        """序列化输出"""
+        return [n.to_dict_data() for n in news_info]
 
 
 # 轮播图
@@ -100,26 +163,30 @@ class NewsBannerView(View):
     请求参数：前端无需传入参数
     ajax渲染，后端返回json格式数据
     """
+    @method_decorator(condition(etag_func=banners_etag))
     def get(self,request):
         # 1.数据库中查询返回字段
         banners = models.Banner.objects.select_related('news').only('image_url','news_id','news__title').\
             filter(is_delete=False).order_by('priority')[0:constants.SHOW_BANNER_COUNT]
         # 2.序列化输出
-        banners_info_list = []
-        for b in banners:
-            banners_info_list.append(
-                {
-                    'image_url': b.image_url,
-                    'news_id': b.news_id,
-                    'new_title': b.news.title,
-                }
-            )
         data = {
-            'banners': banners_info_list
+            'banners': [b.to_dict_data() for b in banners]
         }
         return to_json_data(data=data)
 
 
+# 首页初始数据
+class NewsBootstrapView(View):
+    """
+    请求方法：GET
+    url定义：/news/bootstrap/
+    请求参数：前端无需传入参数
+    一次返回标签、轮播图、热门新闻和第一页新闻，首页打开时只需要这一个ajax请求
+    """
+    def get(self, request):
+        return to_json_data(data=get_bootstrap())
+
+
 # 文章详情页
 class NewDetailView(View):
     """
@@ -128,31 +195,71 @@ class NewDetailView(View):
     url定义:'/news/<int:news_id>'
     """
     def get(self,request,news_id):
+        response = self.render_detail(request, news_id)
+        # 点击量在页面缓存之外记录(缓存命中也要累加)，只在redis中累加，由flush_news_clicks命令批量写入数据库
+        # 预渲染的静态页面由页面中的js请求NewsClickView记录
+        if not getattr(request, 'is_prerender', False):
+            record_click(news_id)
+        return response
+
+    # 内容没变时返回304(点击量照样记录)，未登录用户整页缓存
+    @method_decorator(condition(etag_func=news_detail_etag))
+    @method_decorator(cache_anonymous_page())
+    def render_detail(self, request, news_id):
         # 文章详情
         news = models.News.objects.select_related('tag', 'author').\
             only('title','author', 'update_time','tag__name','content').\
             filter(is_delete=False, id=news_id).first()
         if news:
-            # 评论部分字段：author,content,update_time, parent.username, parent.content, parent.update_time
-            comments = models.Comments.objects.select_related('author', 'parent').\
-                only('content', 'update_time', 'author__username', 'parent__content',
-                     'parent__author__username', 'parent__update_time').\
-                filter(is_delete=False,news_id=news_id)
-            # 序列化输出(字典在模型中生成)
-            comments_list = []
-            for c in comments:
-                comments_list.append(c.to_dict_data())   # c.to_dict_data()调用模型类的方法
+            # 只渲染第一页评论，后面的评论由前端通过游标加载(字典在模型中生成)
+            comments_list, next_cursor = load_comment_page(news_id, '')
+            comments_count = get_comments_count(news_id)
             return render(request,'news/news_detail.html',locals())
         else:
             raise Http404('文章{}不存在'.format(news_id))
 
 
+# 文章点击量
+@method_decorator(csrf_exempt, name='dispatch')
+class NewsClickView(View):
+    """
+    nginx直接返回预渲染的详情页时，由页面中的js发送请求记录点击量
+    请求方法：POST
+    url定义：/news/<int:news_id>/click/
+    """
+    def post(self, request, news_id):
+        # 只读写redis，不查询数据库；不存在、已删除的文章不记录
+        if not record_click(news_id):
+            return HttpResponse(status=404)
+        return HttpResponse(status=204)
+
+
 # 文章评论
 class NewsCommentView(View):
     """
     前端传参：news_id(通过url传递),content,parent_id(也可以没有)，当前用户：request.user
     URL:/news/<int:news_id>/comments/
     """
+    def get(self,request,news_id):
+        """
+        评论分页加载
+        前端传参：cursor(游标，第一页为空，之后传上一页返回的next_cursor)
+        后台返回：comments(一页评论), next_cursor, total_count
+        """
+        if not models.News.objects.only('id').filter(is_delete=False,id=news_id).exists():
+            return to_json_data(errno=Code.PARAMERR,errmsg='新闻不存在')
+        try:
+            comments_list, next_cursor = load_comment_page(news_id, request.GET.get('cursor', ''))
+        except ValueError as e:
+            logger.info('前端传的cursor有误{}'.format(e))
+            return to_json_data(errno=Code.PARAMERR, errmsg=error_map[Code.PARAMERR])
+        data = {
+            'comments': comments_list,
+            'next_cursor': next_cursor,
+            'total_count': get_comments_count(news_id),
+        }
+        return to_json_data(data=data)
+
     def post(self,request,news_id):
         # 1.获取参数
         if not request.user.is_authenticated:         # 判断是否登录
@@ -190,12 +297,27 @@ class NewsCommentView(View):
         new_comment.author = request.user
         new_comment.parent_id = parent_id if parent_id else None
         new_comment.save()
+        # 详情页中的评论和评论数变了，提交后清掉页面缓存、删除静态页面，由prerender_pages命令重新生成
+        news_path = reverse('news:news_detail', args=[news_id])
+        transaction.on_commit(lambda: expire_pages(news_path))
 
         # 4.返回给前端
-        return to_json_data(data=new_comment.to_dict_data())   # 调用模型中的序列化输出
+        return to_json_data(data=comments_to_dict_list([new_comment])[0])   # 父评论批量加载，不逐级查询
+
+
+# 搜索提示
+class SearchSuggestView(View):
+    """
+    请求方法：GET
+    url定义：/search/suggest/
+    请求参数：q(搜索框中已输入的内容)
+    后台返回：words(以q开头的文章标题、标签名、热门搜索词)
+    只读进程内存中的数据，不查询数据库，搜索框每输入一个字符请求一次
+    """
+    def get(self, request):
+        return to_json_data(data={'words': get_suggestions(request.GET.get('q', ''))})
 
 
-# 搜索页
 class SearchView(_SearchView):             # 使用haystack一个查询的类
     # 模版文件
     template = 'news/search.html'
@@ -204,11 +326,10 @@ class SearchView(_SearchView):             # 使用haystack一个查询的类
         kw = self.request.GET.get('q', '')
         if not kw:
             show_all = True     # 显示所有数据
-            hot_news = models.HotNews.objects.select_related('news'). \
-                only('news__title', 'news__image_url', 'news__id'). \
-                filter(is_delete=False).order_by('priority', '-news__clicks')
+            # 排好序的id和每条渲染好的html都从redis中取，不查询数据库
+            hot_news_ids = get_hot_news_ids()
             # 对搜索结果进行分页
-            paginator = Paginator(hot_news, settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE)
+            paginator = Paginator(hot_news_ids, settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE)
             try:
                 # 拿到page具体参数，没有就默认获取第1页
                 page = paginator.page(int(self.request.GET.get('page', 1)))
@@ -218,8 +339,27 @@ class SearchView(_SearchView):             # 使用haystack一个查询的类
             except EmptyPage:
                 # 用户访问的页数大于实际页数，则返回最后一页的数据
                 page = paginator.page(paginator.num_pages)
+            page.object_list = get_hot_news_rows(page.object_list)
             return render(self.request, self.template, locals())
         else:
             show_all = False
-            qs = super(SearchView, self).create_response()
-            return qs
+            query = self.query
+            form = self.form
+            # 搜索次数多的词会出现在搜索提示中，翻页不算一次搜索
+            if self.request.GET.get('page', '1') == '1':
+                record_query(query)
+            # 前几页排好序的文章id从缓存中取，缓存中没有或翻到之后的页时才查询elasticsearch
+            news_ids = get_search_news_ids(query, self.results)
+            paginator = Paginator(news_ids, settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE)
+            try:
+                page = paginator.page(int(self.request.GET.get('page', 1)))
+            except (ValueError, InvalidPage):
+                # 和haystack一致，页码错误时返回404
+                raise Http404('页码错误')
+            # 只查询当前页的文章
+            news = models.News.objects.select_related('tag', 'author'). \
+                only('title', 'digest', 'image_url', 'update_time', 'tag__name', 'author__username'). \
+                filter(is_delete=False, id__in=page.object_list)
+            news_map = {n.id: n for n in news}
+            page.object_list = [news_map[news_id] for news_id in page.object_list if news_id in news_map]
+            return render(self.request, self.template, locals())
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UserConfig(AppConfig):
     name = 'user'
+
+    def ready(self):
+        # 注册信号处理函数(用户保存时加入用户名、手机号集合)
+        from user import signals  # noqa
@@ -1,3 +1,6 @@
 # -*- coding:utf-8 -*-
 # 用户session信息过期时间，单位秒，这是设置为5天
-USER_SESSION_EXPIRES = 5 * 24 * 60 * 60
\ No newline at end of file
+USER_SESSION_EXPIRES = 5 * 24 * 60 * 60
+
+# 初始化用户名、手机号集合时每批的用户数
+USER_MEMBERS_SEED_BATCH_SIZE = 1000
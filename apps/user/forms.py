@@ -8,6 +8,7 @@ from django_redis import get_redis_connection
 from verifications.constants import SMS_CODE_NUMS
 from .models import Users
 from user import constant
+from user.members import mobile_exists
 
 
 class RegisterForm(forms.Form):
@@ -39,7 +40,7 @@ class RegisterForm(forms.Form):
         tel = self.cleaned_data.get('mobile')
         if not re.match(r"^1[3-9]\d{9}$", tel):
             raise forms.ValidationError("手机号码格式不正确")
-        if Users.objects.filter(mobile=tel).exists():
+        if mobile_exists(tel):
             raise forms.ValidationError("手机号已注册，请重新输入！")
         return tel
 
@@ -0,0 +1,21 @@
+# -*- coding:utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from user import constant
+from user.members import seed
+
+
+class Command(BaseCommand):
+    """
+    把已注册的用户名、手机号加入redis集合，部署后执行一次，之后由信号维护
+    python manage.py seed_user_members
+    """
+    help = '把已注册的用户名、手机号加入redis集合'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=constant.USER_MEMBERS_SEED_BATCH_SIZE,
+                            help='每批的用户数')
+
+    def handle(self, *args, **options):
+        count = seed(batch_size=options['batch_size'])
+        self.stdout.write('加入{}个用户'.format(count))
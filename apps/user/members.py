@@ -0,0 +1,102 @@
+# -*- coding:utf-8 -*-
+"""
+已注册的用户名、手机号保存在redis集合中，注册页检查是否可用时不用查询数据库
+集合由seed_user_members命令从tb_users初始化，之后用户保存时由信号加入
+集合中没有就是没注册；集合中有时再查一次数据库确认(用户可能已被删除或改名)
+没有初始化过或redis异常时直接查询数据库
+"""
+import logging
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from user import constant
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 用户名集合(小写，mysql比较用户名时不区分大小写)
+USERNAMES_KEY = 'user_usernames'
+# 手机号集合
+MOBILES_KEY = 'user_mobiles'
+# 已经从数据库初始化过的标记
+MEMBERS_READY_KEY = 'user_members_ready'
+
+
+def _add_members(pl, usernames, mobiles):
+    if usernames:
+        pl.sadd(USERNAMES_KEY, *[username.lower() for username in usernames])
+    if mobiles:
+        pl.sadd(MOBILES_KEY, *mobiles)
+
+
+def add_user(username, mobile):
+    """事务提交后加入集合"""
+    def add():
+        try:
+            con_redis = get_redis_connection(alias='default')
+            pl = con_redis.pipeline()
+            _add_members(pl, [username] if username else [], [mobile] if mobile else [])
+            pl.execute()
+        except Exception as e:
+            logger.error('用户名、手机号加入集合异常:\n{}'.format(e))
+    transaction.on_commit(add)
+
+
+def seed(batch_size=constant.USER_MEMBERS_SEED_BATCH_SIZE):
+    """
+    从数据库初始化集合(只加入，不删除已有的)
+    :return: 加入的用户数
+    """
+    from user.models import Users
+    con_redis = get_redis_connection(alias='default')
+    count = 0
+    usernames, mobiles = [], []
+    for username, mobile in Users.objects.values_list('username', 'mobile').iterator(chunk_size=batch_size):
+        usernames.append(username)
+        if mobile:
+            mobiles.append(mobile)
+        count += 1
+        if len(usernames) >= batch_size:
+            pl = con_redis.pipeline(transaction=False)
+            _add_members(pl, usernames, mobiles)
+            pl.execute()
+            usernames, mobiles = [], []
+    pl = con_redis.pipeline(transaction=False)
+    _add_members(pl, usernames, mobiles)
+    pl.set(MEMBERS_READY_KEY, 1)
+    pl.execute()
+    return count
+
+
+def _is_member(key, value):
+    """
+    :return: True在集合中，False不在，None没有初始化或redis异常
+    """
+    try:
+        con_redis = get_redis_connection(alias='default')
+        pl = con_redis.pipeline(transaction=False)
+        pl.exists(MEMBERS_READY_KEY)
+        pl.sismember(key, value)
+        ready, is_member = pl.execute()
+    except Exception as e:
+        logger.error('读取用户名、手机号集合异常:\n{}'.format(e))
+        return None
+    return bool(is_member) if ready else None
+
+
+def username_exists(username):
+    from user.models import Users
+    if not username:
+        return False
+    if _is_member(USERNAMES_KEY, username.lower()) is False:
+        return False
+    return Users.objects.filter(username=username).exists()
+
+
+def mobile_exists(mobile):
+    from user.models import Users
+    if not mobile:
+        return False
+    if _is_member(MOBILES_KEY, mobile) is False:
+        return False
+    return Users.objects.filter(mobile=mobile).exists()
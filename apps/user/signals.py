@@ -0,0 +1,12 @@
+# -*- coding:utf-8 -*-
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from user import members
+from user.models import Users
+
+
+@receiver(post_save, sender=Users)
+def user_saved(sender, instance, **kwargs):
+    """注册、修改用户名或手机号后加入集合(旧的值留在集合中，检查时会再查数据库确认)"""
+    members.add_user(instance.__dict__.get('username'), instance.__dict__.get('mobile'))
@@ -1,3 +1,45 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django_redis import get_redis_connection
+
+from user import members
+from user.models import Users
+from utils.testing import FakeRedisMixin
+
+
+class MembersTest(FakeRedisMixin, TransactionTestCase):
+    """注册页检查用户名、手机号：先查redis集合，集合中没有时不查询数据库"""
+
+    def setUp(self):
+        super(MembersTest, self).setUp()
+        Users.objects.create_user(username='Alice01', password='123456', mobile='13800000000')
+
+    def count(self, url):
+        return self.client.get(url).json()['data']['count']
+
+    def test_not_seeded_uses_database(self):
+        get_redis_connection(alias='default').flushall()
+        self.assertEqual(self.count('/usernames/Alice01/'), 1)
+        self.assertEqual(self.count('/usernames/bobbob/'), 0)
+
+    def test_seeded(self):
+        call_command('seed_user_members', stdout=io.StringIO())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count('/usernames/bobbob/'), 0)
+            self.assertEqual(self.count('/mobiles/13900000000/'), 0)
+        self.assertEqual(self.count('/usernames/Alice01/'), 1)
+        self.assertEqual(self.count('/mobiles/13800000000/'), 1)
+
+    def test_new_user_added_after_commit(self):
+        call_command('seed_user_members', stdout=io.StringIO())
+        Users.objects.create_user(username='bobbob', password='123456', mobile='13900000000')
+        self.assertTrue(get_redis_connection(alias='default').sismember(members.USERNAMES_KEY, 'bobbob'))
+        self.assertEqual(self.count('/usernames/bobbob/'), 1)
+        self.assertEqual(self.count('/mobiles/13900000000/'), 1)
+
+    def test_deleted_user_rechecked_in_database(self):
+        call_command('seed_user_members', stdout=io.StringIO())
+        Users.objects.filter(username='Alice01').delete()
+        self.assertEqual(self.count('/usernames/Alice01/'), 0)
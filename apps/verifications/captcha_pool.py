@@ -0,0 +1,90 @@
+# -*- coding:utf-8 -*-
+"""
+图片验证码池：fill_captcha_pool命令在后台提前生成验证码，放到redis列表中，
+请求中只需要取出一个，不用在请求线程里绘制图片；池子空了时才在请求中生成
+"""
+import logging
+from django_redis import get_redis_connection
+
+from utils.captcha.captcha import captcha, render
+from verifications import constants
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 验证码池，每项是 文本 + 换行 + jpeg图片
+CAPTCHA_POOL_KEY = 'captcha_pool'
+# 统计 {hit: 从池中取到的次数, miss: 池子空了在请求中生成的次数, produced: 生成放入池中的个数}
+CAPTCHA_POOL_STATS_KEY = 'captcha_pool_stats'
+
+# 取出一个验证码，文本保存到img_<uuid>，一次往返完成
+# KEYS: 验证码池，img_<uuid>，统计  ARGV: 有效期
+POP_SCRIPT = """
+local item = redis.call('LPOP', KEYS[1])
+if not item then
+    redis.call('HINCRBY', KEYS[3], 'miss', 1)
+    return false
+end
+local i = string.find(item, '\\n', 1, true)
+local text = string.sub(item, 1, i - 1)
+redis.call('SETEX', KEYS[2], ARGV[1], text)
+redis.call('HINCRBY', KEYS[3], 'hit', 1)
+return {text, string.sub(item, i + 1)}
+"""
+
+
+def pop_captcha(img_key):
+    """
+    从池中取一个验证码，文本保存到img_key
+    :return: (text, image)，池子空了返回None
+    """
+    try:
+        con_redis = get_redis_connection(alias='verify_codes')
+        pop_script = con_redis.register_script(POP_SCRIPT)
+        result = pop_script(keys=[CAPTCHA_POOL_KEY, img_key, CAPTCHA_POOL_STATS_KEY],
+                            args=[constants.REDIS_IMG_EXPIRES])
+    except Exception as e:
+        logger.error('读取图片验证码池异常:\n{}'.format(e))
+        return None
+    if not result:
+        return None
+    text, image = result
+    return text.decode('utf8'), image
+
+
+def fill_pool(size=constants.CAPTCHA_POOL_SIZE, batch_size=constants.CAPTCHA_POOL_BATCH_SIZE, executor=None):
+    """
+    生成验证码，把池子补满到size个
+    :param executor: concurrent.futures的进程池或线程池，多个验证码同时绘制
+    :return: 本次生成的个数
+    """
+    con_redis = get_redis_connection(alias='verify_codes')
+    produced = 0
+    while True:
+        need = min(size - con_redis.llen(CAPTCHA_POOL_KEY), batch_size)
+        if need <= 0:
+            return produced
+        texts = [captcha.random_text() for _ in range(need)]
+        images = executor.map(render, texts) if executor is not None else map(render, texts)
+        items = [text.encode('utf8') + b'\n' + image for text, image in zip(texts, images)]
+        pl = con_redis.pipeline()
+        pl.rpush(CAPTCHA_POOL_KEY, *items)
+        # 多个进程同时补充时不超过size个
+        pl.ltrim(CAPTCHA_POOL_KEY, -size, -1)
+        pl.hincrby(CAPTCHA_POOL_STATS_KEY, 'produced', need)
+        pl.execute()
+        produced += need
+
+
+def get_pool_stats():
+    """
+    :return: {'depth': 池中剩余个数, 'hit':, 'miss':, 'produced':}
+    """
+    con_redis = get_redis_connection(alias='verify_codes')
+    pl = con_redis.pipeline(transaction=False)
+    pl.llen(CAPTCHA_POOL_KEY)
+    pl.hgetall(CAPTCHA_POOL_STATS_KEY)
+    depth, stats = pl.execute()
+    result = {'depth': depth, 'hit': 0, 'miss': 0, 'produced': 0}
+    result.update({key.decode('utf8'): int(value) for key, value in stats.items()})
+    return result
@@ -12,4 +12,31 @@ SMS_CODE_TEMP_ID = 1
 SEND_SMS_CODE_INTERVAL = 60
 
 # 短信验证码有效期，单位分钟
-SMS_CODE_REDIS_EXPIRES = 5 * 60
\ No newline at end of file
+SMS_CODE_REDIS_EXPIRES = 5 * 60
+
+# 图片验证码池的容量
+CAPTCHA_POOL_SIZE = 500
+
+# 图片验证码池每批生成的个数
+CAPTCHA_POOL_BATCH_SIZE = 50
+
+# 检查图片验证码池的间隔，单位秒
+CAPTCHA_POOL_INTERVAL = 1
+
+# 短信最多发送次数(包括重试)
+SMS_SEND_MAX_ATTEMPTS = 3
+
+# 短信发送失败后第一次重试的等待时间，之后每次翻倍，单位秒
+SMS_RETRY_BACKOFF = 2
+
+# 手机号在发送队列中的标记的有效期(超过后同一个手机号可以再次放入队列)，单位秒
+SMS_PENDING_EXPIRES = 60
+
+# 短信发送状态的有效期，单位秒
+SMS_STATUS_EXPIRES = 10 * 60
+
+# 发送短信的线程数
+SMS_SEND_WORKERS = 8
+
+# 发送短信的线程等待队列的超时时间，单位秒
+SMS_QUEUE_TIMEOUT = 1
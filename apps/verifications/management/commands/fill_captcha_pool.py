@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+
+from verifications import constants
+from verifications.captcha_pool import fill_pool, get_pool_stats
+
+# 日志器
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    在后台生成图片验证码，保持redis中的验证码池是满的
+    python manage.py fill_captcha_pool               每隔CAPTCHA_POOL_INTERVAL秒补充一次，一直运行
+    python manage.py fill_captcha_pool --once        只补充一次
+    python manage.py fill_captcha_pool --workers 4   4个进程同时绘制
+    python manage.py fill_captcha_pool --stats       查看池中剩余个数和命中次数
+    """
+    help = '在后台生成图片验证码，保持redis中的验证码池是满的'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只补充一次')
+        parser.add_argument('--stats', action='store_true', help='查看池中剩余个数和命中次数')
+        parser.add_argument('--size', type=int, default=constants.CAPTCHA_POOL_SIZE, help='验证码池的容量')
+        parser.add_argument('--workers', type=int, default=1, help='绘制验证码的进程数')
+        parser.add_argument('--interval', type=float, default=constants.CAPTCHA_POOL_INTERVAL,
+                            help='检查间隔，单位秒')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = get_pool_stats()
+            requests = stats['hit'] + stats['miss']
+            self.stdout.write('剩余{depth}个，已生成{produced}个，命中{hit}次，未命中{miss}次'.format(**stats) +
+                              ('，命中率{:.1%}'.format(stats['hit'] / requests) if requests else ''))
+            return
+        executor = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 1 else None
+        while True:
+            try:
+                produced = fill_pool(size=options['size'], executor=executor)
+                if produced:
+                    logger.info('图片验证码池补充{}个'.format(produced))
+            except Exception as e:
+                logger.error('图片验证码池补充异常:\n{}'.format(e))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        if executor is not None:
+            executor.shutdown()
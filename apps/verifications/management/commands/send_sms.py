@@ -0,0 +1,65 @@
+# -*- coding:utf-8 -*-
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+
+from verifications import constants
+from verifications.sms_queue import get_queue_stats, get_status, process_one, requeue_due_retries
+
+# 日志器
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    从redis队列中取出手机号发送验证码短信，多个线程同时发送
+    python manage.py send_sms                         一直运行，Ctrl+C退出
+    python manage.py send_sms --workers 16            16个线程同时发送
+    python manage.py send_sms --once                  发完队列中的短信后退出
+    python manage.py send_sms --stats                 查看队列中、等待重试的个数
+    python manage.py send_sms --status 13800138000    查看一个手机号的发送状态
+    """
+    help = '从redis队列中取出手机号发送验证码短信'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=constants.SMS_SEND_WORKERS, help='发送短信的线程数')
+        parser.add_argument('--once', action='store_true', help='发完队列中的短信后退出(不等待重试)')
+        parser.add_argument('--stats', action='store_true', help='查看队列中、等待重试的个数')
+        parser.add_argument('--status', metavar='MOBILE', help='查看一个手机号的发送状态')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write('队列中{queued}个，等待重试{retrying}个'.format(**get_queue_stats()))
+            return
+        if options['status']:
+            status = get_status(options['status'])
+            self.stdout.write(str(status) if status else '没有发送记录')
+            return
+
+        stop = threading.Event()
+
+        def work():
+            while not stop.is_set():
+                try:
+                    if not process_one(timeout=constants.SMS_QUEUE_TIMEOUT) and options['once']:
+                        break
+                except Exception as e:
+                    logger.error('发送验证码短信异常:\n{}'.format(e))
+                    time.sleep(constants.SMS_QUEUE_TIMEOUT)
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(work) for _ in range(options['workers'])]
+            try:
+                # 主线程把到了重试时间的手机号放回队列
+                while not all(future.done() for future in futures):
+                    try:
+                        requeue_due_retries()
+                    except Exception as e:
+                        logger.error('短信重试放回队列异常:\n{}'.format(e))
+                    time.sleep(constants.SMS_QUEUE_TIMEOUT)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                stop.set()
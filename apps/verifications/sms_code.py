@@ -0,0 +1,44 @@
+# -*- coding:utf-8 -*-
+"""
+发送短信验证码前的检查和保存在一个lua脚本中完成，一次往返，redis中原子执行：
+校验并删除图片验证码 -> 检查并设置60秒发送标记 -> 保存短信验证码
+同一个图片验证码只能用一次，同时提交多次时只有一个能通过
+"""
+from django_redis import get_redis_connection
+
+from verifications import constants
+
+# 检查结果
+SMS_CODE_SAVED = 0
+IMAGE_CODE_ERROR = 1          # 图片验证码错误或已过期
+SEND_TOO_OFTEN = 2            # 60秒内发送过
+
+# KEYS: img_<uuid>，sms_tag_<mobile>，sms_<mobile>
+# ARGV: 输入的图片验证码(小写)，短信验证码，短信验证码有效期，发送间隔
+SAVE_SCRIPT = """
+local text = redis.call('GET', KEYS[1])
+if not text then
+    return 1
+end
+redis.call('DEL', KEYS[1])
+if string.lower(text) ~= ARGV[1] then
+    return 1
+end
+if not redis.call('SET', KEYS[2], 1, 'EX', ARGV[4], 'NX') then
+    return 2
+end
+redis.call('SETEX', KEYS[3], ARGV[3], ARGV[2])
+return 0
+"""
+
+
+def save_sms_code(image_code_id, image_text, mobile, sms_code):
+    """
+    图片验证码正确、60秒内没有发送过时保存短信验证码
+    :return: SMS_CODE_SAVED，IMAGE_CODE_ERROR或SEND_TOO_OFTEN
+    """
+    con_redis = get_redis_connection(alias='verify_codes')
+    save_script = con_redis.register_script(SAVE_SCRIPT)
+    return save_script(keys=['img_{}'.format(image_code_id), 'sms_tag_{}'.format(mobile), 'sms_{}'.format(mobile)],
+                       args=[image_text.lower(), sms_code, constants.SMS_CODE_REDIS_EXPIRES,
+                             constants.SEND_SMS_CODE_INTERVAL])
@@ -0,0 +1,179 @@
+# -*- coding:utf-8 -*-
+"""
+短信异步发送：请求中只把手机号放入redis队列，由send_sms命令的多个线程取出发送
+- 同一个手机号在队列中只有一个(去重)，发送时读取当时保存的验证码，所以总是发送最新的验证码
+- 发送失败按指数退避重试，超过次数记为失败
+- 每个手机号的发送状态保存在sms_status_<mobile>中
+"""
+import json
+import logging
+import time
+from django_redis import get_redis_connection
+
+from utils.yuntongxun.sms import CCP
+from verifications import constants
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 待发送的手机号队列
+SMS_QUEUE_KEY = 'sms_queue'
+# 手机号在队列中的标记，值为已尝试次数，用来去重；有有效期，发送线程异常退出时不会一直挡住这个手机号
+SMS_PENDING_KEY = 'sms_pending_{}'
+# 等待重试 {mobile: 重试时间}
+SMS_RETRY_KEY = 'sms_retry'
+# 已尝试次数 {mobile: 次数}，和SMS_RETRY_KEY配合
+SMS_RETRY_ATTEMPTS_KEY = 'sms_retry_attempts'
+# 发送状态
+SMS_STATUS_KEY = 'sms_status_{}'
+
+# 发送状态
+STATUS_QUEUED = 'queued'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_RETRYING = 'retrying'
+STATUS_FAILED = 'failed'
+STATUS_EXPIRED = 'expired'        # 发送前验证码已过期
+
+# 手机号不在队列中时才放入队列，同时取消等待中的重试(新请求和重试只发一条)
+# KEYS: sms_pending_<mobile>, SMS_QUEUE_KEY, 状态, SMS_RETRY_KEY, SMS_RETRY_ATTEMPTS_KEY
+# ARGV: 手机号，已尝试次数，状态json，状态有效期，标记有效期
+ENQUEUE_SCRIPT = """
+if not redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[5], 'NX') then
+    return 0
+end
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('HDEL', KEYS[5], ARGV[1])
+redis.call('RPUSH', KEYS[2], ARGV[1])
+redis.call('SET', KEYS[3], ARGV[3], 'EX', ARGV[4])
+return 1
+"""
+
+# 取出并删除队列标记
+# KEYS: sms_pending_<mobile>
+TAKE_PENDING_SCRIPT = """
+local attempts = redis.call('GET', KEYS[1])
+redis.call('DEL', KEYS[1])
+return attempts
+"""
+
+# 取出到期的重试
+# KEYS: SMS_RETRY_KEY, SMS_RETRY_ATTEMPTS_KEY  ARGV: 当前时间，最多取出的个数
+POP_RETRY_SCRIPT = """
+local mobiles = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local result = {}
+for i, mobile in ipairs(mobiles) do
+    redis.call('ZREM', KEYS[1], mobile)
+    result[#result + 1] = mobile
+    result[#result + 1] = redis.call('HGET', KEYS[2], mobile) or '0'
+    redis.call('HDEL', KEYS[2], mobile)
+end
+return result
+"""
+
+
+def _status_json(status, attempts=0, status_code=None):
+    return json.dumps({'status': status, 'attempts': attempts, 'status_code': status_code, 'time': int(time.time())})
+
+
+def set_status(con_redis, mobile, status, attempts=0, status_code=None):
+    con_redis.setex(SMS_STATUS_KEY.format(mobile), constants.SMS_STATUS_EXPIRES,
+                    _status_json(status, attempts, status_code))
+
+
+def get_status(mobile):
+    """:return: {'status':, 'attempts':, 'status_code':, 'time':}，没有记录返回None"""
+    con_redis = get_redis_connection(alias='sms_codes')
+    status = con_redis.get(SMS_STATUS_KEY.format(mobile))
+    return json.loads(status.decode('utf8')) if status else None
+
+
+def enqueue_sms(mobile, attempts=0):
+    """
+    手机号放入发送队列，已经在队列中时不重复放入
+    :return: 是否放入了队列
+    """
+    con_redis = get_redis_connection(alias='sms_codes')
+    enqueue_script = con_redis.register_script(ENQUEUE_SCRIPT)
+    return bool(enqueue_script(keys=[SMS_PENDING_KEY.format(mobile), SMS_QUEUE_KEY, SMS_STATUS_KEY.format(mobile),
+                                     SMS_RETRY_KEY, SMS_RETRY_ATTEMPTS_KEY],
+                               args=[mobile, attempts, _status_json(STATUS_QUEUED, attempts),
+                                     constants.SMS_STATUS_EXPIRES, constants.SMS_PENDING_EXPIRES]))
+
+
+def send_sms(mobile, attempts):
+    """
+    发送一条短信，失败时安排重试
+    :param attempts: 之前已尝试的次数
+    :return: 状态
+    """
+    con_redis = get_redis_connection(alias='sms_codes')
+    sms_code = get_redis_connection(alias='verify_codes').get('sms_{}'.format(mobile))
+    if not sms_code:
+        set_status(con_redis, mobile, STATUS_EXPIRED, attempts)
+        return STATUS_EXPIRED
+    attempts += 1
+    set_status(con_redis, mobile, STATUS_SENDING, attempts)
+    try:
+        status_code = CCP().send(mobile, [sms_code.decode('utf8'), constants.SMS_CODE_REDIS_EXPIRES // 60],
+                                 constants.SMS_CODE_TEMP_ID)
+    except Exception as e:
+        logger.error('发送验证码短信[异常][ mobile: %s, message: %s ]' % (mobile, e))
+        status_code = None
+    if status_code == '000000':
+        set_status(con_redis, mobile, STATUS_SENT, attempts, status_code)
+        logger.info('发送验证码短信[正常][ mobile: %s ]' % mobile)
+        return STATUS_SENT
+    if attempts >= constants.SMS_SEND_MAX_ATTEMPTS:
+        set_status(con_redis, mobile, STATUS_FAILED, attempts, status_code)
+        logger.warning('发送验证码短信[失败][ mobile: %s, status_code: %s ]' % (mobile, status_code))
+        return STATUS_FAILED
+    # 指数退避：2秒，4秒，8秒...
+    retry_at = time.time() + constants.SMS_RETRY_BACKOFF * 2 ** (attempts - 1)
+    pl = con_redis.pipeline()
+    pl.hset(SMS_RETRY_ATTEMPTS_KEY, mobile, attempts)
+    pl.zadd(SMS_RETRY_KEY, {mobile: retry_at})
+    pl.execute()
+    set_status(con_redis, mobile, STATUS_RETRYING, attempts, status_code)
+    return STATUS_RETRYING
+
+
+def process_one(timeout):
+    """
+    从队列取出一个手机号发送，队列为空时最多等待timeout秒
+    :return: 是否处理了一个
+    """
+    con_redis = get_redis_connection(alias='sms_codes')
+    item = con_redis.blpop(SMS_QUEUE_KEY, timeout=timeout)
+    if item is None:
+        return False
+    mobile = item[1].decode('utf8')
+    take_pending_script = con_redis.register_script(TAKE_PENDING_SCRIPT)
+    attempts = take_pending_script(keys=[SMS_PENDING_KEY.format(mobile)])
+    send_sms(mobile, int(attempts or 0))
+    return True
+
+
+def requeue_due_retries(batch_size=100):
+    """
+    到了重试时间的放回队列(手机号已经在队列中时不再放入)
+    :return: 放回的个数
+    """
+    con_redis = get_redis_connection(alias='sms_codes')
+    pop_retry_script = con_redis.register_script(POP_RETRY_SCRIPT)
+    result = pop_retry_script(keys=[SMS_RETRY_KEY, SMS_RETRY_ATTEMPTS_KEY], args=[time.time(), batch_size])
+    count = 0
+    for mobile, attempts in zip(result[0::2], result[1::2]):
+        if enqueue_sms(mobile.decode('utf8'), int(attempts)):
+            count += 1
+    return count
+
+
+def get_queue_stats():
+    """:return: {'queued': 队列中的个数, 'retrying': 等待重试的个数}"""
+    con_redis = get_redis_connection(alias='sms_codes')
+    pl = con_redis.pipeline(transaction=False)
+    pl.llen(SMS_QUEUE_KEY)
+    pl.zcard(SMS_RETRY_KEY)
+    queued, retrying = pl.execute()
+    return {'queued': queued, 'retrying': retrying}
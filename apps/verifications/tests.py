@@ -1,3 +1,328 @@
-from django.test import TestCase
+import http.client
+import io
+import json
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django_redis import get_redis_connection
+from PIL import Image
+
+from utils.captcha import captcha as captcha_module
+from utils.testing import FakeRedisMixin
+from utils.yuntongxun.http_pool import HTTPConnectionPool
+from utils.yuntongxun.xml_to_json import xmltojson
+from verifications import sms_queue
+from verifications.captcha_pool import CAPTCHA_POOL_KEY, get_pool_stats
+from verifications.sms_code import save_sms_code, SMS_CODE_SAVED, IMAGE_CODE_ERROR, SEND_TOO_OFTEN
+
+OK_RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'
+
+
+class ScriptedServer(object):
+    """按actions依次处理每个请求：'ok'返回响应，'close'不返回响应直接关闭连接，'partial'返回一半状态行后关闭"""
+
+    def __init__(self):
+        self.actions = []
+        self.requests = 0
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        buffer = b''
+        with conn:
+            while True:
+                while b'\r\n\r\n' not in buffer:
+                    data = conn.recv(4096)
+                    if not data:
+                        return
+                    buffer += data
+                buffer = buffer.split(b'\r\n\r\n', 1)[1]
+                self.requests += 1
+                action = self.actions.pop(0)
+                if action == 'ok':
+                    conn.sendall(OK_RESPONSE)
+                    continue
+                if action == 'partial':
+                    conn.sendall(b'HTTP/1.1 20')
+                return
+
+    def close(self):
+        self.sock.close()
+
+
+class HTTPConnectionPoolTest(SimpleTestCase):
+    """复用的连接被服务器关闭时，只在请求没有被处理的情况下重试"""
+
+    def setUp(self):
+        self.server = ScriptedServer()
+        self.addCleanup(self.server.close)
+        self.pool = HTTPConnectionPool('http', '127.0.0.1', self.server.port, maxsize=1)
+        self.addCleanup(self.pool.close)
+
+    def test_reuse_connection(self):
+        self.server.actions = ['ok', 'ok']
+        self.assertEqual(self.pool.request('GET', 'http://x/a'), b'ok')
+        self.assertEqual(self.pool.request('GET', 'http://x/a'), b'ok')
+        self.assertEqual(self.pool._idle.qsize(), 1)
+
+    def test_retry_when_closed_without_response(self):
+        self.server.actions = ['ok', 'close', 'ok']
+        self.pool.request('GET', 'http://x/a')
+        self.assertEqual(self.pool.request('GET', 'http://x/a'), b'ok')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_retry_when_send_fails(self):
+        self.server.actions = ['ok', 'ok']
+        self.pool.request('GET', 'http://x/a')
+        self.pool._idle.queue[0].sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(self.pool.request('GET', 'http://x/a'), b'ok')
+        self.assertEqual(self.server.requests, 2)
+
+    def test_no_retry_after_partial_response(self):
+        self.server.actions = ['ok', 'partial', 'ok']
+        self.pool.request('GET', 'http://x/a')
+        # 服务器可能已经处理了请求，重试会重复发送短信
+        with self.assertRaises(http.client.HTTPException):
+            self.pool.request('GET', 'http://x/a')
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.pool._idle.qsize(), 0)
+
+
+class XmlToJsonTest(SimpleTestCase):
+    """转换结果和原来保存在类属性中的实现一致(期望值由原来的实现生成)，多次调用互不影响"""
+
+    def test_template_sms(self):
+        xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Response><statusCode>000000</statusCode>'
+               '<TemplateSMS><dateCreated>20191018101010</dateCreated><smsMessageSid>ff80</smsMessageSid>'
+               '</TemplateSMS></Response>').encode()
+        self.assertEqual(xmltojson().main(xml), {
+            'statusCode': '000000',
+            'templateSMS': {'dateCreated': '20191018101010', 'smsMessageSid': 'ff80'},
+        })
+
+    def test_error_does_not_keep_previous_result(self):
+        xmltojson().main(b'<Response><statusCode>000000</statusCode>'
+                         b'<TemplateSMS><smsMessageSid>ff80</smsMessageSid></TemplateSMS></Response>')
+        xml = '<Response><statusCode>160040</statusCode><statusMsg>发送上限</statusMsg></Response>'.encode()
+        self.assertEqual(xmltojson().main(xml), {'statusCode': '160040', 'statusMsg': '发送上限'})
+
+    def test_sub_account_list(self):
+        xml = (b'<Response><statusCode>000000</statusCode><totalCount>2</totalCount>'
+               b'<SubAccount><subAccountSid>s1</subAccountSid><voipAccount>v1</voipAccount></SubAccount>'
+               b'<SubAccount><subAccountSid>s2</subAccountSid><voipAccount>v2</voipAccount></SubAccount></Response>')
+        expected = {
+            'statusCode': '000000',
+            'totalCount': '2',
+            'SubAccount': [{'subAccountSid': 's1', 'voipAccount': 'v1'}, {'subAccountSid': 's2', 'voipAccount': 'v2'}],
+        }
+        self.assertEqual(xmltojson().main(xml), expected)
+        # 再次转换时列表不会越来越长
+        self.assertEqual(xmltojson().main(xml), expected)
+
+    def test_sub_account_without_total_count(self):
+        xml = (b'<Response><statusCode>000000</statusCode><SubAccount><subAccountSid>s1</subAccountSid></SubAccount>'
+               b'<SubAccount><subAccountSid>s2</subAccountSid></SubAccount></Response>')
+        self.assertEqual(xmltojson().main(xml), {'statusCode': '000000', 'SubAccount': {'subAccountSid': 's2'}})
+
+    def test_template_list(self):
+        xml = (b'<Response><statusCode>000000</statusCode><totalCount>2</totalCount>'
+               b'<TemplateSMS><id>1</id><title>a</title></TemplateSMS>'
+               b'<TemplateSMS><id>2</id><title>b</title></TemplateSMS></Response>')
+        self.assertEqual(xmltojson().main2(xml), {
+            'statusCode': '000000',
+            'totalCount': '2',
+            'TemplateSMS': [{'id': '1', 'title': 'a'}, {'id': '2', 'title': 'b'}],
+        })
+
+
+class CaptchaPoolTest(FakeRedisMixin, TestCase):
+    """图片验证码优先从池中取，池子空了在请求中生成"""
+
+    def get_image_code(self):
+        image_code_id = uuid.uuid4()
+        response = self.client.get('/image_codes/{}/'.format(image_code_id))
+        text = get_redis_connection(alias='verify_codes').get('img_{}'.format(image_code_id))
+        return response, text
+
+    def test_empty_pool(self):
+        response, text = self.get_image_code()
+        self.assertTrue(response.content.startswith(b'\xff\xd8'))
+        self.assertEqual(len(text), 4)
+        self.assertEqual(get_pool_stats()['miss'], 1)
+
+    def test_pop_from_pool(self):
+        call_command('fill_captcha_pool', '--once', '--size', '3')
+        con_redis = get_redis_connection(alias='verify_codes')
+        pool_text, pool_image = con_redis.lindex(CAPTCHA_POOL_KEY, 0).split(b'\n', 1)
+        response, text = self.get_image_code()
+        # 图片和保存的文本是池中的同一项
+        self.assertEqual(response.content, pool_image)
+        self.assertEqual(text, pool_text)
+        self.assertEqual(get_pool_stats(), {'depth': 2, 'hit': 1, 'miss': 0, 'produced': 3})
+
+    def test_fill_up_to_size(self):
+        call_command('fill_captcha_pool', '--once', '--size', '3')
+        call_command('fill_captcha_pool', '--once', '--size', '5')
+        self.assertEqual(get_pool_stats()['depth'], 5)
+        self.assertEqual(get_pool_stats()['produced'], 5)
+
+
+class CaptchaRenderTest(SimpleTestCase):
+    """验证码绘制：查表代替逐像素的lambda，没有numpy时也能绘制"""
+
+    def open_image(self, content):
+        return Image.open(io.BytesIO(content))
+
+    def test_default_options(self):
+        text, content = captcha_module.captcha.generate_captcha()
+        self.assertEqual(len(text), 4)
+        image = self.open_image(content)
+        self.assertEqual((image.format, image.size), ('JPEG', (200, 75)))
+
+    def test_custom_options(self):
+        options = captcha_module.DEFAULT_OPTIONS._replace(width=120, height=40, font_sizes=(30,), fmt='PNG')
+        image = self.open_image(captcha_module.render('AB34', options))
+        self.assertEqual((image.format, image.size), ('PNG', (120, 40)))
+
+    def test_mask_table(self):
+        mask = Image.new('L', (256, 1))
+        mask.putdata(range(256))
+        self.assertEqual(list(mask.point(captcha_module.MASK_TABLE).getdata()),
+                         list(mask.point(lambda i: i * 1.97).getdata()))
+
+    def test_without_numpy(self):
+        with mock.patch.object(captcha_module, 'numpy', None):
+            image = self.open_image(captcha_module.render('AB34'))
+        self.assertEqual(image.size, (200, 75))
+
+
+class CaptchaThreadSafetyTest(SimpleTestCase):
+    """同一个Captcha实例可以在多个线程中同时绘制，字体按线程缓存"""
+
+    def test_render_in_threads(self):
+        texts = [captcha_module.Captcha.random_text() for _ in range(32)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            images = list(executor.map(captcha_module.render, texts))
+        for content in images:
+            self.assertEqual(Image.open(io.BytesIO(content)).size, (200, 75))
+
+    def test_fonts_per_thread(self):
+        options = captcha_module.DEFAULT_OPTIONS
+        fonts = captcha_module.load_fonts(options.fonts, options.font_sizes)
+        self.assertIs(captcha_module.load_fonts(options.fonts, options.font_sizes), fonts)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            other = executor.submit(captcha_module.load_fonts, options.fonts, options.font_sizes).result()
+        self.assertIsNot(other, fonts)
+        self.assertEqual(len(other), len(options.fonts) * len(options.font_sizes))
+
+
+class SmsQueueTest(FakeRedisMixin, TestCase):
+    """短信放入队列异步发送：同一个手机号只排队一次，失败按退避重试，超过次数记为失败"""
+
+    def setUp(self):
+        super(SmsQueueTest, self).setUp()
+        patcher = mock.patch('verifications.sms_queue.CCP')
+        self.ccp = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        get_redis_connection(alias='verify_codes').setex('sms_13800000000', 300, '123456')
+
+    def test_send(self):
+        self.ccp.send.return_value = '000000'
+        self.assertTrue(sms_queue.enqueue_sms('13800000000'))
+        self.assertFalse(sms_queue.enqueue_sms('13800000000'))
+        self.assertEqual(sms_queue.get_queue_stats(), {'queued': 1, 'retrying': 0})
+        self.assertEqual(sms_queue.get_status('13800000000')['status'], sms_queue.STATUS_QUEUED)
+
+        self.assertTrue(sms_queue.process_one(1))
+        # 发送时读取当时保存的验证码
+        self.ccp.send.assert_called_once_with('13800000000', ['123456', 5], 1)
+        self.assertEqual(sms_queue.get_status('13800000000')['status'], sms_queue.STATUS_SENT)
+        # 发送后可以再次排队
+        self.assertTrue(sms_queue.enqueue_sms('13800000000'))
+
+    def test_expired_code(self):
+        self.assertTrue(sms_queue.enqueue_sms('13900000000'))
+        self.assertTrue(sms_queue.process_one(1))
+        self.assertEqual(sms_queue.get_status('13900000000')['status'], sms_queue.STATUS_EXPIRED)
+        self.ccp.send.assert_not_called()
+
+    @mock.patch('verifications.constants.SMS_RETRY_BACKOFF', 0)
+    def test_retry_until_failed(self):
+        self.ccp.send.side_effect = ['172001', OSError('连接失败'), '172001']
+        sms_queue.enqueue_sms('13800000000')
+        for attempts in range(1, 4):
+            sms_queue.requeue_due_retries()
+            self.assertTrue(sms_queue.process_one(1))
+            self.assertEqual(sms_queue.get_status('13800000000')['attempts'], attempts)
+        status = sms_queue.get_status('13800000000')
+        self.assertEqual((status['status'], status['status_code']), (sms_queue.STATUS_FAILED, '172001'))
+        self.assertEqual(sms_queue.get_queue_stats(), {'queued': 0, 'retrying': 0})
+
+    def test_new_request_cancels_retry(self):
+        self.ccp.send.return_value = '172001'
+        sms_queue.enqueue_sms('13800000000')
+        sms_queue.process_one(1)
+        self.assertEqual(sms_queue.get_queue_stats(), {'queued': 0, 'retrying': 1})
+        self.assertTrue(sms_queue.enqueue_sms('13800000000'))
+        self.assertEqual(sms_queue.get_queue_stats(), {'queued': 1, 'retrying': 0})
+
+
+class SmsCodeTest(FakeRedisMixin, TestCase):
+    """发送短信验证码：校验并删除图片验证码、检查发送间隔、保存短信验证码在一个lua脚本中原子完成"""
+
+    def setUp(self):
+        super(SmsCodeTest, self).setUp()
+        self.con_redis = get_redis_connection(alias='verify_codes')
+
+    def new_image_code(self, text):
+        image_code_id = uuid.uuid4()
+        self.con_redis.setex('img_{}'.format(image_code_id), 300, text)
+        return image_code_id
+
+    def post(self, image_code_id, text, mobile='13600000000'):
+        return self.client.post('/sms_codes/', json.dumps({'mobile': mobile, 'text': text,
+                                                           'image_code_id': str(image_code_id)}),
+                                content_type='application/json').json()
+
+    def test_send_flow(self):
+        image_code_id = self.new_image_code('AbCd')
+        self.assertEqual(self.post(image_code_id, 'abce')['errmsg'], '图片验证失败！')
+        # 图片验证码输错一次就失效
+        self.assertIsNone(self.con_redis.get('img_{}'.format(image_code_id)))
+        self.assertEqual(self.post(image_code_id, 'abcd')['errmsg'], '图片验证失败！')
+
+        self.assertEqual(self.post(self.new_image_code('AbCd'), 'ABCD')['errno'], '0')
+        self.assertEqual(len(self.con_redis.get('sms_13600000000')), 6)
+        self.assertEqual(sms_queue.get_status('13600000000')['status'], sms_queue.STATUS_QUEUED)
+        self.assertEqual(self.post(self.new_image_code('AbCd'), 'abcd')['errmsg'], '获取手机短信验证码过于频繁')
+
+    def test_image_code_used_once(self):
+        image_code_id = self.new_image_code('wxyz')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: save_sms_code(image_code_id, 'WXYZ', '13500000000', '%06d' % i),
+                                        range(20)))
+        self.assertEqual(results.count(SMS_CODE_SAVED), 1)
+        self.assertEqual(results.count(IMAGE_CODE_ERROR), 19)
+
+    def test_one_send_per_interval(self):
+        image_code_ids = [self.new_image_code('wxyz') for _ in range(20)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: save_sms_code(i, 'wxyz', '13400000000', '111111'),
+                                        image_code_ids))
+        self.assertEqual((results.count(SMS_CODE_SAVED), results.count(SEND_TOO_OFTEN)), (1, 19))
@@ -9,10 +9,12 @@ from utils.captcha.captcha import captcha       # 加载验证码模块
 from django_redis import get_redis_connection   # 加载redis数据库的方法
 from verifications import constants             # 加载常量模块，方便修改
 from utils.json_fun import to_json_data         # 引入封装的JsonResponse
-from user import models
+from user.members import username_exists, mobile_exists
 from utils.user_reg_code import Code,error_map       # 引入错误码
 from verifications.forms import CheckImgCodeForm     # 导入form表单(发送短信验证使用)
-from utils.yuntongxun.sms import CCP
+from verifications.captcha_pool import pop_captcha   # 图片验证码池
+from verifications.sms_queue import enqueue_sms    # 短信发送队列
+from verifications.sms_code import save_sms_code, IMAGE_CODE_ERROR, SEND_TOO_OFTEN
 
 # 导入日志器
 logger = logging.getLogger('django')   # settings里面设置的
@@ -23,13 +25,19 @@ class ImageCode(View):
      /image_codes/
     """
     def get(self,request,image_code_id):
-        # 获取验证码的信息(文本信息和背景图片)
-        text,image = captcha.generate_captcha()
-        # 连接保存验证码信息的redis数据库verify_codes
-        con_redis = get_redis_connection(alias='verify_codes')
         # redis中以键值对形式保存信息
         img_key = 'img_{}'.format(image_code_id)   # 键
-        con_redis.setex(img_key, constants.REDIS_IMG_EXPIRES, text)  # (键，过期时间，值)
+        # 从验证码池中取一个(fill_captcha_pool命令提前生成)，同时保存文本
+        captcha_item = pop_captcha(img_key)
+        if captcha_item is not None:
+            text, image = captcha_item
+        else:
+            # 池子空了，在请求中生成
+            # 获取验证码的信息(文本信息和背景图片)
+            text,image = captcha.generate_captcha()
+            # 连接保存验证码信息的redis数据库verify_codes
+            con_redis = get_redis_connection(alias='verify_codes')
+            con_redis.setex(img_key, constants.REDIS_IMG_EXPIRES, text)  # (键，过期时间，值)
         # 打印日志(图片验证码)到后台
         logger.info('Image code:{}'.format(text))
         # 指定返回信息和格式
@@ -41,8 +49,8 @@ class CheckUsernameView(View):
     GET usernames/(?P<username>\w{6,10})/
     """
     def get(self, request, username):
-        # 从数据库中统计出该用户名个数
-        count = models.Users.objects.filter(username=username).count()
+        # 先查redis中的用户名集合，可能已注册时才查询数据库
+        count = 1 if username_exists(username) else 0
         # 从auth.js知道需要返回的内容是:data.count,data.username
         data = {
             'username': username,
@@ -57,8 +65,8 @@ class CheckMobileView(View):
     GET mobiles/(?P<mobile>1[3-9]\d{9})/
     """
     def get(self,request, mobile):
-        # 从数据库中统计该手机号个数
-        count = models.Users.objects.filter(mobile=mobile).count()
+        # 先查redis中的手机号集合，可能已注册时才查询数据库
+        count = 1 if mobile_exists(mobile) else 0
         #  从auth.js知道需要返回的内容是:data.count,data.mobile
         data = {
             'mobile': mobile,
@@ -97,19 +105,23 @@ class SmsCodesView(View):
             #     sms_num += random.choice(string.digits)
             # 创建6位随机数的短信验证码内容
             sms_num = ''.join([random.choice(string.digits) for _ in range(constants.SMS_CODE_NUMS)])
-            # 保存到数据库
-            con_redis = get_redis_connection(alias='verify_codes')   # 连接redis
-            pl = con_redis.pipeline()                     # redis的管道方法（可以两组不同数据一起存入）
-            sms_key_name = 'sms_{}'.format(mobile)        # 验证码键名
-            sms_tag_name = 'sms_tag_{}'.format(mobile)   # 发送标记健名
+            # 保存到数据库：校验并删除图片验证码、检查并设置发送标记、保存短信验证码，一次完成
             try:
-                pl.setex(sms_key_name, constants.SMS_CODE_REDIS_EXPIRES, sms_num)        # (键，过期时间，值)
-                pl.setex(sms_tag_name,constants.SEND_SMS_CODE_INTERVAL, 1)
-                pl.execute()
+                result = save_sms_code(form.cleaned_data.get('image_code_id'), form.cleaned_data.get('text'),
+                                       mobile, sms_num)
             except Exception as e:
-                logger.debug("redis 执行错误！".format(e))        # 发送一个日志信息
+                logger.error("redis 执行错误！{}".format(e))        # 发送一个日志信息
                 return to_json_data(errno=Code.UNKOWNERR,errmsg=error_map[Code.UNKOWNERR])  # 返回错误给前端
-            # 4.发送短信验证码(测试)
+            if result == IMAGE_CODE_ERROR:
+                return to_json_data(errno=Code.PARAMERR, errmsg='图片验证失败！')
+            if result == SEND_TOO_OFTEN:
+                return to_json_data(errno=Code.PARAMERR, errmsg='获取手机短信验证码过于频繁')
+            # 4.发送短信验证码：放入队列，由send_sms命令发送，请求不等待云通讯返回
+            try:
+                enqueue_sms(mobile)
+            except Exception as e:
+                logger.error("发送验证码短信[异常][ mobile: %s, message: %s ]" % (mobile, e))
+                return to_json_data(errno=Code.SMSERROR, errmsg=error_map[Code.SMSERROR])
             logger.info("发送验证码短信[正常][ mobile: %s sms_code: %s]" % (mobile, sms_num))
             return to_json_data(errno=Code.OK, errmsg="短信验证码发送成功")
             # 发送短信
@@ -7,9 +7,11 @@ $(function () {
   let iTotalPage = 1; //默认总页数为1
   let sCurrentTagId = 0; //默认分类标签为0
   let bIsLoadData = true;   // 是否正在向后台加载数据
+  let bUseCursor = true;    // 是否使用游标分页(深翻页不变慢)，false则按页码加载
+  let sNextCursor = '';     // 游标分页：下一页的游标，为null表示没有更多数据
 
-  // 加载新闻列表信息
-  fn_load_content();
+  // 首页初始数据(第一页新闻和轮播图)一次请求加载
+  fn_load_bootstrap();
 
   $newsLi.click(function () {
     // 点击分类标签，则为点击的标签加上一个class属性为active
@@ -23,6 +25,7 @@ $(function () {
             // 重置分页参数
             iPage = 1;
             iTotalPage = 1;
+            sNextCursor = '';
             fn_load_content()
         }
   });
@@ -45,8 +48,8 @@ $(function () {
       // 判断页数，去更新新闻数据
       if (!bIsLoadData) {
         bIsLoadData = true;
-        // 如果当前页数据如果小于总页数，那么才去加载数据
-        if (iPage < iTotalPage) {
+        // 如果当前页数据如果小于总页数(游标模式下还有下一页游标)，那么才去加载数据
+        if (bUseCursor ? sNextCursor : iPage < iTotalPage) {
           iPage += 1;
           $(".btn-more").remove();  // 删除标签
           // 去加载数据
@@ -61,8 +64,7 @@ $(function () {
     }
   });
 
-  // 新闻轮播图功能
-  fn_load_banner();
+  // 新闻轮播图功能(数据在fn_load_bootstrap中已加载)
   /*=== bannerStart ===*/
   let $banner = $('.banner');
   let $picLi = $(".banner .pic li");
@@ -120,8 +122,12 @@ $(function () {
     // 创建请求参数
     let sDataParams = {
       "tag_id": sCurrentTagId,
-      "page": iPage
     };
+    if (bUseCursor) {
+      sDataParams.cursor = iPage === 1 ? '' : sNextCursor;
+    } else {
+      sDataParams.page = iPage;
+    }
 
     // 创建ajax请求
     $.ajax({
@@ -135,34 +141,7 @@ $(function () {
     })
       .done(function (res) {
         if (res.errno === "0") {
-          iTotalPage = res.data.total_pages;  // 后端传过来的总页数
-          if (iPage === 1) {
-            $(".news-list").html("")
-          }
-
-          res.data.news.forEach(function (one_news) {
-            let content = `
-              <li class="news-item">
-                 <a href="/news/${one_news.id}" class="news-thumbnail" target="_blank">
-                    <img src="${one_news.image_url}" alt="${one_news.title}" title="${one_news.title}">
-                 </a>
-                 <div class="news-content">
-                    <h4 class="news-title"><a href="/news/${one_news.id}">${one_news.title}</a></h4>
-                    <p class="news-details">${one_news.digest}</p>
-                    <div class="news-other">
-                      <span class="news-type">${one_news.tag_name}</span>
-                      <span class="news-time">${one_news.update_time}</span>
-                      <span class="news-author">${one_news.author}</span>
-                    </div>
-                 </div>
-              </li>`;
-            $(".news-list").append(content)
-          });
-
-          $(".news-list").append($('<a href="javascript:void(0);" class="btn-more">滚动加载更多</a>'));
-          // 数据加载完毕，设置正在加载数据的变量为false，表示当前没有在加载数据
-          bIsLoadData = false;
-
+          fn_render_news(res.data);
         } else {
           // 登录失败，打印错误信息
           message.showError(res.errmsg);
@@ -173,36 +152,20 @@ $(function () {
       });
   }
 
-  function fn_load_banner() {
+  // 首页初始数据：第一页新闻和轮播图，标签和热门新闻已在页面中渲染
+  function fn_load_bootstrap() {
     $.ajax({
       // 请求地址
-      url: "/news/banners/",  // url尾部需要添加/
+      url: "/news/bootstrap/",  // url尾部需要添加/
       // 请求方式
       type: "GET",
-      async: false
+      dataType: "json",
+      async: false    // 轮播图功能需要先有图片元素
     })
       .done(function (res) {
         if (res.errno === "0") {
-          let content = ``;
-          let tab_content = ``;
-          res.data.banners.forEach(function (one_banner, index) {
-            if (index === 0){
-              content = `
-                <li style="display:block;"><a href="/news/${one_banner.news_id}">
-                 <img src="${one_banner.image_url}" alt="${one_banner.news_title}"></a></li>
-              `;
-              tab_content = `<li class="active"></li>`;
-            } else {
-              content = `
-              <li><a href="/news/${one_banner.news_id}"><img src="${one_banner.image_url}" alt="${one_banner.news_title}"></a></li>
-              `;
-              tab_content = `<li></li>`;
-            }
-
-            $(".pic").append(content);
-            $(".tab").append(tab_content)
-          });
-
+          fn_render_banner(res.data.banners);
+          fn_render_news(res.data);
         } else {
           // 登录失败，打印错误信息
           message.showError(res.errmsg);
@@ -213,4 +176,61 @@ $(function () {
       });
   }
 
+  // 渲染一页新闻，data为/news/或/news/bootstrap/返回的数据
+  function fn_render_news(data) {
+    if (bUseCursor) {
+      sNextCursor = data.next_cursor;  // 后端传过来的下一页游标
+    } else {
+      iTotalPage = data.total_pages;  // 后端传过来的总页数
+    }
+    if (iPage === 1) {
+      $(".news-list").html("")
+    }
+
+    data.news.forEach(function (one_news) {
+      let content = `
+        <li class="news-item">
+           <a href="/news/${one_news.id}" class="news-thumbnail" target="_blank">
+              <img src="${one_news.image_url}" alt="${one_news.title}" title="${one_news.title}">
+           </a>
+           <div class="news-content">
+              <h4 class="news-title"><a href="/news/${one_news.id}">${one_news.title}</a></h4>
+              <p class="news-details">${one_news.digest}</p>
+              <div class="news-other">
+                <span class="news-type">${one_news.tag_name}</span>
+                <span class="news-time">${one_news.update_time}</span>
+                <span class="news-author">${one_news.author}</span>
+              </div>
+           </div>
+        </li>`;
+      $(".news-list").append(content)
+    });
+
+    $(".news-list").append($('<a href="javascript:void(0);" class="btn-more">滚动加载更多</a>'));
+    // 数据加载完毕，设置正在加载数据的变量为false，表示当前没有在加载数据
+    bIsLoadData = false;
+  }
+
+  function fn_render_banner(banners) {
+    let content = ``;
+    let tab_content = ``;
+    banners.forEach(function (one_banner, index) {
+      if (index === 0){
+        content = `
+          <li style="display:block;"><a href="/news/${one_banner.news_id}">
+           <img src="${one_banner.image_url}" alt="${one_banner.news_title}"></a></li>
+        `;
+        tab_content = `<li class="active"></li>`;
+      } else {
+        content = `
+        <li><a href="/news/${one_banner.news_id}"><img src="${one_banner.image_url}" alt="${one_banner.news_title}"></a></li>
+        `;
+        tab_content = `<li></li>`;
+      }
+
+      $(".pic").append(content);
+      $(".tab").append(tab_content)
+    });
+  }
+
 });
\ No newline at end of file
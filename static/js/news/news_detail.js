@@ -40,35 +40,10 @@ $(function () {
       })
         .done(function (res) {
           if (res.errno === "0") {
-            let one_comment = res.data;
-            let html_comment = ``;
-            html_comment += `
-          <li class="comment-item">
-            <div class="comment-info clearfix">
-              <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
-              <span class="comment-user">${one_comment.author}</span>
-            </div>
-            <div class="comment-content">${one_comment.content}</div>
-
-                <div class="parent_comment_text">
-                  <div class="parent_username">${one_comment.parent.author}</div>
-                  <br/>
-                  <div class="parent_content_text">
-                    ${one_comment.parent.content}
-                  </div>
-                </div>
-
-              <div class="comment_time left_float">${one_comment.update_time}</div>
-              <a href="javascript:;" class="reply_a_tag right_float">回复</a>
-              <form class="reply_form left_float" comment-id="${one_comment.content_id}" news-id="${one_comment.news_id}">
-                <textarea class="reply_input"></textarea>
-                <input type="button" value="回复" class="reply_btn right_float">
-                <input type="reset" name="" value="取消" class="reply_cancel right_float">
-              </form>
-
-          </li>`;
+            let html_comment = fn_render_comment(res.data);
 
             $(".comment-list").prepend(html_comment);
+            fn_add_comment_count();
             $this.prev().val('');   // 请空输入框
             $this.parent().hide();  // 关闭评论框
 
@@ -145,27 +120,10 @@ $(function () {
     })
       .done(function (res) {
         if (res.errno === "0") {
-          let one_comment = res.data;
-          let html_comment = ``;
-          html_comment += `
-          <li class="comment-item">
-            <div class="comment-info clearfix">
-              <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
-              <span class="comment-user">${one_comment.author}</span>
-            </div>
-            <div class="comment-content">${one_comment.content}</div>
-
-              <div class="comment_time left_float">${one_comment.update_time}</div>
-              <a href="javascript:;" class="reply_a_tag right_float">回复</a>
-              <form class="reply_form left_float" comment-id="${one_comment.content_id}" news-id="${one_comment.news_id}">
-                <textarea class="reply_input"></textarea>
-                <input type="button" value="回复" class="reply_btn right_float">
-                <input type="reset" name="" value="取消" class="reply_cancel right_float">
-              </form>
-
-          </li>`;
+          let html_comment = fn_render_comment(res.data);
 
           $(".comment-list").prepend(html_comment);
+          fn_add_comment_count();
           $this.prev().val('');   // 请空输入框
           // $this.parent().hide();  // 关闭评论框
 
@@ -187,6 +145,80 @@ $(function () {
       });
   });
 
+  // 加载更多评论(游标分页)
+  $('.comment-contain').delegate('.btn-more-comment', 'click', function () {
+    let $this = $(this);
+    if ($this.hasClass('loading')) {
+      return
+    }
+    $this.addClass('loading');
+    $.ajax({
+      url: "/news/" + $this.attr('news-id') + "/comments/",
+      type: "GET",
+      data: {"cursor": $this.attr('data-next-cursor')},
+      dataType: "json",
+    })
+      .done(function (res) {
+        if (res.errno === "0") {
+          res.data.comments.forEach(function (one_comment) {
+            $(".comment-list").append(fn_render_comment(one_comment));
+          });
+          $(".comment-count").html(res.data.total_count);
+          if (res.data.next_cursor) {
+            $this.attr('data-next-cursor', res.data.next_cursor);
+          } else {
+            $this.remove();   // 没有更多评论
+          }
+        } else {
+          message.showError(res.errmsg);
+        }
+      })
+      .fail(function () {
+        message.showError('服务器超时，请重试！');
+      })
+      .always(function () {
+        $this.removeClass('loading');
+      });
+  });
+
+  // 生成一条评论的html(和news_detail.html模板中的一致)
+  function fn_render_comment(one_comment) {
+    let parent_html = ``;
+    if (one_comment.parent) {
+      parent_html = `
+              <div class="parent_comment_text">
+                <div class="parent_username">${one_comment.parent.author}</div>
+                <br/>
+                <div class="parent_content_text">
+                  ${one_comment.parent.content}
+                </div>
+              </div>`;
+    }
+    return `
+          <li class="comment-item">
+            <div class="comment-info clearfix">
+              <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
+              <span class="comment-user">${one_comment.author}</span>
+            </div>
+            <div class="comment-content">${one_comment.content}</div>
+            ${parent_html}
+            <div class="comment_time left_float">${one_comment.update_time}</div>
+            <a href="javascript:;" class="reply_a_tag right_float">回复</a>
+            <form class="reply_form left_float" comment-id="${one_comment.comment_id}" news-id="${one_comment.news_id}">
+              <textarea class="reply_input"></textarea>
+              <input type="button" value="回复" class="reply_btn right_float">
+              <input type="reset" name="" value="取消" class="reply_cancel right_float">
+            </form>
+
+          </li>`;
+  }
+
+  // 发表评论后评论总数加1
+  function fn_add_comment_count() {
+    let $count = $(".comment-count");
+    $count.html(parseInt($count.html() || 0) + 1);
+  }
+
   // get cookie using jQuery
   function getCookie(name) {
     let cookieValue = null;
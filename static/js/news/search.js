@@ -0,0 +1,35 @@
+// 在static/js/news/search.js文件中
+
+$(function () {
+  // 搜索提示：每输入一个字符请求一次，结果放到datalist中
+  let $searchInput = $(".search-control");
+  let $suggestList = $("#search-suggest");
+  let sLastQuery = '';
+
+  $searchInput.on('input', function () {
+    let sQuery = $.trim($searchInput.val());
+    if (!sQuery || sQuery === sLastQuery) {
+      return
+    }
+    sLastQuery = sQuery;
+    $.ajax({
+      url: "/search/suggest/",
+      type: "GET",
+      data: {"q": sQuery},
+      dataType: "json"
+    })
+      .done(function (res) {
+        // 返回前用户又输入了内容，丢弃旧的结果
+        if (res.errno !== "0" || sQuery !== sLastQuery) {
+          return
+        }
+        $suggestList.empty();
+        res.data.words.forEach(function (word) {
+          $suggestList.append($('<option>').attr('value', word));
+        });
+      })
+      .fail(function () {
+        $suggestList.empty();
+      });
+  });
+});
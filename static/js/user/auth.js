@@ -101,6 +101,9 @@ $(function () {
           }, 1000);
         } else {
           message.showError(res.errmsg);
+          // 图片验证码校验一次后就失效，换一张新的
+          generateImageCode();
+          $imgCodeText.val('');
         }
       })
       .fail(function(){
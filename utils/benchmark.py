@@ -0,0 +1,31 @@
+# -*- coding:utf-8 -*-
+"""
+速度测试脚本共用的函数，只依赖标准库
+"""
+import os
+import subprocess
+import types
+
+
+def percentile(sorted_times, percent):
+    """:param sorted_times: 排好序的耗时列表"""
+    return sorted_times[min(len(sorted_times) - 1, int(len(sorted_times) * percent / 100))]
+
+
+def load_baseline(baseline, module_file):
+    """
+    加载模块的另一个版本，和当前版本对比测试
+    :param baseline: 文件路径或git版本
+    :param module_file: 当前版本的文件，加载的模块的__file__也设为它，相对路径的资源文件从当前目录读取
+    :return: 模块
+    """
+    if os.path.isfile(baseline):
+        with open(baseline, 'rb') as f:
+            source = f.read()
+    else:
+        source = subprocess.check_output(['git', 'show', '{}:./{}'.format(baseline, os.path.basename(module_file))],
+                                         cwd=os.path.dirname(module_file))
+    module = types.ModuleType('baseline')
+    module.__file__ = module_file
+    exec(compile(source, '{}:{}'.format(baseline, os.path.basename(module_file)), 'exec'), module.__dict__)
+    return module
@@ -0,0 +1,69 @@
+# -*- coding:utf-8 -*-
+"""
+图片验证码生成速度测试，在项目根目录下执行：
+python -m utils.captcha.benchmark              生成1000个，输出每秒个数和p99耗时
+python -m utils.captcha.benchmark -n 200 -w 50
+python -m utils.captcha.benchmark -b HEAD~1     同时测试git中某个版本的captcha.py(也可以是文件路径)，对比输出
+"""
+import argparse
+import time
+from contextlib import contextmanager
+from PIL import ImageDraw
+
+from utils.benchmark import load_baseline, percentile
+from utils.captcha import captcha as captcha_module
+
+CAPTCHA_FILE = captcha_module.__file__
+
+
+@contextmanager
+def textsize_shim():
+    """旧版本使用的ImageDraw.textsize在Pillow 10中删除了，测试旧版本时临时加上"""
+    if hasattr(ImageDraw.ImageDraw, 'textsize'):
+        yield
+        return
+    ImageDraw.ImageDraw.textsize = lambda self, text, font=None: captcha_module.text_size(self, text, font)
+    try:
+        yield
+    finally:
+        del ImageDraw.ImageDraw.textsize
+
+
+def run(captcha, number, warmup):
+    """:return: (每秒个数, 平均耗时, p50, p99)，单位毫秒"""
+    # 预热：加载字体等只在第一次执行的操作不计入
+    for _ in range(warmup):
+        captcha.generate_captcha()
+    times = []
+    start = time.perf_counter()
+    for _ in range(number):
+        begin = time.perf_counter()
+        captcha.generate_captcha()
+        times.append(time.perf_counter() - begin)
+    total = time.perf_counter() - start
+    times.sort()
+    return number / total, total / number * 1000, percentile(times, 50) * 1000, percentile(times, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片验证码生成速度测试')
+    parser.add_argument('-n', '--number', type=int, default=1000, help='生成的个数')
+    parser.add_argument('-w', '--warmup', type=int, default=20, help='预热生成的个数')
+    parser.add_argument('-b', '--baseline', help='对比的captcha.py：git版本或文件路径')
+    args = parser.parse_args()
+    results = []
+    if args.baseline:
+        # 字体等文件仍从当前目录读取
+        baseline = load_baseline(args.baseline, CAPTCHA_FILE).captcha
+        with textsize_shim():
+            results.append((args.baseline, run(baseline, args.number, args.warmup)))
+    results.append(('当前', run(captcha_module.captcha, args.number, args.warmup)))
+    for name, (per_second, mean, p50, p99) in results:
+        print('{}：生成{}个，每秒{:.0f}个，平均{:.2f}ms，p50 {:.2f}ms，p99 {:.2f}ms'.format(
+            name, args.number, per_second, mean, p50, p99))
+    if args.baseline:
+        print('每秒个数为{}的{:.2f}倍'.format(args.baseline, results[1][1][0] / results[0][1][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,60 @@
 import random
 import string
 import os.path
+import threading
+from collections import namedtuple
 from io import BytesIO
 from PIL import Image
 from PIL import ImageFilter
 from PIL.ImageDraw import Draw
 from PIL.ImageFont import truetype
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# lookup table for the character mask, same as point(lambda i: i * 1.97)
+MASK_TABLE = [min(int(round(i * 1.97)), 255) for i in range(256)]
+if numpy is not None:
+    MASK_ARRAY = numpy.array(MASK_TABLE, dtype=numpy.uint8)
+    # unlike random, numpy.random is not reseeded in forked workers
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=numpy.random.seed)
+
+
+FONTS_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
+DEFAULT_FONTS = tuple([os.path.join(FONTS_DIR, font) for font in ['Arial.ttf', 'Georgia.ttf', 'actionj.ttf']])
+
+# Everything that decides how a captcha looks. color=None picks a random color per captcha.
+CaptchaOptions = namedtuple('CaptchaOptions', ['width', 'height', 'fonts', 'font_sizes', 'color', 'fmt'])
+DEFAULT_OPTIONS = CaptchaOptions(width=200, height=75, fonts=DEFAULT_FONTS, font_sizes=(65, 70, 75),
+                                 color=None, fmt='JPEG')
+
+_local = threading.local()
+
+
+def load_fonts(fonts, font_sizes):
+    """ Loading a font file is slow, so every (font, size) is loaded once,
+        per thread because a FreeType face must not be used by two threads at the same time
+    """
+    cache = getattr(_local, 'fonts', None)
+    if cache is None:
+        cache = _local.fonts = {}
+    key = (fonts, font_sizes)
+    if key not in cache:
+        cache[key] = tuple([truetype(name, size) for name in fonts for size in font_sizes])
+    return cache[key]
+
+
+def text_size(draw, text, font):
+    """ ImageDraw.textsize was removed in Pillow 10
+    """
+    if hasattr(draw, 'textbbox'):
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        return right, bottom
+    return draw.textsize(text, font=font)
+
 
 class Bezier:
     def __init__(self):
@@ -47,15 +95,21 @@ class Bezier:
                 coefs = [c * a * b for c, a, b in zip(combinations,
                                                       tpowers, upowers)]
                 result.append(coefs)
+            if numpy is not None:
+                # (len(tsequence), n) matrix, points = coefficients @ control points
+                result = numpy.array(result)
             self.beziers[n] = result
             return result
 
 
 class Captcha(object):
+    """ Holds no per-captcha state: text, color and fonts are passed to every call,
+        so one instance can be used by many threads at the same time
+    """
     def __init__(self):
         self._bezier = Bezier()
-        self._dir = os.path.dirname(__file__)
-        # self._captcha_path = os.path.join(self._dir, '..', 'static', 'captcha')
+        # the coefficients never change, fill the cache before any thread uses it
+        self._bezier.make_bezier(5)
 
     @staticmethod
     def instance():
@@ -63,14 +117,9 @@ class Captcha(object):
             Captcha._instance = Captcha()
         return Captcha._instance
 
-    def initialize(self, width=200, height=75, color=None, text=None, fonts=None):
-        # self.image = Image.new('RGB', (width, height), (255, 255, 255))
-        self._text = text if text else random.sample(string.ascii_uppercase + string.ascii_uppercase + '3456789', 4)
-        self.fonts = fonts if fonts else \
-            [os.path.join(self._dir, 'fonts', font) for font in ['Arial.ttf', 'Georgia.ttf', 'actionj.ttf']]
-        self.width = width
-        self.height = height
-        self._color = color if color else self.random_color(0, 200, random.randint(220, 255))
+    @staticmethod
+    def random_text():
+        return ''.join(random.sample(string.ascii_uppercase + string.ascii_uppercase + '3456789', 4))
 
     @staticmethod
     def random_color(start, end, opacity=None):
@@ -91,42 +140,51 @@ class Captcha(object):
     def smooth(image):
         return image.filter(ImageFilter.SMOOTH)
 
-    def curve(self, image, width=4, number=6, color=None):
+    def curve(self, image, color, width=4, number=6):
         dx, height = image.size
         dx /= number
         path = [(dx * i, random.randint(0, height))
                 for i in range(1, number)]
         bcoefs = self._bezier.make_bezier(number - 1)
-        points = []
-        for coefs in bcoefs:
-            points.append(tuple(sum([coef * p for coef, p in zip(coefs, ps)])
-                                for ps in zip(*path)))
-        Draw(image).line(points, fill=color if color else self._color, width=width)
+        if numpy is not None:
+            points = numpy.dot(bcoefs, path).ravel().tolist()
+        else:
+            points = []
+            for coefs in bcoefs:
+                points.append(tuple(sum([coef * p for coef, p in zip(coefs, ps)])
+                                    for ps in zip(*path)))
+        Draw(image).line(points, fill=color, width=width)
         return image
 
-    def noise(self, image, number=50, level=2, color=None):
+    @staticmethod
+    def noise(image, color, number=50, level=2):
         width, height = image.size
         dx = width / 10
         width -= dx
         dy = height / 10
         height -= dy
         draw = Draw(image)
-        for i in range(number):
-            x = int(random.uniform(dx, width))
-            y = int(random.uniform(dy, height))
-            draw.line(((x, y), (x + level, y)), fill=color if color else self._color, width=level)
+        if numpy is None:
+            for i in range(number):
+                x = int(random.uniform(dx, width))
+                y = int(random.uniform(dy, height))
+                draw.line(((x, y), (x + level, y)), fill=color, width=level)
+            return image
+        # every noise line is a (level + 1) x level block, draw all pixels in one call
+        xs = numpy.random.uniform(dx, width, number).astype(int)
+        ys = numpy.random.uniform(dy, height, number).astype(int)
+        block_x, block_y = numpy.meshgrid(numpy.arange(level + 1), numpy.arange(level) - level // 2)
+        points = numpy.stack([xs[:, None] + block_x.ravel(), ys[:, None] + block_y.ravel()], axis=-1)
+        draw.point(points.ravel().tolist(), fill=color)
         return image
 
-    def text(self, image, fonts, font_sizes=None, drawings=None, squeeze_factor=0.75, color=None):
-        color = color if color else self._color
-        fonts = tuple([truetype(name, size)
-                       for name in fonts
-                       for size in font_sizes or (65, 70, 75)])
+    def text(self, image, text, color, fonts, font_sizes=None, drawings=None, squeeze_factor=0.75):
+        fonts = load_fonts(tuple(fonts), tuple(font_sizes or (65, 70, 75)))
         draw = Draw(image)
         char_images = []
-        for c in self._text:
+        for c in text:
             font = random.choice(fonts)
-            c_width, c_height = draw.textsize(c, font=font)
+            c_width, c_height = text_size(draw, c, font)
             char_image = Image.new('RGB', (c_width, c_height), (0, 0, 0))
             char_draw = Draw(char_image)
             char_draw.text((0, 0), c, font=font, fill=color)
@@ -141,7 +199,10 @@ class Captcha(object):
                       char_images[-1].size[0]) / 2)
         for char_image in char_images:
             c_width, c_height = char_image.size
-            mask = char_image.convert('L').point(lambda i: i * 1.97)
+            if numpy is not None:
+                mask = Image.fromarray(MASK_ARRAY[numpy.asarray(char_image.convert('L'))])
+            else:
+                mask = char_image.convert('L').point(MASK_TABLE)
             image.paste(char_image,
                         (offset, int((height - c_height) / 2)),
                         mask)
@@ -184,35 +245,46 @@ class Captcha(object):
         return image.rotate(
             random.uniform(-angle, angle), Image.BILINEAR, expand=1)
 
-    def captcha(self, path=None, fmt='JPEG'):
-        """Create a captcha.
+    def render(self, text, options=None):
+        """Draw a captcha image.
 
         Args:
-            path: save path, default None.
-            fmt: image format, PNG / JPEG.
+            text: the characters to draw.
+            options: CaptchaOptions, default DEFAULT_OPTIONS.
         Returns:
-            A tuple, (text, StringIO.value).
+            The encoded image (options.fmt, PNG / JPEG).
             For example:
-                ('JGW9', '\x89PNG\r\n\x1a\n\x00\x00\x00\r...')
+                '\x89PNG\r\n\x1a\n\x00\x00\x00\r...'
 
         """
-        image = Image.new('RGB', (self.width, self.height), (255, 255, 255))
+        options = options or DEFAULT_OPTIONS
+        color = options.color or self.random_color(0, 200, random.randint(220, 255))
+        image = Image.new('RGB', (options.width, options.height), (255, 255, 255))
         image = self.background(image)
-        image = self.text(image, self.fonts, drawings=['warp', 'rotate', 'offset'])
-        image = self.curve(image)
-        image = self.noise(image)
+        image = self.text(image, text, color, options.fonts, options.font_sizes,
+                          drawings=['warp', 'rotate', 'offset'])
+        image = self.curve(image, color)
+        image = self.noise(image, color)
         image = self.smooth(image)
-        text = "".join(self._text)
         out = BytesIO()
-        image.save(out, format=fmt)
-        return text, out.getvalue()
+        image.save(out, format=options.fmt)
+        return out.getvalue()
 
-    def generate_captcha(self):
-        self.initialize()
-        return self.captcha("")
+    def generate_captcha(self, options=None):
+        """ Returns a tuple, (text, image bytes)
+        """
+        text = self.random_text()
+        return text, self.render(text, options)
 
 
 captcha = Captcha.instance()
 
+
+def render(text, options=None):
+    """ Stateless, safe to call from any thread or a concurrent.futures pool
+    """
+    return captcha.render(text, options)
+
+
 if __name__ == '__main__':
     print(captcha.generate_captcha())
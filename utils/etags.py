@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+"""
+条件请求(ETag, 304)：配合django.views.decorators.http.condition使用
+ETag由页面用到的数据的update_time、数量或缓存版本号生成，内容没变时浏览器和CDN收到304
+整页缓存的页面用redis中的版本号(数据变化时由信号加1)，判断是否变化时不用查询数据库
+"""
+import hashlib
+import logging
+import time
+from django_redis import get_redis_connection
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 页面版本号
+PAGE_VERSION_KEY = 'page_version_{}'
+
+# 读取版本号，不存在时用当前时间(毫秒)初始化，redis数据丢失后不会和以前的版本号相同
+# KEYS: 版本号...  ARGV: 当前时间
+GET_VERSIONS_SCRIPT = """
+local result = {}
+for i, key in ipairs(KEYS) do
+    local version = redis.call('GET', key)
+    if not version then
+        version = ARGV[1]
+        redis.call('SET', key, version)
+    end
+    result[i] = version
+end
+return result
+"""
+
+
+def make_etag(*parts):
+    """
+    :param parts: 决定响应内容的值，任何一个变化ETag就变化
+    """
+    return hashlib.md5('|'.join(str(part) for part in parts).encode('utf8')).hexdigest()
+
+
+def make_page_etag(request, *parts):
+    """html页面头部显示登录用户，ETag中加上用户id(访问request.user后响应会带Vary: Cookie)"""
+    return make_etag(request.user.id or 0, *parts)
+
+
+def bump_page_versions(*names):
+    """
+    数据变化后页面版本号加1
+    :param names: 如 'doc_index'、'news_1'
+    """
+    if not names:
+        return
+    try:
+        con_redis = get_redis_connection(alias='default')
+        pl = con_redis.pipeline()
+        for name in set(names):
+            pl.incr(PAGE_VERSION_KEY.format(name))
+        pl.execute()
+    except Exception as e:
+        logger.error('页面版本号更新异常:\n{}'.format(e))
+
+
+def get_page_versions(*names):
+    """
+    :return: 版本号列表，redis异常时返回None(不做条件请求)
+    """
+    try:
+        con_redis = get_redis_connection(alias='default')
+        get_versions_script = con_redis.register_script(GET_VERSIONS_SCRIPT)
+        versions = get_versions_script(keys=[PAGE_VERSION_KEY.format(name) for name in names],
+                                       args=[int(time.time() * 1000)])
+    except Exception as e:
+        logger.error('读取页面版本号异常:\n{}'.format(e))
+        return None
+    return [int(version) for version in versions]
@@ -1,14 +1,42 @@
 # # -*- coding:utf-8 -*-
-from django.http import JsonResponse
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
 from utils.user_reg_code import Code
 
+try:
+    import orjson       # 比标准库json快很多，没有安装时使用标准库
+except ImportError:
+    orjson = None
+
+# 时间等类型交给DjangoJSONEncoder处理，格式和原来的JsonResponse一致
+_django_encoder = DjangoJSONEncoder()
+if orjson is not None:
+    _ORJSON_OPTION = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def json_dumps(obj):
+    """序列化为json(bytes)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_django_encoder.default, option=_ORJSON_OPTION)
+    return json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf8')
+
 
 def to_json_data(errno=Code.OK, errmsg='', data=None, **kwargs):
-    json_dict = {'errno': errno, 'errmsg': errmsg, 'data': data}
+    """
+    :param data: 可以是已经序列化好的json(bytes，比如从缓存中取出的)，直接拼接到返回结果中，不再解析
+    """
+    json_dict = {'errno': errno, 'errmsg': errmsg}
     # kwargs是字典类型
     # 判断kwargs是否存在，是不是字典，是不是空字典
     if kwargs and isinstance(kwargs, dict) and kwargs.keys():
         # 更合并成一个新字典）
         json_dict.update(kwargs)
 
-    return JsonResponse(json_dict)
\ No newline at end of file
+    if isinstance(data, bytes):
+        # 去掉结尾的}，拼接上data
+        content = json_dumps(json_dict)[:-1] + b',"data":' + data + b'}'
+    else:
+        json_dict['data'] = data
+        content = json_dumps(json_dict)
+    return HttpResponse(content, content_type='application/json')
@@ -0,0 +1,11 @@
+# -*- coding:utf-8 -*-
+"""
+本地全文搜索：haystack搜索后端，不需要elasticsearch
+settings中配置：
+HAYSTACK_CONNECTIONS = {
+    'default': {
+        'ENGINE': 'utils.local_search.backend.LocalSearchEngine',
+        'PATH': os.path.join(BASE_DIR, 'search_index'),     # 索引文件目录
+    },
+}
+"""
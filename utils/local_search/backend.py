@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+"""
+haystack搜索后端：索引保存在本地磁盘(见index.py)，查询在进程内完成
+支持的查询：正文的词(AND)、排除(exclude()、auto_query中的-词)、models()；
+OR、按字段过滤、排序、narrow()、facet等查询会抛出SearchBackendError，不会被忽略
+"""
+import re
+
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery, log_query, SearchNode
+from haystack.constants import DJANGO_CT, DJANGO_ID, DOCUMENT_FIELD, ID
+from haystack.exceptions import MissingDependency, SearchBackendError, SkipDocument
+from haystack.inputs import PythonData
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+
+from utils.local_search.index import IndexWriter, get_reader
+
+# 不支持的查询参数
+UNSUPPORTED_SEARCH_KWARGS = ('sort_by', 'narrow_queries', 'facets', 'date_facets', 'query_facets',
+                             'within', 'dwithin', 'distance_point')
+# 排除的部分：NOT 词 或 NOT (多个词)，用户输入中的括号已转义
+_NOT_RE = re.compile(r'NOT (?:\(((?:\\.|[^()\\])*)\)|(\S+))')
+
+
+def split_not(query_string):
+    """
+    :return: (要匹配的部分, [要排除的部分])
+    'python NOT (机器 学习) NOT java' -> ('python', ['机器 学习', 'java'])
+    """
+    excluded = []
+
+    def collect(match):
+        excluded.append(match.group(1) if match.group(1) is not None else match.group(2))
+        return ' '
+    included = _NOT_RE.sub(collect, query_string)
+    if 'NOT ' in included or any('NOT ' in text for text in excluded):
+        raise SearchBackendError('本地搜索不支持的查询：{}'.format(query_string))
+    return included, excluded
+
+
+class LocalSearchBackend(BaseSearchBackend):
+    # 和elasticsearch一样，用户输入的这些词转成小写、括号转义，不会被当成查询语法
+    RESERVED_WORDS = ('AND', 'NOT', 'OR', 'TO')
+    RESERVED_CHARACTERS = ('\\', '(', ')')
+
+    def __init__(self, connection_alias, **connection_options):
+        super(LocalSearchBackend, self).__init__(connection_alias, **connection_options)
+        if not connection_options.get('PATH'):
+            raise MissingDependency("本地搜索后端需要在HAYSTACK_CONNECTIONS中配置'PATH'(索引文件目录)")
+        self.path = connection_options['PATH']
+
+    def update(self, index, iterable, commit=True):
+        with IndexWriter(self.path) as writer:
+            for obj in iterable:
+                try:
+                    prepared = index.full_prepare(obj)
+                except SkipDocument:
+                    continue
+                text = prepared.pop(index.get_content_field(), '')
+                # 和elasticsearch后端一样，搜索结果中带上索引中定义的字段
+                writer.update(get_identifier(obj), prepared, text)
+
+    def remove(self, obj_or_string, commit=True):
+        with IndexWriter(self.path) as writer:
+            writer.remove(get_identifier(obj_or_string))
+
+    def clear(self, models=None, commit=True):
+        with IndexWriter(self.path) as writer:
+            if not models:
+                writer.clear()
+                return
+            cts = set(get_model_ct(model) for model in models)
+            # 文档标识是 app_label.model_name.pk
+            for doc_id in writer.doc_ids():
+                if doc_id.rsplit('.', 1)[0] in cts:
+                    writer.remove(doc_id)
+
+    @log_query
+    def search(self, query_string, start_offset=0, end_offset=None, models=None, result_class=None, **kwargs):
+        unsupported = [name for name in UNSUPPORTED_SEARCH_KWARGS if kwargs.get(name)]
+        if unsupported:
+            raise SearchBackendError('本地搜索不支持{}'.format(', '.join(unsupported)))
+        included, excluded = split_not(query_string)
+        reader = get_reader(self.path)
+        if reader is None or not query_string:
+            return {'results': [], 'hits': 0}
+        matches = reader.search(included, excluded)
+        if models:
+            cts = set(get_model_ct(model) for model in models)
+            matches = [match for match in matches if match[2].get(DJANGO_CT) in cts]
+
+        results = []
+        for doc_id, score, stored in matches[start_offset:end_offset]:
+            fields = dict(stored)
+            app_label, model_name = fields.pop(DJANGO_CT).split('.')
+            pk = fields.pop(DJANGO_ID)
+            if fields.get(ID) == doc_id:
+                fields.pop(ID)
+            results.append((result_class or SearchResult)(app_label, model_name, pk, score, **fields))
+        return {
+            'results': results,
+            'hits': len(matches),
+            'facets': {},
+            'spelling_suggestion': None,
+        }
+
+    def more_like_this(self, model_instance, additional_query_string=None, start_offset=0, end_offset=None,
+                       models=None, limit_to_registered_models=None, result_class=None, **kwargs):
+        return {'results': [], 'hits': 0}
+
+
+class LocalSearchQuery(BaseSearchQuery):
+    """查询条件拼成一个字符串，由索引分词后按AND查询，排除的条件写成 NOT (...)"""
+    def build_query(self):
+        if not self.query_filter:
+            return ''
+        return self._build_sub_query(self.query_filter)
+
+    def _build_sub_query(self, search_node):
+        if search_node.connector == SearchNode.OR and len(search_node.children) > 1:
+            raise SearchBackendError('本地搜索不支持OR查询')
+        term_list = []
+        for child in search_node.children:
+            if isinstance(child, SearchNode):
+                term_list.append(self._build_sub_query(child))
+                continue
+            field, filter_type = search_node.split_expression(child[0])
+            if field not in ('content', DOCUMENT_FIELD) or filter_type not in ('content', 'contains'):
+                raise SearchBackendError('本地搜索只支持查询正文，不支持{}'.format(child[0]))
+            value = child[1]
+            if not hasattr(value, 'input_type_name'):
+                value = PythonData(value)
+            term_list.append(value.prepare(self))
+        query = ' '.join(str(term) for term in term_list)
+        if search_node.negated:
+            if 'NOT ' in query:
+                raise SearchBackendError('本地搜索不支持排除条件中再排除')
+            query = self.build_not_query(query)
+        return query
+
+
+class LocalSearchEngine(BaseEngine):
+    backend = LocalSearchBackend
+    query = LocalSearchQuery
@@ -0,0 +1,389 @@
+# -*- coding:utf-8 -*-
+"""
+磁盘上的倒排索引
+
+索引由多个分段组成，分段写好后不再修改。每次修改索引只把新增、修改的文档写成一个新分段，
+删除、修改的文档在旧分段中标记为已删除，不用重写未修改文档的倒排列表
+索引目录中的文件：
+    seg_<n>/            一个分段
+        postings.bin    分段中所有词的倒排列表，每条是(文档序号, 词频)两个uint32(本机字节序)，查询时mmap读取
+        lexicon.json    {词: [在postings.bin中的起始条数, 文档数]}
+        meta.json       文档标识列表(下标就是文档序号)、文档长度
+        store.json      {文档标识: 保存的字段}，返回搜索结果用
+    gen_<n>.json        一个版本：使用的分段和每个分段中已删除的文档序号
+    CURRENT             当前版本的文件名
+每次修改生成一个新版本，写完后替换CURRENT指向它，读取的进程发现CURRENT变化后重新加载，
+分段在进程中加载一次后各版本共用，正在使用旧版本的查询不受影响
+分段合并：
+    文档数在同一数量级(按MERGE_FACTOR的幂划分)的分段达到MERGE_FACTOR个时合并成一个，
+    每个文档被重写的次数是log(文档总数)级别；一半以上文档已删除的分段单独重写
+"""
+import array
+import fcntl
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+from collections import Counter
+
+from django.utils.functional import cached_property
+
+from utils.json_fun import json_dumps
+from utils.local_search.tokenizer import tokenize, tokenize_query
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 同一数量级的分段达到这个数量时合并
+MERGE_FACTOR = 10
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'lock'
+GEN_FILE = 'gen_{}.json'
+SEGMENT_DIR = 'seg_{}'
+# 版本、分段文件(包括旧格式的gen_<n>目录和seg_<n>.json文件)
+INDEX_FILE_RE = re.compile(r'^(gen|seg)_\d+(\.json)?$')
+
+
+def _read_json(filename):
+    with open(filename, 'rb') as f:
+        return json.loads(f.read().decode('utf8'))
+
+
+def _write_file(filename, content):
+    with open(filename, 'wb') as f:
+        f.write(content)
+
+
+def _file_identity(filename):
+    """目录被删除后用同样的文件名重建时，inode或修改时间会变化"""
+    stat = os.stat(filename)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class Segment(object):
+    """一个分段，只读"""
+    def __init__(self, seg_path):
+        self.seg_path = seg_path
+        self.identity = _file_identity(os.path.join(seg_path, 'meta.json'))
+        meta = _read_json(os.path.join(seg_path, 'meta.json'))
+        self.doc_ids = meta['doc_ids']
+        self.doc_lens = meta['doc_lens']
+        self.lexicon = _read_json(os.path.join(seg_path, 'lexicon.json'))
+        self.postings = None
+        with open(os.path.join(seg_path, 'postings.bin'), 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.postings = memoryview(self._mmap).cast('I')
+
+    @cached_property
+    def store(self):
+        """{文档标识: 保存的字段}，修改索引时只需要文档标识，用到时再读取"""
+        return _read_json(os.path.join(self.seg_path, 'store.json'))
+
+    def term_postings(self, term):
+        """:return: (文档序号列表, 词频列表)，mmap切片，不复制数据"""
+        offset, df = self.lexicon[term]
+        entries = self.postings[offset * 2:(offset + df) * 2]
+        return entries[0::2], entries[1::2]
+
+
+# 每个进程缓存已加载的分段 {分段目录: Segment}
+_segments = {}
+
+
+def _load_segment(path, name):
+    seg_path = os.path.join(path, name)
+    segment = _segments.get(seg_path)
+    if segment is None or segment.identity != _file_identity(os.path.join(seg_path, 'meta.json')):
+        segment = _segments[seg_path] = Segment(seg_path)
+    return segment
+
+
+def _current_gen(path):
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def _gen_number(gen):
+    """旧格式的版本目录gen_<n>也返回n"""
+    return int(gen.split('.')[0].split('_')[1])
+
+
+class IndexReader(object):
+    """一个版本的索引，只读"""
+    def __init__(self, path, gen):
+        gen_file = os.path.join(path, gen)
+        self.gen = gen
+        self.identity = _file_identity(gen_file)
+        manifest = _read_json(gen_file)
+        # [(分段, 已删除的文档序号)]
+        self.segments = [(_load_segment(path, name), set(deleted)) for name, deleted in manifest['segments']]
+        self.segment_names = [name for name, _ in manifest['segments']]
+        # 和lucene一样，文档数、词的文档数、平均长度包括已删除但还没有合并掉的文档
+        self.doc_count = sum(len(segment.doc_ids) for segment, _ in self.segments)
+        total_len = sum(sum(segment.doc_lens) for segment, _ in self.segments)
+        self.avg_len = total_len / self.doc_count if self.doc_count else 1
+
+    def _match(self, terms, score=True):
+        """
+        所有词都要出现(AND)
+        :return: {(分段下标, 文档序号): BM25得分}
+        """
+        dfs = {term: sum(segment.lexicon[term][1] for segment, _ in self.segments if term in segment.lexicon)
+               for term in terms}
+        matched = {}
+        for seg_index, (segment, deleted) in enumerate(self.segments):
+            if segment.postings is None or any(term not in segment.lexicon for term in terms):
+                continue
+            scores = None
+            # 从文档数最少的词开始，后面的词只需要检查已经匹配的文档
+            for term in sorted(terms, key=lambda t: segment.lexicon[t][1]):
+                df = dfs[term]
+                idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+                new_scores = {}
+                for docno, tf in zip(*segment.term_postings(term)):
+                    if (scores is not None and docno not in scores) or docno in deleted:
+                        continue
+                    value = 0
+                    if score:
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_lens[docno] / self.avg_len)
+                        value = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    new_scores[docno] = (scores or {}).get(docno, 0) + value
+                scores = new_scores
+                if not scores:
+                    break
+            for docno, value in scores.items():
+                matched[seg_index, docno] = value
+        return matched
+
+    def search(self, query, exclude=()):
+        """
+        query中所有查询词都要出现(AND)，去掉匹配exclude中任意一个查询的文档，按BM25得分从高到低排序
+        :return: [(文档标识, 得分, 保存的字段)]
+        """
+        terms = set(tokenize_query(query))
+        if not terms:
+            return []
+        matched = self._match(terms)
+        for text in exclude:
+            exclude_terms = set(tokenize_query(text))
+            if exclude_terms and matched:
+                for key in self._match(exclude_terms, score=False):
+                    matched.pop(key, None)
+        ranked = sorted(matched.items(), key=lambda item: (-item[1], item[0]))
+        results = []
+        for (seg_index, docno), score in ranked:
+            segment = self.segments[seg_index][0]
+            doc_id = segment.doc_ids[docno]
+            results.append((doc_id, score, segment.store[doc_id]))
+        return results
+
+
+# 每个进程缓存已加载的索引 {path: IndexReader}
+_readers = {}
+
+
+def get_reader(path):
+    """返回最新版本的索引，没有索引时返回None"""
+    for _ in range(3):
+        gen = _current_gen(path)
+        if gen is None:
+            return None
+        if not gen.endswith('.json'):
+            raise IOError('搜索索引{}是旧格式，需要执行 python manage.py reindex_news --full --clear'.format(path))
+        reader = _readers.get(path)
+        try:
+            # 索引目录删除后重建时版本号可能相同，还要比较文件是不是同一个
+            if reader is not None and reader.gen == gen and reader.identity == _file_identity(os.path.join(path, gen)):
+                return reader
+            reader = _readers[path] = IndexReader(path, gen)
+        except IOError:
+            continue        # 读取时正好生成了新版本，旧版本文件被删除，重新读取CURRENT
+        # 不再使用的分段从缓存中去掉
+        used = set(os.path.join(path, name) for name in reader.segment_names)
+        for seg_path in list(_segments):
+            if os.path.dirname(seg_path) == path and seg_path not in used:
+                del _segments[seg_path]
+        return reader
+    raise IOError('搜索索引{}读取失败'.format(path))
+
+
+class IndexWriter(object):
+    """
+    修改索引，多个进程同时修改时用文件锁排队
+    with IndexWriter(path) as writer:
+        writer.update(doc_id, fields, text)
+        writer.remove(doc_id)
+    """
+    def __init__(self, path):
+        self.path = path
+        # 上一版本中保留的文档 {文档标识: (分段, 文档序号)}
+        self.locations = {}
+        # 新增、修改的文档 {文档标识: (保存的字段, {词: 词频})}
+        self.added = {}
+        # [[分段, 已删除的文档序号]]
+        self._segments = []
+        self._changed = False
+        self._gen = None
+        self._next_segment = 1
+        self._lock_file = None
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_file = open(os.path.join(self.path, LOCK_FILE), 'w')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._gen = _current_gen(self.path)
+        # 旧格式的索引当作空索引，提交后删除旧文件
+        if self._gen is not None and self._gen.endswith('.json'):
+            manifest = _read_json(os.path.join(self.path, self._gen))
+            self._next_segment = manifest['next_segment']
+            for name, deleted in manifest['segments']:
+                deleted = set(deleted)
+                self._segments.append([name, deleted])
+                for docno, doc_id in enumerate(_load_segment(self.path, name).doc_ids):
+                    if docno not in deleted:
+                        self.locations[doc_id] = (name, docno)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None and self._changed:
+                self._commit()
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+
+    def doc_ids(self):
+        return list(self.locations) + list(self.added)
+
+    def _delete(self, doc_id):
+        location = self.locations.pop(doc_id, None)
+        if location is None:
+            return False
+        name, docno = location
+        for segment in self._segments:
+            if segment[0] == name:
+                segment[1].add(docno)
+        return True
+
+    def update(self, doc_id, fields, text):
+        self._delete(doc_id)
+        self.added[doc_id] = (fields, Counter(tokenize(text)))
+        self._changed = True
+
+    def remove(self, doc_id):
+        if self._delete(doc_id) or self.added.pop(doc_id, None) is not None:
+            self._changed = True
+
+    def clear(self):
+        self.locations = {}
+        self.added = {}
+        self._segments = []
+        self._changed = True
+
+    def _write_segment(self, doc_ids, doc_lens, store, inverted):
+        """inverted: {词: [(文档序号, 词频)]}，文档序号从小到大"""
+        name = SEGMENT_DIR.format(self._next_segment)
+        self._next_segment += 1
+        postings = array.array('I')
+        lexicon = {}
+        for term, entries in inverted.items():
+            lexicon[term] = [len(postings) // 2, len(entries)]
+            for docno, tf in entries:
+                postings.append(docno)
+                postings.append(tf)
+        seg_path = os.path.join(self.path, name)
+        shutil.rmtree(seg_path, ignore_errors=True)
+        os.makedirs(seg_path)
+        _write_file(os.path.join(seg_path, 'postings.bin'), postings.tobytes())
+        _write_file(os.path.join(seg_path, 'lexicon.json'), json_dumps(lexicon))
+        _write_file(os.path.join(seg_path, 'store.json'), json_dumps(store))
+        _write_file(os.path.join(seg_path, 'meta.json'), json_dumps({'doc_ids': doc_ids, 'doc_lens': doc_lens}))
+        return [name, set()]
+
+    def _write_added(self):
+        doc_ids, doc_lens, store, inverted = [], [], {}, {}
+        for doc_id in sorted(self.added):
+            fields, doc_terms = self.added[doc_id]
+            for term, tf in doc_terms.items():
+                inverted.setdefault(term, []).append((len(doc_ids), tf))
+            doc_ids.append(doc_id)
+            doc_lens.append(sum(doc_terms.values()))
+            store[doc_id] = fields
+        return self._write_segment(doc_ids, doc_lens, store, inverted)
+
+    def _merge(self, sources):
+        """把sources中未删除的文档合并成一个新分段，只读取这些分段"""
+        doc_ids, doc_lens, store, inverted = [], [], {}, {}
+        for name, deleted in sources:
+            segment = _load_segment(self.path, name)
+            docnos = []
+            for docno, doc_id in enumerate(segment.doc_ids):
+                if docno in deleted:
+                    docnos.append(-1)
+                    continue
+                docnos.append(len(doc_ids))
+                doc_ids.append(doc_id)
+                doc_lens.append(segment.doc_lens[docno])
+                store[doc_id] = segment.store[doc_id]
+            for term in segment.lexicon:
+                entries = [(docnos[docno], tf) for docno, tf in zip(*segment.term_postings(term)) if docnos[docno] >= 0]
+                if entries:
+                    inverted.setdefault(term, []).extend(entries)
+        return self._write_segment(doc_ids, doc_lens, store, inverted)
+
+    def _live_count(self, segment):
+        return len(_load_segment(self.path, segment[0]).doc_ids) - len(segment[1])
+
+    def _merge_segments(self):
+        segments = [segment for segment in self._segments if self._live_count(segment) > 0]
+        # 一半以上文档已删除的分段单独重写
+        for i, segment in enumerate(segments):
+            if len(segment[1]) > self._live_count(segment):
+                segments[i] = self._merge([segment])
+        # 同一数量级的分段达到MERGE_FACTOR个时合并，合并后可能又凑满上一级
+        while True:
+            levels = {}
+            for segment in segments:
+                level = int(math.log(self._live_count(segment), MERGE_FACTOR))
+                levels.setdefault(level, []).append(segment)
+            full = [level_segments for level_segments in levels.values() if len(level_segments) >= MERGE_FACTOR]
+            if not full:
+                return segments
+            sources = full[0]
+            merged = self._merge(sources)
+            segments = [segment for segment in segments if segment not in sources] + [merged]
+
+    def _commit(self):
+        """新增、修改的文档写成新分段，必要时合并分段，再生成新版本文件并替换CURRENT"""
+        if self.added:
+            self._segments.append(self._write_added())
+        segments = self._merge_segments()
+
+        gen = GEN_FILE.format(_gen_number(self._gen) + 1 if self._gen else 1)
+        _write_file(os.path.join(self.path, gen), json_dumps({
+            'segments': [[name, sorted(deleted)] for name, deleted in segments],
+            'next_segment': self._next_segment,
+        }))
+        tmp_current = os.path.join(self.path, CURRENT_FILE + '.tmp')
+        _write_file(tmp_current, gen.encode('utf8'))
+        os.replace(tmp_current, os.path.join(self.path, CURRENT_FILE))
+
+        # 删除旧版本和不再使用的分段，已经mmap、加载的进程仍然可以读取
+        used = set(name for name, _ in segments)
+        used.add(gen)
+        for name in os.listdir(self.path):
+            if INDEX_FILE_RE.match(name) and name not in used:
+                filename = os.path.join(self.path, name)
+                if os.path.isdir(filename):
+                    shutil.rmtree(filename, ignore_errors=True)
+                else:
+                    os.remove(filename)
+                _segments.pop(filename, None)
@@ -0,0 +1,42 @@
+# -*- coding:utf-8 -*-
+"""
+分词：中日韩文字按单字+相邻两字(bigram)切分，其他文字按单词切分并转小写
+"""
+import re
+
+# 中日韩文字
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN_RE = re.compile('([{0}]+)|([^\\W_{0}]+)'.format(_CJK))
+
+
+def tokenize(text):
+    """
+    建立索引用：中日韩文字同时输出单字和bigram，单字查询也能搜到
+    '学习Python' -> ['学', '学习', '习', 'python']
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text):
+        if word:
+            tokens.append(word.lower())
+            continue
+        for i, char in enumerate(cjk):
+            tokens.append(char)
+            if i + 1 < len(cjk):
+                tokens.append(cjk[i:i + 2])
+    return tokens
+
+
+def tokenize_query(text):
+    """
+    查询用：连续的中日韩文字只用bigram(相当于短语匹配)，只有一个字时用单字
+    '机器学习' -> ['机器', '器学', '学习']
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text):
+        if word:
+            tokens.append(word.lower())
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
@@ -0,0 +1,93 @@
+# -*- coding:utf-8 -*-
+"""
+未登录用户的整页缓存：按路径+查询字符串缓存渲染好的html
+带session cookie的请求(已登录或登录过)不走缓存，后台修改数据后按路径清除
+"""
+import hashlib
+import logging
+from functools import wraps
+from django.conf import settings
+from django.http import HttpResponse
+from django_redis import get_redis_connection
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 页面缓存键：完整路径的md5
+PAGE_CACHE_KEY = 'page_cache_{}'
+# 每个路径一个集合，保存这个路径下(不同查询字符串)的所有缓存键，清除时用
+PAGE_CACHE_PATH_KEY = 'page_cache_path_{}'
+# 默认缓存有效期，单位秒
+PAGE_CACHE_EXPIRES = 10 * 60
+
+
+def _can_use_cache(request):
+    # 预渲染的页面和普通页面不同(点击量由js记录)，不走缓存
+    if getattr(request, 'is_prerender', False):
+        return False
+    return request.method == 'GET' and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _can_store(request, response):
+    """页面和用户相关(设置了cookie、用了csrf token、写了session)时不缓存"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if request.META.get('CSRF_COOKIE_USED'):
+        return False
+    session = getattr(request, 'session', None)
+    return not (session is not None and session.modified)
+
+
+def cache_anonymous_page(timeout=PAGE_CACHE_EXPIRES):
+    """
+    视图函数装饰器，类视图用method_decorator
+    :param timeout: 缓存有效期，单位秒
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _can_use_cache(request):
+                return view_func(request, *args, **kwargs)
+            key = PAGE_CACHE_KEY.format(hashlib.md5(request.get_full_path().encode('utf8')).hexdigest())
+            try:
+                con_redis = get_redis_connection(alias='default')
+                content = con_redis.get(key)
+            except Exception as e:
+                logger.error('读取页面缓存异常:\n{}'.format(e))
+                return view_func(request, *args, **kwargs)
+            if content is not None:
+                return HttpResponse(content)
+
+            response = view_func(request, *args, **kwargs)
+            if _can_store(request, response):
+                try:
+                    path_key = PAGE_CACHE_PATH_KEY.format(request.path)
+                    pl = con_redis.pipeline()
+                    pl.setex(key, timeout, response.content)
+                    pl.sadd(path_key, key)
+                    pl.expire(path_key, timeout)
+                    pl.execute()
+                except Exception as e:
+                    logger.error('写入页面缓存异常:\n{}'.format(e))
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_pages(*paths):
+    """
+    清除路径下的页面缓存(包括带查询字符串的)
+    :param paths: 请求路径，如reverse('news:news_detail', args=[1])
+    """
+    path_keys = [PAGE_CACHE_PATH_KEY.format(path) for path in set(paths)]
+    if not path_keys:
+        return
+    try:
+        con_redis = get_redis_connection(alias='default')
+        pl = con_redis.pipeline()
+        for path_key in path_keys:
+            pl.smembers(path_key)
+        keys = set().union(*pl.execute())
+        con_redis.delete(*keys, *path_keys)
+    except Exception as e:
+        logger.error('清除页面缓存异常:\n{}'.format(e))
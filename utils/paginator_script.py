@@ -1,4 +1,14 @@
 # -*- coding:utf-8 -*-
+import base64
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+# 游标中时间戳的起点
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 def get_paginator_data(paginator, current_page, around_count=3):
     """
     :param paginator: 分页对象
@@ -39,3 +49,46 @@ def get_paginator_data(paginator, current_page, around_count=3):
         "right_pages": right_page_range,
     }
 
+
+def encode_cursor(update_time, pk):
+    """
+    把一页最后一条数据的(update_time, id)编码成游标，前端原样传回即可
+    """
+    delta = update_time - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    raw = '{}.{}'.format(micros, pk).encode('utf8')
+    return base64.urlsafe_b64encode(raw).decode('utf8').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: encode_cursor生成的游标
+    :return: (update_time, id)，游标格式不对时抛出ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf8')
+        micros, pk = raw.split('.')
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except Exception as e:
+        raise ValueError('游标格式错误:{}'.format(e))
+
+
+def get_keyset_page(queryset, cursor, per_page):
+    """
+    游标分页：按(-update_time, -id)排序，取游标之后的per_page条数据
+    不需要COUNT，也没有OFFSET，翻到多深的页耗时都一样
+    :param queryset: 需要分页的查询集
+    :param cursor: 上一页返回的游标，为空时取第一页
+    :param per_page: 每页条数
+    :return: 当前页数据列表、下一页游标(没有下一页时为None)
+    """
+    if cursor:
+        update_time, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(update_time__lt=update_time) | Q(update_time=update_time, id__lt=pk))
+    # 多取一条，用来判断是否还有下一页
+    items = list(queryset.order_by('-update_time', '-id')[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1].update_time, items[-1].id)
+    return items, next_cursor
@@ -0,0 +1,145 @@
+# -*- coding:utf-8 -*-
+"""
+静态页面预渲染：把首页、文章详情页、课程详情页、文档页渲染成html文件，由nginx直接返回
+未登录用户访问时不经过uwsgi，静态文件不存在或有session cookie时nginx转给uwsgi
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, Max
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from news.models import News
+from news.bootstrap import get_bootstrap_data
+from course.models import Course
+from doc.models import Doc
+from utils.page_cache import purge_pages
+
+# 日志器
+logger = logging.getLogger('django')
+
+# 记录每个页面生成时的版本 {path: 版本}
+PRERENDER_MANIFEST = 'manifest.json'
+
+
+def page_file(path):
+    """路径对应的静态文件，和nginx中的 $uri/index.html 对应"""
+    return os.path.join(settings.PRERENDER_ROOT, path.strip('/'), 'index.html')
+
+
+def _write_file(filename, content):
+    """先写临时文件再改名，nginx不会读到写了一半的文件；临时文件名唯一，同时生成同一个页面时不会互相覆盖"""
+    dirname = os.path.dirname(filename)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp创建的文件只有当前用户可读，nginx需要能读
+        os.chmod(tmp_filename, 0o644)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+
+def remove_page(path):
+    filename = page_file(path)
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def render_page(path):
+    """
+    以未登录用户身份渲染页面并写入静态文件，页面不存在时删除静态文件
+    :return: 是否生成了静态文件
+    """
+    # 清掉页面缓存，保证渲染的是最新数据
+    purge_pages(path)
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    # 模板和视图据此区分：点击量由页面中的js记录
+    request.is_prerender = True
+    match = resolve(path)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        response = None
+    if response is None or response.status_code != 200:
+        remove_page(path)
+        return False
+    _write_file(page_file(path), response.content)
+    return True
+
+
+def publish_pages(*paths):
+    """
+    后台发布、修改后调用：清掉页面缓存，重新生成静态文件
+    静态文件和manifest不一致时，下次prerender_pages命令会再生成一次
+    """
+    for path in set(paths):
+        try:
+            render_page(path)
+        except Exception as e:
+            logger.error('静态页面{}生成异常:\n{}'.format(path, e))
+            # 删掉旧的静态文件，让nginx转给uwsgi
+            remove_page(path)
+
+
+def expire_pages(*paths):
+    """
+    前台请求中调用(如发表评论)：只清掉页面缓存、删除静态文件，不在请求中渲染
+    nginx转给uwsgi返回最新页面，下次prerender_pages命令再生成静态文件
+    """
+    purge_pages(*paths)
+    for path in set(paths):
+        try:
+            remove_page(path)
+        except OSError as e:
+            logger.error('静态页面{}删除异常:\n{}'.format(path, e))
+
+
+def collect_pages():
+    """
+    :return: {path: 版本}，版本是页面用到的数据的update_time，版本变化的页面需要重新生成
+    """
+    pages = {}
+    # 首页：标签导航和热门新闻来自首页初始数据
+    bootstrap = get_bootstrap_data()
+    home_data = json.dumps([bootstrap['tags'], bootstrap['hot_news']], sort_keys=True)
+    pages[reverse('news:index')] = hashlib.md5(home_data.encode('utf8')).hexdigest()
+
+    # 文章详情页：文章、标签名、第一页评论
+    news = News.objects.filter(is_delete=False).annotate(last_comment=Max('comments__update_time')).\
+        values_list('id', 'update_time', 'tag__update_time', 'last_comment')
+    for news_id, *times in news:
+        pages[reverse('news:news_detail', args=[news_id])] = '|'.join(str(t) for t in times)
+
+    # 课程详情页：课程、讲师
+    courses = Course.objects.filter(is_delete=False).values_list('id', 'update_time', 'teacher__update_time')
+    for course_id, *times in courses:
+        pages[reverse('course:course_detail', args=[course_id])] = '|'.join(str(t) for t in times)
+
+    # 文档页：所有文档
+    docs = Doc.objects.filter(is_delete=False).aggregate(last_update=Max('update_time'), count=Count('id'))
+    pages[reverse('doc:index')] = '{last_update}|{count}'.format(**docs)
+    return pages
+
+
+def load_manifest():
+    try:
+        with open(os.path.join(settings.PRERENDER_ROOT, PRERENDER_MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    _write_file(os.path.join(settings.PRERENDER_ROOT, PRERENDER_MANIFEST),
+                json.dumps(manifest, indent=1, sort_keys=True).encode('utf8'))
@@ -0,0 +1,90 @@
+# -*- coding:utf-8 -*-
+"""
+测试用的工具：redis换成进程内的fakeredis(pip install fakeredis)，不需要启动redis服务器
+class XxxTest(FakeRedisMixin, TestCase):
+    ...
+每个测试开始前清空所有redis库；没有安装fakeredis时跳过这些测试
+"""
+import shutil
+import tempfile
+import unittest
+from django.conf import settings
+from django.test.utils import override_settings
+from django_redis import get_redis_connection
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+if fakeredis is not None:
+    # 所有redis别名共用一个fakeredis服务器，和真实环境一样按库号区分
+    _server = fakeredis.FakeServer()
+
+    class FakeRedisConnection(fakeredis.FakeConnection):
+        def __init__(self, *args, **kwargs):
+            kwargs['server'] = _server
+            super(FakeRedisConnection, self).__init__(*args, **kwargs)
+
+
+def fake_redis_caches():
+    """
+    settings.CACHES中的redis换成fakeredis
+    地址换成fakeredis，django_redis按地址缓存连接池，不会用到连接真实redis的连接池
+    """
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        options = dict(config.get('OPTIONS', {}), CONNECTION_POOL_KWARGS={'connection_class': FakeRedisConnection})
+        db = config['LOCATION'].rsplit('/', 1)[-1]
+        caches[alias] = dict(config, LOCATION='redis://fakeredis:6379/{}'.format(db), OPTIONS=options)
+    return caches
+
+
+class FakeRedisMixin(object):
+    """和TestCase、TransactionTestCase一起使用"""
+
+    @classmethod
+    def setUpClass(cls):
+        if fakeredis is None:
+            raise unittest.SkipTest('需要安装fakeredis')
+        cls._redis_override = override_settings(CACHES=fake_redis_caches())
+        cls._redis_override.enable()
+        super(FakeRedisMixin, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super(FakeRedisMixin, cls).tearDownClass()
+        finally:
+            cls._redis_override.disable()
+
+    def setUp(self):
+        super(FakeRedisMixin, self).setUp()
+        get_redis_connection(alias='default').flushall()
+
+
+class LocalSearchMixin(object):
+    """搜索后端换成临时目录中的本地索引(utils.local_search)，不需要elasticsearch"""
+
+    def setUp(self):
+        super(LocalSearchMixin, self).setUp()
+        from haystack import connections
+        self.search_path = tempfile.mkdtemp()
+        connections_info = {'default': {
+            'ENGINE': 'utils.local_search.backend.LocalSearchEngine',
+            'PATH': self.search_path,
+        }}
+        # 搜索后端从settings读取配置，haystack的连接从connections_info创建
+        self._search_override = override_settings(HAYSTACK_CONNECTIONS=connections_info)
+        self._search_override.enable()
+        self._connections_info = connections.connections_info
+        connections.connections_info = connections_info
+        connections.reload('default')
+
+    def tearDown(self):
+        from haystack import connections
+        self._search_override.disable()
+        connections.connections_info = self._connections_info
+        connections.reload('default')
+        shutil.rmtree(self.search_path, ignore_errors=True)
+        super(LocalSearchMixin, self).tearDown()
@@ -5,6 +5,7 @@ import datetime
 from urllib import request as urllib2
 import json
 from .xml_to_json import xmltojson
+from .http_pool import HTTPConnectionPool
 
 
 class REST:
@@ -17,8 +18,10 @@ class REST:
     ServerPort = ''
     SoftVersion = ''
     Iflog = False  # 是否打印日志
-    Batch = ''  # 时间戳
+    Batch = ''  # 时间戳(已不使用，各方法中用局部变量batch，多个线程同时调用时互不影响)
     BodyType = 'xml'  # 包体格式，可填值：json 、xml
+    Protocol = 'https'  # 本地压测时可以改为http，请求utils/yuntongxun/stub_server.py
+    Pool = None  # 连接池，不设置时每个请求新建连接(urlopen)
 
     # 初始化
     # @param serverIP       必选参数    服务器地址
@@ -54,6 +57,26 @@ class REST:
     def setAppId(self, AppId):
         self.AppId = AppId
 
+    # 设置连接池，之后的请求复用连接(在设置服务器地址和Protocol之后调用)
+    # @param maxsize  可选参数    最多保留的空闲连接数
+    # @param connectTimeout  可选参数    建立连接的超时时间，单位秒
+    # @param readTimeout  可选参数    等待响应的超时时间，单位秒
+
+    def setConnectionPool(self, maxsize=10, connectTimeout=3, readTimeout=10):
+        if self.Pool is not None:
+            self.Pool.close()
+        self.Pool = HTTPConnectionPool(self.Protocol, self.ServerIP, self.ServerPort, maxsize,
+                                       connectTimeout, readTimeout)
+
+    # 发送请求，返回响应包体
+    def urlopen(self, req):
+        if self.Pool is None:
+            res = urllib2.urlopen(req)
+            data = res.read()
+            res.close()
+            return data
+        return self.Pool.request(req.get_method(), req.full_url, req.data, dict(req.header_items()))
+
     def log(self, url, body, data):
         print('这是请求的URL：')
         print(url)
@@ -69,14 +92,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SubAccounts?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SubAccounts?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         self.setHttpHeader(req)
@@ -93,9 +116,7 @@ class REST:
         data = ''
         req.data = body.encode()
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -119,14 +140,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/GetSubAccounts?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/GetSubAccounts?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         # auth = base64.encodestring(src).strip()
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
@@ -144,9 +165,7 @@ class REST:
         data = ''
         req.data = body.encode()
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -170,14 +189,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/QuerySubAccountByName?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/QuerySubAccountByName?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         # auth = base64.encodestring(src).strip()
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
@@ -195,9 +214,7 @@ class REST:
         data = ''
         req.data = body.encode()
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -223,14 +240,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SMS/TemplateSMS?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SMS/TemplateSMS?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         # auth = base64.encodestring(src).strip()
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
@@ -260,9 +277,7 @@ class REST:
             import ssl
             ssl._create_default_https_context = ssl._create_unverified_context
 
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
             if self.BodyType == 'json':
                 # json格式
                 locations = json.loads(data)
@@ -297,14 +312,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/LandingCalls?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/LandingCalls?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         # auth = base64.encodestring(src).strip()
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
@@ -326,9 +341,7 @@ class REST:
         req.data = body.encode()
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -358,14 +371,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/VoiceVerify?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/VoiceVerify?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         # auth = base64.encodestring(src).strip()
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
@@ -385,9 +398,7 @@ class REST:
         req.data = body.encode()
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -413,14 +424,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch;
+        signature = self.AccountSid + self.AccountToken + batch;
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/ivr/dial?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/ivr/dial?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         req.add_header("Accept", "application/xml")
@@ -437,9 +448,7 @@ class REST:
         req.data = body.encode()
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
             xtj = xmltojson()
             locations = xtj.main(data)
             if self.Iflog:
@@ -457,14 +466,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/BillRecords?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/BillRecords?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         self.setHttpHeader(req)
@@ -481,10 +490,7 @@ class REST:
         req.data = body.encode()
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -507,14 +513,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/AccountInfo?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/AccountInfo?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         self.setHttpHeader(req)
@@ -522,9 +528,7 @@ class REST:
         req.add_header("Authorization", auth)
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -548,14 +552,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SMS/QuerySMSTemplate?sig=" + sig
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SMS/QuerySMSTemplate?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         self.setHttpHeader(req)
@@ -572,9 +576,7 @@ class REST:
         req.data = body.encode()
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -598,14 +600,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/CallResult?sig=" + sig + "&callsid=" + callSid
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/CallResult?sig=" + sig + "&callsid=" + callSid
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         self.setHttpHeader(req)
@@ -613,9 +615,7 @@ class REST:
         req.add_header("Authorization", auth)
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -639,14 +639,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/ivr/call?sig=" + sig + "&callid=" + callid
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/ivr/call?sig=" + sig + "&callid=" + callid
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         self.setHttpHeader(req)
@@ -663,10 +663,7 @@ class REST:
         req.data = body.encode()
         data = ''
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
@@ -690,14 +687,14 @@ class REST:
 
         self.accAuth()
         nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+        batch = nowdate.strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
         # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/MediaFileUpload?sig=" + sig + "&appid=" + self.AppId + "&filename=" + filename
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/MediaFileUpload?sig=" + sig + "&appid=" + self.AppId + "&filename=" + filename
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
+        src = self.AccountSid + ":" + batch
         auth = base64.encodebytes(src.encode()).decode().strip()
         req = urllib2.Request(url)
         req.add_header("Authorization", auth)
@@ -713,10 +710,7 @@ class REST:
         req.data = body.encode()
 
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-
-            res.close()
+            data = self.urlopen(req)
 
             if self.BodyType == 'json':
                 # json格式
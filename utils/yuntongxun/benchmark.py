@@ -0,0 +1,80 @@
+# -*- coding:utf-8 -*-
+"""
+短信接口发送速度测试，比较每次新建连接(urlopen)和连接池，在项目根目录下执行：
+python -m utils.yuntongxun.benchmark                    在本进程中启动模拟服务器，8个线程各发送1000条
+python -m utils.yuntongxun.benchmark -n 500 -t 16 --delay 0.01
+python -m utils.yuntongxun.benchmark --port 8883        使用已经启动的模拟服务器(python -m utils.yuntongxun.stub_server)
+python -m utils.yuntongxun.benchmark --protocol https --certfile cert.pem --keyfile key.pem    包括TLS握手
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.benchmark import percentile
+from utils.yuntongxun import stub_server
+from utils.yuntongxun.CCPRestSDK import REST
+
+
+def make_rest(protocol, host, port, pool_size):
+    """:param pool_size: 0时不使用连接池"""
+    rest = REST(host, str(port), '2013-12-26')
+    rest.Protocol = protocol
+    rest.setAccount('0' * 32, '0' * 32)
+    rest.setAppId('0' * 32)
+    if pool_size:
+        rest.setConnectionPool(pool_size)
+    return rest
+
+
+def run(rest, number, threads):
+    """:return: (每秒条数, p50, p99, 失败条数)，单位毫秒"""
+    times = []
+    failed = [0]
+    lock = threading.Lock()
+
+    def send(i):
+        begin = time.perf_counter()
+        res = rest.sendTemplateSMS('13800000000', ['123456', 5], 1)
+        elapsed = time.perf_counter() - begin
+        with lock:
+            times.append(elapsed)
+            if res.get('statusCode') != '000000':
+                failed[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(send, range(number * threads)))
+    total = time.perf_counter() - start
+    times.sort()
+    return len(times) / total, percentile(times, 50) * 1000, percentile(times, 99) * 1000, failed[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='短信接口发送速度测试')
+    parser.add_argument('-n', '--number', type=int, default=1000, help='每个线程发送的条数')
+    parser.add_argument('-t', '--threads', type=int, default=8, help='同时发送的线程数')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='模拟服务器的端口，不指定时在本进程中启动')
+    parser.add_argument('--protocol', default='http')
+    parser.add_argument('--delay', type=float, default=0, help='本进程中的模拟服务器每个请求等待的秒数')
+    parser.add_argument('--certfile', help='本进程中的模拟服务器使用https时的证书文件')
+    parser.add_argument('--keyfile', help='私钥文件')
+    args = parser.parse_args()
+
+    port = args.port
+    if not port:
+        server = stub_server.serve(args.host, 0, args.delay, certfile=args.certfile, keyfile=args.keyfile)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+    for name, pool_size in (('urlopen', 0), ('连接池', args.threads)):
+        rest = make_rest(args.protocol, args.host, port, pool_size)
+        # 预热
+        run(rest, 1, args.threads)
+        per_second, p50, p99, failed = run(rest, args.number, args.threads)
+        print('{}：{}个线程发送{}条，每秒{:.0f}条，p50 {:.2f}ms，p99 {:.2f}ms，失败{}条'.format(
+            name, args.threads, args.number * args.threads, per_second, p50, p99, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+"""
+云通讯REST接口的HTTP(S)连接池：请求完成后连接放回池中，下次请求直接复用，
+不用每条短信都重新建立TCP连接、进行TLS握手
+"""
+import http.client
+import queue
+import socket
+import ssl
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+# 复用空闲连接时，服务器可能已经关闭了这个连接，发送请求时出现这些错误，请求没有完整发出去，换一个新连接重试一次
+_SEND_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+
+class HTTPConnectionPool(object):
+    """
+    同一个服务器的连接池，可以多个线程同时使用
+    池中最多保留maxsize个空闲连接；同时请求的线程更多时临时新建连接，用完后池子满了就关闭
+    """
+
+    def __init__(self, protocol, host, port, maxsize=10, connect_timeout=3, read_timeout=10):
+        """
+        :param protocol: 'http'或'https'
+        :param connect_timeout: 建立连接的超时时间，单位秒
+        :param read_timeout: 等待响应的超时时间，单位秒
+        """
+        self.protocol = protocol
+        self.host = host
+        self.port = int(port)
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # 后进先出，优先使用最近用过的连接(不容易被服务器关闭)
+        self._idle = queue.LifoQueue(maxsize)
+        if protocol == 'https':
+            # 和原来urlopen的做法一致，不验证证书
+            self._ssl_context = ssl._create_unverified_context()
+
+    def _new_conn(self):
+        if self.protocol == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout,
+                                               context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # 请求很小，不等待合并发送
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _get_conn(self):
+        """:return: (连接, 是否是复用的连接)"""
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_conn(), False
+
+    def _put_conn(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @staticmethod
+    def _send(conn, reused, method, path, body, headers):
+        """
+        发送请求并等待响应
+        :return: 响应；复用的连接已经被服务器关闭时返回None，可以换新连接重试
+        """
+        try:
+            conn.request(method, path, body, headers)
+        except _SEND_ERRORS:
+            if not reused:
+                raise
+            return None
+        try:
+            return conn.getresponse()
+        except http.client.RemoteDisconnected:
+            # 没有收到任何响应连接就关闭了，是服务器关闭的空闲连接；
+            # 收到部分响应、连接被重置或超时时服务器可能已经处理了请求，不重试，避免重复发送短信
+            if not reused:
+                raise
+            return None
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        发送请求，读取整个响应
+        :param url: 完整的url，只使用其中的路径和参数
+        :return: 响应包体(bytes)，状态码不是2xx时抛出HTTPError，和urlopen一致
+        """
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        conn, reused = self._get_conn()
+        try:
+            response = self._send(conn, reused, method, path, body, headers or {})
+            if response is None:
+                conn.close()
+                conn = self._new_conn()
+                response = self._send(conn, False, method, path, body, headers or {})
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_conn(conn)
+        if not 200 <= response.status < 300:
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+        return data
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
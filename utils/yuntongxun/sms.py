@@ -1,5 +1,7 @@
 # -*- coding:utf-8 -*-
 
+import threading
+
 # 说明：主账号，登陆云通讯网站后，可在"控制台-应用"中看到开发者主账号ACCOUNT SID
 from utils.yuntongxun.CCPRestSDK import REST
 
@@ -20,6 +22,33 @@ _serverPort = "8883"
 # 说明：REST API版本号保持不变
 _softVersion = '2013-12-26'
 
+# 说明：协议，本地压测(python -m utils.yuntongxun.stub_server)时为http
+_protocol = 'https'
+
+# 说明：连接池最多保留的空闲连接数，一般和发送短信的线程数(SMS_SEND_WORKERS)相同
+_poolSize = 8
+
+# 说明：建立连接、等待响应的超时时间，单位秒
+_connectTimeout = 3
+_readTimeout = 10
+
+# 创建单例时加锁，多个发送线程同时第一次调用时只创建一个
+_instance_lock = threading.Lock()
+
+
+def _server_options():
+    """
+    django settings中的YUNTONGXUN_SERVER可以覆盖上面的服务器地址和连接池设置，
+    如 {'ip': '127.0.0.1', 'port': '8883', 'protocol': 'http', 'pool_size': 8, 'connect_timeout': 3, 'read_timeout': 10}
+    """
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, 'YUNTONGXUN_SERVER', {})
+    except ImportError:
+        pass
+    return {}
+
 
 class CCP(object):
     """发送短信的辅助类"""
@@ -27,12 +56,31 @@ class CCP(object):
     def __new__(cls, *args, **kwargs):
         # 判断是否存在类属性_instance，_instance是类CCP的唯一对象，即单例
         if not hasattr(CCP, "_instance"):
-            cls._instance = super(CCP, cls).__new__(cls, *args, **kwargs)
-            cls._instance.rest = REST(_serverIP, _serverPort, _softVersion)
-            cls._instance.rest.setAccount(_accountSid, _accountToken)
-            cls._instance.rest.setAppId(_appId)
+            with _instance_lock:
+                if not hasattr(CCP, "_instance"):
+                    instance = super(CCP, cls).__new__(cls, *args, **kwargs)
+                    options = _server_options()
+                    instance.rest = REST(options.get('ip', _serverIP), options.get('port', _serverPort), _softVersion)
+                    instance.rest.Protocol = options.get('protocol', _protocol)
+                    instance.rest.setAccount(_accountSid, _accountToken)
+                    instance.rest.setAppId(_appId)
+                    # 所有请求复用同一个连接池
+                    instance.rest.setConnectionPool(options.get('pool_size', _poolSize),
+                                                    options.get('connect_timeout', _connectTimeout),
+                                                    options.get('read_timeout', _readTimeout))
+                    cls._instance = instance
         return cls._instance
 
+    def send(self, to, datas, temp_id):
+        """
+        发送模板短信，参数同send_template_sms
+        :return: 云通讯返回的状态码，"000000"表示成功，网络错误时为"172001"
+        """
+        res = self.rest.sendTemplateSMS(to, datas, temp_id)
+        if "statusCode" in res:
+            return res["statusCode"]
+        return next(iter(res), "172001")
+
     def send_template_sms(self, to, datas, temp_id):
         """
         发送模板短信
@@ -0,0 +1,87 @@
+# -*- coding:utf-8 -*-
+"""
+本地模拟云通讯REST接口，用于离线压测短信发送，不会真的发短信
+python -m utils.yuntongxun.stub_server --port 8883 --delay 0.2 --fail-rate 0.1
+settings中设置 YUNTONGXUN_SERVER = {'ip': '127.0.0.1', 'port': '8883', 'protocol': 'http'}
+指定--certfile、--keyfile时使用https(protocol设置为https)，可以测试TLS握手的开销
+"""
+import argparse
+import random
+import ssl
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUCCESS_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<Response><statusCode>000000</statusCode><TemplateSMS>'
+               '<dateCreated>{}</dateCreated><smsMessageSid>{}</smsMessageSid>'
+               '</TemplateSMS></Response>')
+FAIL_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Response><statusCode>160040</statusCode><statusMsg>stub failure</statusMsg></Response>')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # 支持keep-alive，每个响应带Content-Length
+    protocol_version = 'HTTP/1.1'
+    # 响应头和包体分两次写，不关闭Nagle算法时复用连接的请求要多等一个延迟确认(约40ms)
+    disable_nagle_algorithm = True
+    delay = 0
+    fail_rate = 0
+    count = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if self.delay:
+            time.sleep(self.delay)
+        with self.lock:
+            StubHandler.count += 1
+        if random.random() < self.fail_rate:
+            body = FAIL_XML
+        else:
+            body = SUCCESS_XML.format(time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex)
+        body = body.encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8883, delay=0, fail_rate=0, certfile=None, keyfile=None):
+    """
+    :param delay: 每个请求等待的秒数，模拟网络往返
+    :param fail_rate: 返回失败状态码的比例
+    :param certfile: 证书文件，指定时使用https
+    :return: ThreadingHTTPServer，调用serve_forever()开始处理请求
+    """
+    handler = type('StubHandler', (StubHandler,), {'delay': delay, 'fail_rate': fail_rate})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟云通讯REST接口')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8883)
+    parser.add_argument('--delay', type=float, default=0, help='每个请求等待的秒数')
+    parser.add_argument('--fail-rate', type=float, default=0, help='返回失败状态码的比例')
+    parser.add_argument('--certfile', help='证书文件，指定时使用https')
+    parser.add_argument('--keyfile', help='私钥文件')
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.delay, args.fail_rate, args.certfile, args.keyfile)
+    print('stub server listening on {}://{}:{}'.format('https' if args.certfile else 'http', args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('handled {} requests'.format(StubHandler.count))
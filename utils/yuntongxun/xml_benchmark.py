@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+"""
+云通讯响应xml转dict的速度测试，在项目根目录下执行：
+python -m utils.yuntongxun.xml_benchmark              每种响应转换10000次，输出每秒次数和p99耗时
+python -m utils.yuntongxun.xml_benchmark -n 2000 -t 8   另外用8个线程同时转换，检查结果没有互相影响
+python -m utils.yuntongxun.xml_benchmark -b HEAD~1      同时测试git中某个版本的xml_to_json.py(也可以是文件路径)，对比输出
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.benchmark import load_baseline, percentile
+from utils.yuntongxun import xml_to_json
+from utils.yuntongxun.xml_to_json import xmltojson
+
+# 发送模板短信成功
+TEMPLATE_SMS_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<Response><statusCode>000000</statusCode><TemplateSMS>'
+                    '<dateCreated>20191018101010</dateCreated><smsMessageSid>ff8080813b8e8d5d013b8e9b7ab70005</smsMessageSid>'
+                    '</TemplateSMS></Response>').encode()
+# 发送失败
+ERROR_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<Response><statusCode>160040</statusCode><statusMsg>验证码超出同模板同号码天发送上限</statusMsg></Response>').encode()
+# 子帐号列表
+SUB_ACCOUNTS_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<Response><statusCode>000000</statusCode><totalCount>20</totalCount>' +
+                    ''.join('<SubAccount><subAccountSid>{0:032x}</subAccountSid><subToken>{0:032x}</subToken>'
+                            '<dateCreated>2019-10-18 10:10:10</dateCreated><voipAccount>8000000{0:04d}</voipAccount>'
+                            '<voipPwd>abcdefgh</voipPwd></SubAccount>'.format(i) for i in range(20)) +
+                    '</Response>').encode()
+
+SAMPLES = (('发送成功', 'main', TEMPLATE_SMS_XML),
+           ('发送失败', 'main', ERROR_XML),
+           ('子帐号列表', 'main', SUB_ACCOUNTS_XML))
+
+
+def run(converter_class, method, xml, number):
+    """:return: (每秒次数, p50, p99)，单位微秒"""
+    converter = converter_class()
+    convert = getattr(converter, method)
+    # 旧版本把结果保存在类属性a、m中，每次转换前清空，否则子帐号列表越来越长
+    reset = hasattr(converter_class, 'm')
+    times = []
+    start = time.perf_counter()
+    for _ in range(number):
+        if reset:
+            converter_class.a, converter_class.m = {}, []
+        begin = time.perf_counter()
+        convert(xml)
+        times.append(time.perf_counter() - begin)
+    total = time.perf_counter() - start
+    times.sort()
+    return number / total, percentile(times, 50) * 1e6, percentile(times, 99) * 1e6
+
+
+def check_threads(number, threads):
+    """多个线程同时转换不同的响应，:return: 结果不正确的次数"""
+    expected = {xml: getattr(xmltojson(), method)(xml) for _, method, xml in SAMPLES}
+
+    def convert(i):
+        _, method, xml = SAMPLES[i % len(SAMPLES)]
+        return getattr(xmltojson(), method)(xml) != expected[xml]
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(convert, range(number * threads)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='云通讯响应xml转dict的速度测试')
+    parser.add_argument('-n', '--number', type=int, default=10000, help='每种响应转换的次数')
+    parser.add_argument('-t', '--threads', type=int, default=0, help='同时转换的线程数，0时不检查')
+    parser.add_argument('-b', '--baseline', help='对比的xml_to_json.py：git版本或文件路径')
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline, xml_to_json.__file__).xmltojson if args.baseline else None
+    for name, method, xml in SAMPLES:
+        per_second, p50, p99 = run(xmltojson, method, xml, args.number)
+        print('{}({}字节)：每秒{:.0f}次，p50 {:.1f}us，p99 {:.1f}us'.format(name, len(xml), per_second, p50, p99))
+        if baseline is not None:
+            old_per_second, old_p50, old_p99 = run(baseline, method, xml, args.number)
+            print('    {}：每秒{:.0f}次，p50 {:.1f}us，p99 {:.1f}us，当前每秒次数为它的{:.2f}倍'.format(
+                args.baseline, old_per_second, old_p50, old_p99, per_second / old_per_second))
+    if args.threads:
+        errors = check_threads(args.number, args.threads)
+        print('{}个线程各转换{}次，结果不正确{}次'.format(args.threads, args.number, errors))
+
+
+if __name__ == '__main__':
+    main()
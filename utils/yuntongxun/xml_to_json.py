@@ -1,179 +1,62 @@
 # -*- coding: utf-8 -*-
 # python xml.etree.ElementTree
-
-import os
+"""
+把云通讯返回的xml转成dict，按ElementTree增量解析器(iterparse使用的XMLPullParser)的事件处理，
+不保存任何状态，多个线程可以同时调用
+<Response><statusCode>000000</statusCode><TemplateSMS><smsMessageSid>..</smsMessageSid></TemplateSMS></Response>
+转成 {'statusCode': '000000', 'templateSMS': {'smsMessageSid': '..'}}
+"""
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
-
-
-class xmltojson:
-    # global var
-    SHOW_LOG = True
-    # XML file
-    XML_PATH = None
-    a = {}
-    m = []
-
-    def get_root(self, path):
-        """
-        parse the XML file,and get the tree of the XML file
-        finally,return the root element of the tree.
-        if the XML file dose not exist,then print the information
-        """
-        tree = ET.fromstring(path)
-        return tree
-
-    def get_element_tag(self, element):
-        """
-        return the element tag if the element is not None.
-        """
-        if element is not None:
-
-            return element.tag
-        else:
-            print('the element is None!')
 
-    def get_element_attrib(self, element):
-        """
-        return the element attrib if the element is not None.
-        """
-        if element is not None:
 
-            return element.attrib
+def xml_to_dict(xml, list_tag, rename=None):
+    """
+    根元素下每个子元素一项：没有子元素时值为文本，有子元素时值为 {子元素名: 文本}
+    :param xml: 响应包体，bytes或str
+    :param list_tag: 有totalCount时，这个元素可以有多个，值为列表；没有totalCount时只保留最后一个
+    :param rename: {元素名: 结果中的键名}，只用于有子元素的
+    :return: dict
+    """
+    rename = rename or {}
+    result = {}
+    items = []
+    has_total_count = False
+    depth = 0
+    # 响应已经全部读取，直接交给解析器(iterparse要包装成文件对象，每次调用多花一倍时间)
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parser.feed(xml)
+    parser.close()
+    for event, element in parser.read_events():
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        # 根元素下的一个子元素解析完成
+        tag = element.tag
+        if tag == 'totalCount':
+            has_total_count = True
+        if len(element):
+            value = {child.tag: child.text for child in element}
+            if tag == list_tag:
+                items.append(value)
+                value = items
+            result[rename.get(tag, tag)] = value
         else:
-            print('the element is None!')
+            result[tag] = element.text
+    if items and not has_total_count:
+        result[rename.get(list_tag, list_tag)] = items[-1]
+    return result
 
-    def get_element_text(self, element):
-        """
-        return the text of the element.
-        """
-        if element is not None:
-            return element.text
-        else:
-            print('the element is None!')
-
-    def get_element_children(self, element):
-        """
-        return the element children if the element is not None.
-        """
-        if element is not None:
-
-            return [c for c in element]
-        else:
-            print('the element is None!')
-
-    def get_elements_tag(self, elements):
-        """
-        return the list of tags of element's tag
-        """
-        if elements is not None:
-            tags = []
-            for e in elements:
-                tags.append(e.tag)
-            return tags
-        else:
-            print('the elements is None!')
-
-    def get_elements_attrib(self, elements):
-        """
-        return the list of attribs of element's attrib
-        """
-        if elements is not None:
-            attribs = []
-            for a in elements:
-                attribs.append(a.attrib)
-            return attribs
-        else:
-            print('the elements is None!')
 
-    def get_elements_text(self, elements):
-        """
-        return the dict of element
-        """
-        if elements is not None:
-            text = []
-            for t in elements:
-                text.append(t.text)
-            return dict(zip(self.get_elements_tag(elements), text))
-        else:
-            print('the elements is None!')
+class xmltojson:
+    """保留原来的接口，main、main2不再把结果保存在类属性中"""
 
     def main(self, xml):
-        # root
-        root = self.get_root(xml)
-
-        # children
-        children = self.get_element_children(root)
-
-        children_tags = self.get_elements_tag(children)
-
-        children_attribs = self.get_elements_attrib(children)
-
-        i = 0
-
-        # 获取二级元素的每一个子节点的名称和值
-        for c in children:
-            p = 0
-            c_children = self.get_element_children(c)
-            dict_text = self.get_elements_text(c_children)
-            if dict_text:
-                # print (children_tags[i])
-                if children_tags[i] == 'TemplateSMS':
-                    self.a['templateSMS'] = dict_text
-                else:
-                    if children_tags[i] == 'SubAccount':
-                        k = 0
-
-                        for x in children:
-                            if children_tags[k] == 'totalCount':
-                                self.m.append(dict_text)
-                                self.a['SubAccount'] = self.m
-                                p = 1
-                            k = k + 1
-                        if p == 0:
-                            self.a[children_tags[i]] = dict_text
-                    else:
-                        self.a[children_tags[i]] = dict_text
-
-            else:
-                self.a[children_tags[i]] = c.text
-            i = i + 1
-        return self.a
+        # 子帐号列表(有totalCount时)为列表，短信发送结果的键名为templateSMS
+        return xml_to_dict(xml, 'SubAccount', {'TemplateSMS': 'templateSMS'})
 
     def main2(self, xml):
-        # root
-        root = self.get_root(xml)
-
-        # children
-        children = self.get_element_children(root)
-
-        children_tags = self.get_elements_tag(children)
-
-        children_attribs = self.get_elements_attrib(children)
-
-        i = 0
-
-        # 获取二级元素的每一个子节点的名称和值
-        for c in children:
-            p = 0
-            c_children = self.get_element_children(c)
-            dict_text = self.get_elements_text(c_children)
-            if dict_text:
-                if children_tags[i] == 'TemplateSMS':
-                    k = 0
-
-                    for x in children:
-                        if children_tags[k] == 'totalCount':
-                            self.m.append(dict_text)
-                            self.a['TemplateSMS'] = self.m
-                            p = 1
-                        k = k + 1
-                    if p == 0:
-                        self.a[children_tags[i]] = dict_text
-                else:
-                    self.a[children_tags[i]] = dict_text
-
-            else:
-                self.a[children_tags[i]] = c.text
-            i = i + 1
-        return self.a
+        # 短信模板列表(有totalCount时)为列表
+        return xml_to_dict(xml, 'TemplateSMS')